@@ -0,0 +1,121 @@
+"""
+Chat endpoint throughput in sync and async database modes.
+
+Runs the same workload twice, in separate processes with
+DATABASE_ASYNC=False and DATABASE_ASYNC=True: every client sends a
+message, fetches that conversation and loads its conversation list.
+
+In sync mode a pool checkout blocks the event loop, so once more requests
+are in flight than the pool has connections (5 + 10 overflow by default)
+the process stalls until pool_timeout. Sync mode is therefore capped at
+SYNC_IN_FLIGHT concurrent requests; async mode runs every client at once.
+
+    cd backend && python -m benchmarks.async_db [clients] [rounds]
+"""
+import json
+import os
+import subprocess
+import sys
+
+CLIENTS = 200
+ROUNDS = 3
+SYNC_IN_FLIGHT = 10
+
+
+async def run_clients(clients: int, rounds: int, in_flight: int) -> dict:
+    import asyncio
+    import statistics
+    import time
+    import uuid
+    import httpx
+    from src import oreon
+    from src.auth.hash_password import HashPassword
+    from src.auth.jwt_handler import JWTHandler
+    from src.database import SessionLocal
+    from src.models.user import User
+
+    app = oreon()
+    hashed = HashPassword.get_password_hash("benchmark-password")
+    db = SessionLocal()
+    users = []
+    for i in range(clients):
+        user_id = str(uuid.uuid4())
+        db.add(User(id=user_id, email=f"{user_id}@example.com", username=f"async_{user_id[:12]}",
+                    hashed_password=hashed))
+        users.append((user_id, f"async_{user_id[:12]}"))
+    db.commit()
+    db.close()
+
+    latencies = []
+    errors = 0
+    slots = asyncio.Semaphore(in_flight)
+
+    async def client_loop(client, index):
+        nonlocal errors
+        user_id, username = users[index]
+        partner_id = users[(index + 1) % clients][0]
+        headers = {"Authorization": f"Bearer {JWTHandler.create_access_token({'sub': username})}"}
+        for _ in range(rounds):
+            for method, url, body in (
+                ("POST", "/api/v1/chat/messages", {"receiver_id": partner_id, "message": "benchmark"}),
+                ("GET", f"/api/v1/chat/messages?other_user_id={partner_id}&limit=50", None),
+                ("GET", "/api/v1/chat/conversations", None),
+            ):
+                start = time.perf_counter()
+                try:
+                    async with slots:
+                        response = await client.request(method, url, json=body, headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop(client, i) for i in range(clients)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def child(clients: int, rounds: int):
+    import asyncio
+    import benchmarks.common  # points DATABASE_URL at a temp database before src loads
+    from config import Config
+    in_flight = clients if Config.DATABASE_ASYNC else min(clients, SYNC_IN_FLIGHT)
+    result = asyncio.run(run_clients(clients, rounds, in_flight))
+    result["in_flight"] = in_flight
+    print(json.dumps(result))
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else ROUNDS
+    print(f"{'mode':>6} {'in-flight':>9} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for mode in ("False", "True"):
+        env = dict(os.environ, DATABASE_ASYNC=mode, BENCH_CHILD="1")
+        env.pop("DATABASE_URL", None)
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-m", "benchmarks.async_db", str(clients), str(rounds)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        label = "async" if mode == "True" else "sync"
+        print(f"{label:>6} {result['in_flight']:>9} {result['requests']:>9} {result['errors']:>7} {result['req_per_sec']:>8.0f} "
+              f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    if os.environ.get("BENCH_CHILD"):
+        child(int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        main()
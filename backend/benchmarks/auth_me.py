@@ -0,0 +1,38 @@
+"""
+/auth/me throughput with the authenticated-user cache on and off.
+
+    cd backend && python -m benchmarks.auth_me [requests]
+"""
+from benchmarks.common import QueryCounter, timer
+
+import sys
+from fastapi.testclient import TestClient
+from src import oreon
+from src.auth.user_cache import user_cache
+from src.database import engine
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    client = TestClient(oreon())
+    client.post("/api/v1/auth/register", json={
+        "email": "bench@example.com", "username": "bench_me", "password": "benchmark-password"
+    })
+    token = client.post("/api/v1/auth/login", data={
+        "username": "bench_me", "password": "benchmark-password"
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    print(f"{'cache':>6} {'req/s':>10} {'queries':>8}")
+    for enabled in (False, True):
+        user_cache.enabled = enabled
+        user_cache.clear()
+        with QueryCounter(engine) as counter, timer() as elapsed:
+            for _ in range(requests):
+                assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+        print(f"{'on' if enabled else 'off':>6} {requests / elapsed['elapsed']:>10.0f} {counter.count:>8}")
+    print(user_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Avatar uploads: server memory under concurrent large uploads.
+
+Starts a uvicorn worker (in a temp directory, so uploads land there)
+and samples its RSS from /proc while many clients upload at once:
+  - valid avatars just under the 5MB cap (PNGs of random noise, a
+    different one per client), which must all be stored (200)
+  - oversized bodies sent chunked, with no Content-Length, which the
+    server must cut off once the cap is passed
+  - oversized bodies declaring their Content-Length, refused up front
+Reports each case's peak RSS over the RSS it started at, status codes, and how much of
+each body was sent (median) before the server answered. Uploads use a
+raw HTTP/1.1 connection that reads the response while still sending, so
+an early 413 is seen as such rather than as a dropped connection.
+
+    cd backend && python -m benchmarks.avatar_upload [concurrency] [oversize_mb]
+"""
+from benchmarks.common import BENCH_DIR
+
+import asyncio
+import io
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Iterable, List
+from PIL import Image
+from benchmarks.cross_worker import BACKEND_DIR, free_port, seed_users, wait_until_up
+
+CONCURRENCY = 16
+OVERSIZE_MB = 200
+VALID_BYTES = 5 * 1024 * 1024 - 4096
+CHUNK = 256 * 1024
+BOUNDARY = "oreonbenchboundary"
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+AVATAR_PATH = "/api/v1/auth/me/avatar"
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class RssSampler:
+    """Polls a process's RSS in a thread and keeps the peak"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_kib(self.pid))
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self.peak = rss_kib(self.pid)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def noise_png(max_bytes: int, seed: int) -> bytes:
+    """A PNG of random noise (which barely compresses) as large as fits in max_bytes"""
+    side = int((max_bytes / 3) ** 0.5)
+    noise = random.Random(seed).randbytes(side * side * 3)
+    while True:
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (side, side), noise[:side * side * 3]).save(buffer, "PNG", compress_level=1)
+        if buffer.tell() <= max_bytes:
+            return buffer.getvalue()
+        side -= 8
+
+
+def filler(size: int) -> Iterable[bytes]:
+    """PNG magic bytes followed by zeros: passes the sniff, enough for oversized bodies"""
+    yield PNG_HEADER
+    remaining = size - len(PNG_HEADER)
+    block = b"\0" * CHUNK
+    while remaining > 0:
+        yield block[:min(CHUNK, remaining)]
+        remaining -= CHUNK
+
+
+def in_chunks(data: bytes) -> Iterable[bytes]:
+    for start in range(0, len(data), CHUNK):
+        yield data[start:start + CHUNK]
+
+
+async def upload(port: int, token: str, size: int, chunks: Iterable[bytes], declare_length: bool) -> tuple:
+    """POST one file as multipart; returns (status code or "closed", file bytes sent)"""
+    prefix = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="avatar.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode()
+    suffix = f"\r\n--{BOUNDARY}--\r\n".encode()
+    head = [
+        f"POST {AVATAR_PATH} HTTP/1.1", "Host: 127.0.0.1", f"Authorization: Bearer {token}",
+        f"Content-Type: multipart/form-data; boundary={BOUNDARY}", "Connection: close",
+        f"Content-Length: {len(prefix) + size + len(suffix)}" if declare_length else "Transfer-Encoding: chunked",
+    ]
+
+    def frame(data: bytes) -> bytes:
+        return data if declare_length else b"%x\r\n%s\r\n" % (len(data), data)
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    # Read concurrently so a response sent before the body is finished is noticed
+    status_line = asyncio.create_task(reader.readline())
+    sent = 0
+    try:
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + frame(prefix))
+        for chunk in chunks:
+            if status_line.done():
+                break
+            writer.write(frame(chunk))
+            await writer.drain()
+            sent += len(chunk)
+        else:
+            writer.write(frame(suffix) + (b"" if declare_length else b"0\r\n\r\n"))
+            await writer.drain()
+    except ConnectionError:
+        pass  # the server answered and closed while we were still sending
+    finally:
+        line = await status_line
+        writer.close()
+    return (int(line.split()[1]) if line else "closed"), sent
+
+
+async def scenario(port: int, pid: int, users: list, bodies: List[tuple], declare_length: bool) -> dict:
+    """Upload bodies[i] = (size, chunks) as users[i], all at once"""
+    # Thumbnails of earlier uploads may still be rendering; let them finish first
+    await asyncio.sleep(2)
+    start_kib = rss_kib(pid)
+    with RssSampler(pid) as sampler:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            upload(port, token, size, chunks, declare_length) for (_, token), (size, chunks) in zip(users, bodies)
+        ])
+        elapsed = time.perf_counter() - start
+    return {
+        "outcomes": Counter(outcome for outcome, _ in results),
+        "sent_mb": statistics.median(sent for _, sent in results) / 1024 / 1024,
+        "peak_kib": sampler.peak - start_kib,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else CONCURRENCY
+    oversize = (int(sys.argv[2]) if len(sys.argv) > 2 else OVERSIZE_MB) * 1024 * 1024
+    users = seed_users(concurrency)
+    images = [noise_png(VALID_BYTES, seed) for seed in range(concurrency)]
+    os.makedirs(os.path.join(BENCH_DIR, "uploads", "avatars"), exist_ok=True)
+
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DEBUG="False")
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BENCH_DIR, env=env
+    )
+    try:
+        asyncio.run(wait_until_up(port))
+        baseline = rss_kib(process.pid)
+        print(f"{concurrency} concurrent uploads, server idle RSS {baseline / 1024:.1f} MiB")
+        print(f"{'':<28} {'outcomes':<34} {'sent MiB':>9} {'peak +MiB':>10} {'s':>6}")
+        cases = [
+            ("valid ~5MB", lambda: [(len(image), in_chunks(image)) for image in images], True, 200),
+            (f"{oversize >> 20}MB chunked", lambda: [(oversize, filler(oversize)) for _ in users], False, 413),
+            (f"{oversize >> 20}MB with Content-Length", lambda: [(oversize, filler(oversize)) for _ in users], True, 413),
+        ]
+        for label, bodies, declare_length, expected in cases:
+            result = asyncio.run(scenario(port, process.pid, users, bodies(), declare_length))
+            outcomes = ", ".join(f"{k}x{v}" for k, v in sorted(result["outcomes"].items(), key=str))
+            print(f"{label:<28} {outcomes:<34} {result['sent_mb']:>9.1f} "
+                  f"{result['peak_kib'] / 1024:>10.1f} {result['seconds']:>6.2f}")
+            assert result["outcomes"] == {expected: len(users)}, f"{label}: expected only {expected}s"
+        leftovers = [name for name in os.listdir(os.path.join(BENCH_DIR, "uploads", "avatars")) if name.startswith(".")]
+        print(f"temp files left behind: {len(leftovers)}")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
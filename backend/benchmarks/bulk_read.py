@@ -0,0 +1,60 @@
+"""
+Marking an inbox read: one call per conversation vs one bulk call.
+
+Seeds a reader with unread messages from many senders, then compares
+ChatService.mark_as_read per sender (one transaction each, as clients
+did) with a single ChatService.mark_many_as_read.
+
+    cd backend && python -m benchmarks.bulk_read [senders]
+"""
+from benchmarks.common import QueryCounter, timer
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+from src.database import SessionLocal, engine, init_db
+from src.models.chat import MessageCreate, ReadMarker
+from src.services.chat_service import ChatService
+
+SENDERS = 200
+UNREAD_PER_SENDER = 20
+
+
+def seed(db, senders: int) -> tuple:
+    reader = str(uuid.uuid4())
+    sender_ids = [str(uuid.uuid4()) for _ in range(senders)]
+    messages = []
+    start = datetime.utcnow() - timedelta(hours=1)
+    for i, sender_id in enumerate(sender_ids):
+        for j in range(UNREAD_PER_SENDER):
+            msg = ChatService.build_message(sender_id, "bench", "bench", MessageCreate(receiver_id=reader, message="hi"))
+            msg.created_at = start + timedelta(seconds=i, milliseconds=j)
+            messages.append(msg)
+    ChatService.store_messages(db, messages)
+    return reader, sender_ids
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else SENDERS
+    init_db()
+    db = SessionLocal()
+    print(f"{senders} senders with {UNREAD_PER_SENDER} unread messages each")
+    print(f"{'':<20} {'queries':>8} {'commits':>8} {'ms':>10}")
+
+    reader, sender_ids = seed(db, senders)
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        for sender_id in sender_ids:
+            ChatService.mark_as_read(db, reader, sender_id)
+    print(f"{'per conversation':<20} {counter.count:>8} {senders:>8} {elapsed['elapsed'] * 1000:>10.1f}")
+
+    reader, sender_ids = seed(db, senders)
+    markers = [ReadMarker(sender_id=sender_id) for sender_id in sender_ids]
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        receipts = ChatService.mark_many_as_read(db, reader, markers)
+    assert sum(r["count"] for r in receipts.values()) == senders * UNREAD_PER_SENDER
+    print(f"{'bulk':<20} {counter.count:>8} {1:>8} {elapsed['elapsed'] * 1000:>10.1f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Shared helpers for the backend benchmarks.
+
+Import this module before anything from `src` so the benchmarks run
+against a throwaway SQLite database instead of ./db/oreon.db, with rate
+limits off unless RATE_LIMIT_ENABLED says otherwise.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+BENCH_DIR = tempfile.mkdtemp(prefix="oreon-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{BENCH_DIR}/bench.db")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Counts the SQL statements executed on an engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def timer():
+    """Yield a dict whose `elapsed` key is filled in (seconds) on exit"""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["elapsed"] = time.perf_counter() - start
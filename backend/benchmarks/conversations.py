@@ -0,0 +1,68 @@
+"""
+Conversation list benchmark.
+
+Seeds one user with a growing number of chat partners and checks that
+ChatService.get_conversations issues the same number of queries no
+matter how many partners there are.
+
+    cd backend && python -m benchmarks.conversations
+"""
+from benchmarks.common import QueryCounter, timer
+
+import uuid
+from datetime import datetime, timedelta
+from src.database import SessionLocal, engine, init_db
+from src.models.user import User
+from src.models.chat import ChatMessage
+from src.services.chat_service import ChatService
+
+PARTNER_COUNTS = [10, 100, 500]
+MESSAGES_PER_PARTNER = 5
+
+
+def seed(db, owner_id: str, partners: int):
+    """Create `partners` users that each exchanged messages with owner_id"""
+    now = datetime.utcnow()
+    for i in range(partners):
+        partner_id = str(uuid.uuid4())
+        db.add(User(
+            id=partner_id,
+            email=f"{partner_id}@example.com",
+            username=f"bench_{partner_id[:12]}",
+            full_name=f"Partner {i}",
+            hashed_password="x",
+        ))
+        for j in range(MESSAGES_PER_PARTNER):
+            sender, receiver = (owner_id, partner_id) if j % 2 else (partner_id, owner_id)
+            db.add(ChatMessage(
+                id=str(uuid.uuid4()),
+                sender_id=sender,
+                sender_username="bench",
+                receiver_id=receiver,
+                message=f"message {j}",
+                created_at=now - timedelta(minutes=i, seconds=j),
+            ))
+    db.commit()
+    ChatService.rebuild_conversation_summaries(db, owner_id)
+
+
+def main():
+    init_db()
+    db = SessionLocal()
+    print(f"{'partners':>10} {'queries':>8} {'ms':>10}")
+    for partners in PARTNER_COUNTS:
+        owner_id = str(uuid.uuid4())
+        db.add(User(id=owner_id, email=f"{owner_id}@example.com",
+                    username=f"owner_{owner_id[:12]}", hashed_password="x"))
+        seed(db, owner_id, partners)
+        db.expire_all()
+
+        with QueryCounter(engine) as counter, timer() as elapsed:
+            conversations = ChatService.get_conversations(db, owner_id)
+        assert len(conversations) == partners
+        print(f"{partners:>10} {counter.count:>8} {elapsed['elapsed'] * 1000:>10.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Cross-worker WebSocket delivery through the Redis broker.
+
+Starts several uvicorn workers (separate processes) sharing one SQLite
+database and one Redis. Every recipient connects its WebSocket to one
+worker, and the message is POSTed to a different worker. The benchmark
+reports how many messages arrived and the POST-to-delivery latency.
+
+Uses REDIS_URL when set, otherwise a local fakeredis TCP server as the
+stand-in (pip install fakeredis).
+
+    cd backend && python -m benchmarks.cross_worker [workers] [pairs]
+"""
+import benchmarks.common  # points DATABASE_URL at a temp database before src loads
+
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import httpx
+import websockets
+
+WORKERS = 3
+PAIRS = 60
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_redis() -> str:
+    from fakeredis import TcpFakeServer
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def seed_users(count: int) -> list:
+    from src.auth.jwt_handler import JWTHandler
+    from src.database import SessionLocal, init_db
+    from src.models.user import User
+
+    init_db()
+    db = SessionLocal()
+    users = []
+    for _ in range(count):
+        user_id = str(uuid.uuid4())
+        username = f"xw_{user_id[:12]}"
+        db.add(User(id=user_id, email=f"{user_id}@example.com", username=username, hashed_password="x"))
+        users.append((user_id, JWTHandler.create_access_token({"sub": username})))
+    db.commit()
+    db.close()
+    return users
+
+
+async def wait_until_up(port: int):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+async def run(ports: list, users: list) -> dict:
+    await asyncio.gather(*[wait_until_up(port) for port in ports])
+    pairs = len(users) // 2
+    receivers, senders = users[:pairs], users[pairs:]
+    arrivals = {}
+
+    async def receive(socket_, user_id):
+        async for raw in socket_:
+            arrivals[json.loads(raw)["id"]] = time.perf_counter()
+
+    sockets = []
+    readers = []
+    for i, (user_id, token) in enumerate(receivers):
+        port = ports[i % len(ports)]
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}/api/v1/chat/ws/{user_id}?token={token}")
+        sockets.append(ws)
+        readers.append(asyncio.create_task(receive(ws, user_id)))
+    await asyncio.sleep(0.5)  # let every worker finish subscribing
+
+    sent = {}
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def send(i):
+            receiver_id = receivers[i][0]
+            port = ports[(i + 1) % len(ports)]  # never the receiver's worker
+            start = time.perf_counter()
+            response = await client.post(
+                f"http://127.0.0.1:{port}/api/v1/chat/messages",
+                json={"receiver_id": receiver_id, "message": "cross-worker"},
+                headers={"Authorization": f"Bearer {senders[i][1]}"},
+            )
+            sent[response.json()["id"]] = start
+        await asyncio.gather(*[send(i) for i in range(pairs)])
+
+    deadline = time.perf_counter() + 5
+    while len(arrivals) < len(sent) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    for task in readers:
+        task.cancel()
+    for ws in sockets:
+        await ws.close()
+
+    latencies = sorted((arrivals[m] - sent[m]) * 1000 for m in sent if m in arrivals)
+    return {
+        "sent": len(sent),
+        "delivered": len(latencies),
+        "p50_ms": statistics.median(latencies) if latencies else None,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else None,
+    }
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS
+    pairs = int(sys.argv[2]) if len(sys.argv) > 2 else PAIRS
+    broker_url = os.environ.get("REDIS_URL") or start_fake_redis()
+    users = seed_users(pairs * 2)
+
+    env = dict(os.environ, BROKER_URL=broker_url, DATABASE_URL=os.environ["DATABASE_URL"])
+    ports = [free_port() for _ in range(workers)]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env
+        )
+        for port in ports
+    ]
+    try:
+        result = asyncio.run(run(ports, users))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    print(f"workers={workers} sent={result['sent']} delivered={result['delivered']} "
+          f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Access-token verification: JOSE backends, the verified-token cache and
+embedded claims.
+
+  - decode time of one token with each backend (PyJWT only if installed)
+  - JWTHandler.decode_token with the cache cold (every token new) and warm
+  - /chat/presence with plain tokens and with embedded claims, user cache
+    off, counting the queries that load the user
+
+    cd backend && python -m benchmarks.jwt_verify [iterations]
+"""
+from benchmarks.common import QueryCounter, timer
+
+import sys
+from fastapi.testclient import TestClient
+from config import Config
+from src import oreon
+from src.auth.jwt_handler import CODECS, JWTHandler, pyjwt, token_cache
+from src.auth.user_cache import user_cache
+from src.database import engine
+
+ITERATIONS = 20_000
+
+
+def per_call_us(function, iterations: int) -> float:
+    with timer() as t:
+        for i in range(iterations):
+            function(i)
+    return t["elapsed"] / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+    token = JWTHandler.create_access_token({"sub": "bench_jwt", "uid": "0" * 36, "active": True, "su": False})
+
+    print(f"{'backend':<8} {'decode us':>10}")
+    for name, codec_class in CODECS.items():
+        if name == "pyjwt" and pyjwt is None:
+            print(f"{name:<8} {'(not installed)':>10}")
+            continue
+        codec = codec_class(Config.SECRET_KEY, Config.ALGORITHM)
+        assert codec.decode(token)["sub"] == "bench_jwt"
+        print(f"{name:<8} {per_call_us(lambda i: codec.decode(token), iterations):>10.1f}")
+
+    tokens = [JWTHandler.create_access_token({"sub": f"bench_{i}"}) for i in range(min(iterations, 5000))]
+    token_cache.clear()
+    cold = per_call_us(lambda i: JWTHandler.decode_token(tokens[i]), len(tokens))
+    warm = per_call_us(lambda i: JWTHandler.decode_token(tokens[i % len(tokens)]), iterations)
+    print(f"decode_token ({Config.JWT_BACKEND}): cold {cold:.1f} us, cached {warm:.1f} us")
+
+    client = TestClient(oreon())
+    client.post("/api/v1/auth/register", json={
+        "email": "bench_jwt@example.com", "username": "bench_jwt", "password": "benchmark-password"
+    })
+
+    requests = max(iterations // 20, 100)
+    user_cache.enabled = False
+    print(f"{'token':<8} {'req/s':>10} {'queries':>8}")
+    for embed in (False, True):
+        Config.JWT_EMBED_CLAIMS = embed
+        token = client.post("/api/v1/auth/login", data={
+            "username": "bench_jwt", "password": "benchmark-password"
+        }).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        with QueryCounter(engine) as counter, timer() as t:
+            for _ in range(requests):
+                response = client.get("/api/v1/chat/presence", params={"ids": "a,b"}, headers=headers)
+                assert response.status_code == 200
+        print(f"{'claims' if embed else 'plain':<8} {requests / t['elapsed']:>10.0f} {counter.count:>8}")
+
+
+if __name__ == "__main__":
+    main()
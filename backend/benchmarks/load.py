@@ -0,0 +1,426 @@
+"""
+Load-test harness: seeded data, concurrent clients, JSON baselines.
+
+Seeds synthetic users, conversations and messages, starts uvicorn on
+the seeded database and drives each scenario with many concurrent
+clients:
+  register, login, send_message, fetch_messages, conversations,
+  user_search, and ws_fanout (POST a message, time until the
+  recipient's WebSocket receives it)
+Each reports throughput, errors and p50/p95/p99 latency, and the run is
+written to a JSON file. `compare` checks a run against a baseline and
+exits non-zero when a scenario got slower, lost throughput or failed
+more often by more than the threshold.
+
+    cd backend && python -m benchmarks.load run --out baseline.json
+    cd backend && python -m benchmarks.load run --compare baseline.json
+    cd backend && python -m benchmarks.load compare baseline.json results.json [--threshold 0.2]
+
+The database is a fresh temporary SQLite file unless DATABASE_URL is
+set, e.g. to a scratch Postgres database; it is seeded into, so never
+point it at real data. With --workers above 1 the workers share a
+broker: REDIS_URL if set, else a local fakeredis.
+"""
+from benchmarks.common import BENCH_DIR
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+import httpx
+import websockets
+from benchmarks.cross_worker import BACKEND_DIR, free_port, start_fake_redis, wait_until_up
+
+PASSWORD = "benchmark-password"
+FIRST = ["anna", "maria", "john", "mohamed", "li", "sofia", "pierre", "amina", "kofi", "yuki",
+         "carlos", "fatima", "ivan", "chen", "olga", "pedro", "aisha", "lucas", "emma", "omar"]
+LAST = ["smith", "garcia", "nguyen", "okafor", "muller", "rossi", "kowalski", "tanaka", "haddad",
+        "silva", "dubois", "jensen", "mensah", "petrov", "santos", "wang", "khan", "lopez", "brown", "ali"]
+WORDS = ["ok", "thanks", "see you", "tomorrow", "the harvest", "price per kg", "delivery", "rain",
+         "maize", "on my way", "can you call me", "invoice sent", "field 3", "tractor"]
+CHUNK = 5000
+SCENARIOS = ["register", "login", "send_message", "fetch_messages", "conversations", "user_search", "ws_fanout"]
+# Password hashing makes these far slower per request; they run a fraction of --requests
+AUTH_SHARE = 0.25
+
+
+# --- Seeding ---
+
+def seed(users: int, partners: int, messages: int, rng) -> dict:
+    """Insert users, their conversations and messages; returns ids, usernames and pairs"""
+    from sqlalchemy import insert
+    from src.auth.hash_password import HashPassword
+    from src.database import SessionLocal, engine, init_db
+    from src.models.chat import ChatMessage
+    from src.models.user import User, normalize_search_text
+    from src.services.chat_service import ChatService
+
+    init_db()
+    hashed = HashPassword.get_password_hash(PASSWORD)  # one hash shared by every seeded user
+    now = datetime.utcnow()
+    rows = []
+    for n in range(users):
+        full_name = f"{rng.choice(FIRST).title()} {rng.choice(LAST).title()}"
+        username = f"{full_name.split()[0].lower()}{n}"
+        rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "email": f"{username}@bench.io", "username": username,
+            "full_name": full_name, "hashed_password": hashed, "is_active": True, "is_superuser": False,
+            "role": "user", "created_at": now, "updated_at": now,
+            "username_lower": username, "full_name_lower": normalize_search_text(full_name),
+        })
+    ids = [row["id"] for row in rows]
+
+    pairs = set()
+    for user_id in ids:
+        for partner_id in rng.sample(ids, min(partners, len(ids) - 1) + 1):
+            if partner_id != user_id:
+                pairs.add(tuple(sorted((user_id, partner_id))))
+    pairs = sorted(pairs)
+    usernames = {row["id"]: row["username"] for row in rows}
+
+    with engine.begin() as conn:
+        for offset in range(0, len(rows), CHUNK):
+            conn.execute(insert(User.__table__), rows[offset:offset + CHUNK])
+    batch = []
+    for n in range(messages):
+        low, high = rng.choice(pairs)
+        sender, receiver = (low, high) if rng.random() < 0.5 else (high, low)
+        created = now - timedelta(seconds=(messages - n) * 7)
+        batch.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "sender_id": sender,
+            "sender_username": usernames[sender], "sender_name": usernames[sender], "receiver_id": receiver,
+            "room_id": None, "conversation_key": f"{low}:{high}",
+            "message": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12))),
+            "message_type": "text", "is_read": n < messages * 0.9, "created_at": created, "updated_at": created,
+        })
+        if len(batch) == CHUNK or n == messages - 1:
+            with engine.begin() as conn:
+                conn.execute(insert(ChatMessage.__table__), batch)
+            batch = []
+    db = SessionLocal()
+    try:
+        ChatService.rebuild_conversation_summaries(db)
+    finally:
+        db.close()
+    return {"ids": ids, "usernames": usernames, "pairs": pairs}
+
+
+# --- Scenarios ---
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    return {
+        "requests": len(ordered) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(cuts[49], 2) if cuts else None,
+        "p95_ms": round(cuts[94], 2) if cuts else None,
+        "p99_ms": round(cuts[98], 2) if cuts else None,
+    }
+
+
+async def drive(clients: int, requests: int, operation) -> dict:
+    """Run `operation(client, i)` for i in range(requests) on `clients` concurrent connections"""
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await operation(client, i)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, elapsed)
+
+
+def auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def run_scenarios(names: list, data: dict, tokens: dict, clients: int, requests: int, rng) -> dict:
+    ids, pairs, usernames = data["ids"], data["pairs"], data["usernames"]
+    auth_requests = max(1, int(requests * AUTH_SHARE))
+    run_id = uuid.uuid4().hex[:8]
+    partners = {}
+    for low, high in pairs:
+        partners.setdefault(low, []).append(high)
+        partners.setdefault(high, []).append(low)
+    talkers = sorted(partners)
+
+    async def register(client, i):
+        username = f"new_{run_id}_{i}"
+        response = await client.post("/api/v1/auth/register", json={
+            "email": f"{username}@bench.io", "username": username, "password": PASSWORD, "full_name": "New User",
+        })
+        return response.status_code == 201
+
+    async def login(client, i):
+        response = await client.post("/api/v1/auth/login", data={
+            "username": usernames[ids[i % len(ids)]], "password": PASSWORD,
+        })
+        return response.status_code == 200
+
+    async def send_message(client, i):
+        sender = rng.choice(talkers)
+        response = await client.post("/api/v1/chat/messages", headers=auth(tokens[sender]), json={
+            "receiver_id": rng.choice(partners[sender]), "message": "load test",
+        })
+        return response.status_code == 200
+
+    async def fetch_messages(client, i):
+        user = rng.choice(talkers)
+        response = await client.get("/api/v1/chat/messages", headers=auth(tokens[user]), params={
+            "other_user_id": rng.choice(partners[user]), "limit": 50,
+        })
+        return response.status_code == 200
+
+    async def conversations(client, i):
+        response = await client.get("/api/v1/chat/conversations", headers=auth(tokens[rng.choice(talkers)]),
+                                    params={"limit": 50})
+        return response.status_code == 200
+
+    async def user_search(client, i):
+        q = rng.choice(FIRST)[:rng.randint(2, 5)] if rng.random() < 0.7 else rng.choice(LAST)
+        response = await client.get("/api/v1/users/search", headers=auth(tokens[rng.choice(ids)]), params={"q": q})
+        return response.status_code == 200
+
+    operations = {
+        "register": (register, auth_requests),
+        "login": (login, auth_requests),
+        "send_message": (send_message, requests),
+        "fetch_messages": (fetch_messages, requests),
+        "conversations": (conversations, requests),
+        "user_search": (user_search, requests),
+    }
+    results = {}
+    for name in names:
+        if name == "ws_fanout":
+            results[name] = await ws_fanout(talkers, partners, tokens, clients, requests, rng)
+        else:
+            operation, count = operations[name]
+            results[name] = await drive(clients, count, operation)
+        print_result(name, results[name])
+    return results
+
+
+async def ws_fanout(talkers: list, partners: dict, tokens: dict, clients: int, requests: int, rng) -> dict:
+    """`clients` users connected over WebSockets; messages POSTed to them are timed to delivery"""
+    receivers = talkers[:clients]
+    sent, arrivals = {}, {}
+
+    async def listen(user_id):
+        ws = await websockets.connect(f"{WS_URL}/api/v1/chat/ws/{user_id}?token={tokens[user_id]}", max_queue=None)
+        async def read():
+            async for raw in ws:
+                event = json.loads(raw)
+                if "id" in event:
+                    arrivals[event["id"]] = time.perf_counter()
+        return ws, asyncio.create_task(read())
+
+    connections = await asyncio.gather(*[listen(user_id) for user_id in receivers])
+    await asyncio.sleep(0.5)
+
+    async def send(client, i):
+        receiver = receivers[i % len(receivers)]
+        sender = rng.choice(partners[receiver])
+        start = time.perf_counter()
+        response = await client.post("/api/v1/chat/messages", headers=auth(tokens[sender]), json={
+            "receiver_id": receiver, "message": "fan-out",
+        })
+        if response.status_code != 200:
+            return False
+        sent[response.json()["id"]] = start
+        return True
+
+    posted = await drive(clients, requests, send)
+    deadline = time.perf_counter() + 10
+    while len(arrivals) < len(sent) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    for ws, reader in connections:
+        reader.cancel()
+        await ws.close()
+
+    latencies = [(arrivals[m] - sent[m]) * 1000 for m in sent if m in arrivals]
+    first, last = min(sent.values(), default=0), max(arrivals.values(), default=0)
+    result = summarize(latencies, posted["requests"] - len(latencies), last - first)
+    result["connections"] = len(receivers)
+    return result
+
+
+# --- Reporting ---
+
+def print_result(name: str, result: dict):
+    print(f"{name:<16} {result['requests']:>7} {result['errors']:>6} {result['throughput_rps']:>9.1f} "
+          f"{result['p50_ms'] or 0:>8.1f} {result['p95_ms'] or 0:>8.1f} {result['p99_ms'] or 0:>8.1f}")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def regressions(baseline: dict, current: dict, threshold: float) -> list:
+    """(scenario, metric, baseline, current) for everything worse by more than `threshold`"""
+    found = []
+    for name, base in baseline["scenarios"].items():
+        now = current["scenarios"].get(name)
+        if now is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if base[metric] and now[metric] and now[metric] > base[metric] * (1 + threshold):
+                found.append((name, metric, base[metric], now[metric]))
+        if base["throughput_rps"] and now["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            found.append((name, "throughput_rps", base["throughput_rps"], now["throughput_rps"]))
+        base_rate = base["errors"] / base["requests"] if base["requests"] else 0
+        now_rate = now["errors"] / now["requests"] if now["requests"] else 0
+        if now_rate > base_rate + 0.01:
+            found.append((name, "error_rate", round(base_rate, 4), round(now_rate, 4)))
+    return found
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print the comparison; returns False if anything regressed"""
+    if baseline["meta"].get("scale") != current["meta"].get("scale"):
+        print(f"warning: different scale, baseline {baseline['meta'].get('scale')} vs {current['meta'].get('scale')}")
+    print(f"{'scenario':<16} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, base in baseline["scenarios"].items():
+        now = current["scenarios"].get(name)
+        if now is None:
+            print(f"{name:<16} (not in current run)")
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if base[metric] and now[metric] is not None:
+                change = (now[metric] - base[metric]) / base[metric] * 100
+                print(f"{name:<16} {metric:<15} {base[metric]:>10.1f} {now[metric]:>10.1f} {change:>+7.1f}%")
+    found = regressions(baseline, current, threshold)
+    for name, metric, before, after in found:
+        print(f"REGRESSION {name} {metric}: {before} -> {after} (threshold {threshold:.0%})")
+    if not found:
+        print(f"no regressions beyond {threshold:.0%}")
+    return not found
+
+
+# --- Commands ---
+
+BASE_URL = ""
+WS_URL = ""
+
+
+def run(args) -> int:
+    global BASE_URL, WS_URL
+    from src.auth.jwt_handler import JWTHandler
+    from src.database import engine
+
+    rng = random.Random(args.seed)
+    names = args.scenarios.split(",") if args.scenarios else SCENARIOS
+    print(f"seeding {args.users} users, {args.partners} partners each, {args.messages} messages "
+          f"({engine.dialect.name})")
+    started = time.perf_counter()
+    data = seed(args.users, args.partners, args.messages, rng)
+    print(f"seeded in {time.perf_counter() - started:.1f} s")
+    tokens = {user_id: JWTHandler.create_access_token({"sub": data["usernames"][user_id]}) for user_id in data["ids"]}
+
+    port = free_port()
+    BASE_URL, WS_URL = f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}"
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DEBUG="False", DATABASE_URL=os.environ["DATABASE_URL"])
+    # A pooled connection per client, so the pool size isn't what gets measured
+    env.setdefault("DB_POOL_SIZE", str(args.clients))
+    if args.workers > 1 and "BROKER_URL" not in os.environ:
+        env["BROKER_URL"] = os.environ.get("REDIS_URL") or start_fake_redis()
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BENCH_DIR, env=env
+    )
+    try:
+        asyncio.run(wait_until_up(port))
+        print(f"{args.clients} clients, {args.requests} requests per scenario, {args.workers} worker(s)")
+        print(f"{'scenario':<16} {'reqs':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        scenarios = asyncio.run(run_scenarios(names, data, tokens, args.clients, args.requests, rng))
+    finally:
+        process.terminate()
+        process.wait()
+
+    results = {
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "scale": {"users": args.users, "partners": args.partners, "messages": args.messages,
+                      "clients": args.clients, "requests": args.requests, "workers": args.workers},
+        },
+        "scenarios": scenarios,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            return 0 if compare(json.load(f), results, args.threshold) else 1
+    return 0
+
+
+def compare_files(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return 0 if compare(baseline, current, args.threshold) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oreon backend load tests")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Seed a database, run the scenarios and report")
+    run_parser.add_argument("--users", type=int, default=2000)
+    run_parser.add_argument("--partners", type=int, default=10, help="Conversations per user")
+    run_parser.add_argument("--messages", type=int, default=100_000)
+    run_parser.add_argument("--clients", type=int, default=32, help="Concurrent clients (and WebSockets)")
+    run_parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    run_parser.add_argument("--scenarios", default="", help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    run_parser.add_argument("--seed", type=int, default=7)
+    run_parser.add_argument("--out", default="", help="Write the results to this JSON file")
+    run_parser.add_argument("--compare", default="", help="Baseline JSON to compare against; exit 1 on regression")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files; exit 1 on regression")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    compare_parser.set_defaults(handler=compare_files)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Latency of an unrelated endpoint during a login storm.
+
+Fires concurrent logins while probing GET / and reports the probe's
+p50/p99 with argon2 hashing inline on the event loop versus on the
+hashing pool.
+
+    cd backend && python -m benchmarks.login_storm [logins]
+"""
+import benchmarks.common  # points DATABASE_URL at a temp database before src loads
+
+import asyncio
+import statistics
+import sys
+import time
+import httpx
+from src import oreon
+from src.auth.hash_password import password_hasher
+
+PASSWORD = "benchmark-password"
+# Stay below the default SQLAlchemy pool size (5 + 10 overflow)
+CONCURRENT_CLIENTS = 10
+PROBE_INTERVAL = 0.005
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def probe(client, stop: asyncio.Event, latencies: list):
+    # Latency is measured from when the probe was due, not from when the
+    # event loop got around to sending it, so a blocked loop shows up.
+    while not stop.is_set():
+        scheduled = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        await client.get("/")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+
+
+async def storm(client, logins: int) -> dict:
+    stop = asyncio.Event()
+    latencies = []
+    prober = asyncio.create_task(probe(client, stop, latencies))
+    slots = asyncio.Semaphore(CONCURRENT_CLIENTS)
+
+    async def login():
+        async with slots:
+            return await client.post("/api/v1/auth/login", data={"username": "storm_user", "password": PASSWORD})
+
+    responses = await asyncio.gather(*[login() for _ in range(logins)])
+    stop.set()
+    await prober
+    return {
+        "ok": sum(r.status_code == 200 for r in responses),
+        "rejected": sum(r.status_code == 429 for r in responses),
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 99),
+    }
+
+
+async def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    transport = httpx.ASGITransport(app=oreon())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/v1/auth/register", json={
+            "email": "storm@example.com", "username": "storm_user", "password": PASSWORD
+        })
+
+        print(f"{'mode':>8} {'ok':>5} {'429':>5} {'p50 ms':>8} {'p99 ms':>8}")
+        workers = password_hasher.workers or 2
+        for mode, pool_workers in (("inline", 0), ("pool", workers)):
+            password_hasher.workers = pool_workers
+            result = await storm(client, logins)
+            print(f"{mode:>8} {result['ok']:>5} {result['rejected']:>5} {result['p50']:>8.2f} {result['p99']:>8.2f}")
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
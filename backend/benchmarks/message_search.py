@@ -0,0 +1,123 @@
+"""
+Message search: FTS index vs LIKE scans on a synthetic corpus.
+
+Builds a corpus of direct messages with Zipf-distributed words and a
+skewed user distribution (a few very chatty users), inserted through
+the normal table so the FTS triggers do the indexing. Then, for a heavy
+and a typical user and for common / medium / rare words and a two-word query,
+compares ChatService.search_messages (the FTS index) with:
+  - LIKE scoped to the user's messages (what a naive endpoint would do)
+  - LIKE over the whole table
+
+    cd backend && python -m benchmarks.message_search [messages]
+
+The default is 10M messages; building that takes a while, so pass a
+smaller number for a quick run.
+"""
+from benchmarks.common import timer
+
+import itertools
+import random
+import statistics
+import sys
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from src.database import SessionLocal, engine, init_db
+from src.services.chat_service import ChatService
+
+MESSAGES = 10_000_000
+USERS = 20_000
+VOCABULARY = 20_000
+CHUNK = 50_000
+RUNS = 5
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "dé", "ba", "fi", "go", "hu"]
+
+
+def make_vocabulary(rng):
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda w: rng.random())
+
+
+def user_index(rng):
+    # Cubing skews towards low indexes: user 0 is the chattiest
+    return int(USERS * rng.random() ** 3)
+
+
+def build(messages: int, rng, words, user_ids):
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    start = datetime.utcnow() - timedelta(days=365)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for offset in range(0, messages, CHUNK):
+            rows = []
+            for n in range(offset, min(offset + CHUNK, messages)):
+                sender, receiver = user_ids[user_index(rng)], user_ids[rng.randrange(USERS)]
+                body = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(4, 14)))
+                low, high = sorted((sender, receiver))
+                rows.append((
+                    str(uuid.uuid4()), sender, "bench", receiver, f"{low}:{high}",
+                    body, "text", False, start + timedelta(seconds=n * 3)
+                ))
+            cursor.executemany(
+                "INSERT INTO chat_messages (id, sender_id, sender_username, receiver_id, conversation_key, "
+                "message, message_type, is_read, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            raw.commit()
+            print(f"  {min(offset + CHUNK, messages):>10} messages", end="\r", flush=True)
+        print()
+    finally:
+        raw.close()
+
+
+def median_ms(func):
+    samples = []
+    for _ in range(RUNS):
+        with timer() as t:
+            result = func()
+        samples.append(t["elapsed"] * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    rng = random.Random(42)
+    init_db()
+    words = make_vocabulary(rng)
+    user_ids = [str(uuid.uuid4()) for _ in range(USERS)]
+    print(f"building {messages} messages")
+    with timer() as t:
+        build(messages, rng, words, user_ids)
+    print(f"built in {t['elapsed']:.0f} s")
+
+    db = SessionLocal()
+    users = {"heavy user": user_ids[0], "typical user": user_ids[USERS // 2]}
+    queries = {
+        "common": words[2],
+        "medium": words[300],
+        "rare": words[VOCABULARY - 50],
+        "two words": f"{words[5]} {words[60]}",
+    }
+    print(f"{'':<14} {'query':<10} {'hits':>6} {'LIKE all ms':>12} {'LIKE user ms':>13} {'FTS ms':>9}")
+    for label, user_id in users.items():
+        for kind, term in queries.items():
+            pattern = {"pattern": f"%{term}%", "user_id": user_id}
+            like_all, _ = median_ms(lambda: db.execute(text(
+                "SELECT id FROM chat_messages WHERE message LIKE :pattern "
+                "ORDER BY created_at DESC LIMIT 20"
+            ), pattern).all())
+            like_user, hits = median_ms(lambda: db.execute(text(
+                "SELECT id FROM chat_messages WHERE (sender_id = :user_id OR receiver_id = :user_id) "
+                "AND message LIKE :pattern ORDER BY created_at DESC LIMIT 20"
+            ), pattern).all())
+            fts, results = median_ms(lambda: ChatService.search_messages(db, user_id, term, 20))
+            print(f"{label:<14} {kind:<10} {len(results):>6} {like_all:>12.1f} {like_user:>13.1f} {fts:>9.1f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Metrics overhead: what instrumentation adds per request and per query.
+
+End-to-end request timings vary by more than the overhead itself, so
+each part is measured in isolation:
+  - MetricsMiddleware around a trivial ASGI app, against the bare app
+  - `SELECT 1` on a SQLite engine, with and without instrument_engine
+  - rendering /metrics once many route series exist
+Runs alternate between the two variants and the best round counts.
+
+    cd backend && python -m benchmarks.metrics_overhead [iterations]
+"""
+from benchmarks.common import timer
+
+import asyncio
+import sys
+from sqlalchemy import create_engine, event, text
+from src.services import metrics
+from src.services.metrics import MetricsMiddleware, http_latency, instrument_engine, registry
+
+ITERATIONS = 50_000
+ROUNDS = 7
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def call_many(app, iterations: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/", "root_path": "", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    with timer() as t:
+        for _ in range(iterations):
+            await app(dict(scope), receive, send)
+    return t["elapsed"] / iterations * 1e9
+
+
+def query_many(engine, iterations: int) -> float:
+    with engine.connect() as conn:
+        statement = text("SELECT 1")
+        with timer() as t:
+            for _ in range(iterations):
+                conn.execute(statement).scalar()
+    return t["elapsed"] / iterations * 1e9
+
+
+def best_of(measure_off, measure_on) -> tuple:
+    off, on = [], []
+    for _ in range(ROUNDS):
+        off.append(measure_off())
+        on.append(measure_on())
+    return min(off), min(on)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+    print(f"best of {ROUNDS} rounds x {iterations}")
+    print(f"{'':<22} {'off ns':>9} {'on ns':>9} {'+ns':>7}")
+
+    instrumented = MetricsMiddleware(bare_app)
+    off, on = best_of(
+        lambda: asyncio.run(call_many(bare_app, iterations)),
+        lambda: asyncio.run(call_many(instrumented, iterations)),
+    )
+    print(f"{'request (middleware)':<22} {off:>9.0f} {on:>9.0f} {on - off:>7.0f}")
+
+    engine = create_engine("sqlite://")
+
+    def hooks_off():
+        event.remove(engine, "before_cursor_execute", metrics._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", metrics._after_cursor_execute)
+        return query_many(engine, iterations)
+
+    def hooks_on():
+        instrument_engine(engine)
+        return query_many(engine, iterations)
+
+    instrument_engine(engine)
+    off, on = best_of(hooks_off, hooks_on)
+    print(f"{'query (engine hooks)':<22} {off:>9.0f} {on:>9.0f} {on - off:>7.0f}")
+
+    for n in range(200):
+        http_latency.observe(0.01, "GET", f"/synthetic/{n}")
+    with timer() as t:
+        body = registry.render()
+    print(f"/metrics render, {len(body.splitlines())} lines: {t['elapsed'] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Presence registry: memory per tracked user, lookup cost, flap damping.
+
+Connects many users to a PresenceRegistry, reports bytes per tracked
+user and the cost of a 500-id batched lookup, then flaps one user
+on/off for a few seconds and counts the presence events its watchers
+receive.
+
+    cd backend && python -m benchmarks.presence [users]
+
+Set PRESENCE_URL=redis://... to measure the Redis backend instead.
+"""
+from benchmarks.common import timer
+
+import asyncio
+import sys
+from src.realtime.presence import PresenceRegistry, create_presence_backend
+
+USERS = 100_000
+LOOKUP_IDS = 500
+FLAP_SECONDS = 3
+NOTIFY_INTERVAL = 1.0
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    events = []
+
+    async def notify(message, user_ids, coalesce_key=None):
+        events.append(message)
+
+    async def watchers(user_ids):
+        return {user_id: ["watcher"] for user_id in user_ids}
+
+    registry = PresenceRegistry(create_presence_backend(), ttl=60, notify_interval=NOTIFY_INTERVAL, watchers=watchers)
+    await registry.start(notify)
+
+    with timer() as t:
+        for i in range(users):
+            await registry.connected(f"user-{i}")
+    stats = registry.stats()
+    print(f"{users} users connected in {t['elapsed']:.2f} s ({stats['backend']})")
+    print(f"memory: {stats['memory_bytes'] / 1024 / 1024:.1f} MiB, {stats['bytes_per_user']} bytes per tracked user")
+
+    ids = [f"user-{i}" for i in range(0, users, max(1, users // LOOKUP_IDS))][:LOOKUP_IDS]
+    rounds = 200
+    with timer() as t:
+        for _ in range(rounds):
+            online = await registry.lookup(ids)
+    assert all(online.values())
+    print(f"lookup of {len(ids)} ids: {t['elapsed'] / rounds * 1000:.3f} ms "
+          f"({t['elapsed'] / rounds / len(ids) * 1e6:.2f} us per id)")
+
+    await asyncio.sleep(NOTIFY_INTERVAL * 1.5)  # let the connect events drain
+    events.clear()
+    flaps = 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + FLAP_SECONDS
+    while loop.time() < deadline:
+        await registry.disconnected("user-0")
+        await asyncio.sleep(0.01)
+        await registry.connected("user-0")
+        await asyncio.sleep(0.01)
+        flaps += 1
+    await asyncio.sleep(NOTIFY_INTERVAL * 1.5)
+    print(f"flapping user: {flaps} disconnect/reconnect cycles in {FLAP_SECONDS} s -> {len(events)} presence events")
+
+    await registry.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""
+Rate limiter overhead per request.
+
+  - InMemoryRateLimit.take on one hot key and spread over more keys than
+    max_keys, showing the bucket count stays bounded
+  - a FastAPI route with no dependency, a no-op one and rate_limit_ip,
+    called straight through ASGI, separating FastAPI's per-dependency
+    cost from the limiter's
+  - RedisRateLimit.take against REDIS_URL, or in-process fakeredis
+    (`pip install fakeredis[lua]` for the script) when it isn't set
+Runs alternate between the route variants and the best round counts.
+
+    cd backend && python -m benchmarks.rate_limit [iterations]
+"""
+from benchmarks.common import timer
+
+import asyncio
+import importlib.util
+import os
+import sys
+from fastapi import Depends, FastAPI
+from src.auth.dependecies import rate_limit_ip
+from src.services.rate_limit import InMemoryRateLimit, Limit, RedisRateLimit, rate_limiter
+
+ITERATIONS = 50_000
+ROUNDS = 5
+# Generous enough that nothing is refused, so every call does the full update
+LIMIT = Limit(burst=10**9, rate=10**6)
+
+
+async def take_many(backend, iterations: int, keys: int) -> float:
+    names = [f"client-{n}" for n in range(keys)]
+    with timer() as t:
+        for i in range(iterations):
+            await backend.take(names[i % keys], LIMIT)
+    return t["elapsed"] / iterations * 1e6
+
+
+async def call_many(app, path: str, iterations: int) -> float:
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        "scheme": "http", "http_version": "1.1",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    with timer() as t:
+        for _ in range(iterations):
+            await app(dict(scope), receive, send)
+    return t["elapsed"] / iterations * 1e6
+
+
+def bench_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/plain")
+    async def plain():
+        return {}
+
+    async def noop():
+        pass
+
+    @app.get("/noop", dependencies=[Depends(noop)])
+    async def with_noop():
+        return {}
+
+    @app.get("/limited", dependencies=[Depends(rate_limit_ip("bench"))])
+    async def limited():
+        return {}
+
+    return app
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+
+    backend = InMemoryRateLimit(max_keys=10_000)
+    hot = asyncio.run(take_many(backend, iterations, 1))
+    spread = asyncio.run(take_many(backend, iterations, 50_000))
+    print(f"memory take, 1 key: {hot:.2f} us; 50000 keys: {spread:.2f} us, {backend.size()} buckets kept")
+
+    rate_limiter.enabled = True
+    rate_limiter.limits["bench"] = LIMIT
+    app = bench_app()
+    rounds = {"/plain": [], "/noop": [], "/limited": []}
+    for _ in range(ROUNDS):
+        for path, timings in rounds.items():
+            timings.append(asyncio.run(call_many(app, path, iterations // 5)))
+    plain, noop, limited = (min(timings) for timings in rounds.values())
+    print(f"route: {plain:.1f} us bare, {noop:.1f} us with a no-op dependency, {limited:.1f} us rate limited "
+          f"(+{limited - plain:.1f} us, of which the limiter {limited - noop:.1f} us)")
+
+    url = os.environ.get("REDIS_URL")
+    if url:
+        redis_backend = RedisRateLimit(url, "bench")
+    elif importlib.util.find_spec("lupa") is None:
+        print("redis take skipped: set REDIS_URL, or `pip install fakeredis[lua]` to run the script in-process")
+        return
+    else:
+        import fakeredis
+        redis_backend = RedisRateLimit("", "bench", client=fakeredis.FakeAsyncRedis())
+
+    async def redis_round_trips():
+        try:
+            # Same bucket semantics as the memory backend: burst, then a wait
+            strict = Limit(burst=2, rate=1)
+            assert [await redis_backend.take("bench-check", strict) > 0 for _ in range(3)] == [False, False, True]
+            return await take_many(redis_backend, min(iterations, 5000), 100)
+        finally:
+            await redis_backend.close()
+
+    print(f"redis take ({url or 'fakeredis'}): {asyncio.run(redis_round_trips()):.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Reconnect storm: full history refetch vs resume-from-cursor sync.
+
+Seeds users that each have a few conversations with plenty of history,
+then some messages they missed while offline. For every user it compares
+what a reconnect costs today (GET /chat/messages, limit 100, per open
+conversation) with ChatService.get_missed_messages from the last seen
+message id, as used by /chat/ws/{user_id}?since=.
+
+    cd backend && python -m benchmarks.reconnect_sync [users]
+"""
+from benchmarks.common import QueryCounter, timer
+
+import sys
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from src.database import SessionLocal, engine, init_db
+from src.models.chat import ChatMessage
+from src.services.chat_service import ChatService
+
+USERS = 500
+PARTNERS = 5
+HISTORY_PER_PARTNER = 60
+MISSED_PER_USER = 10
+
+
+def seed(db, users: int):
+    """Returns {user_id: last message id seen before going offline}"""
+    start = datetime.utcnow() - timedelta(days=1)
+    ids = [str(uuid.uuid4()) for _ in range(users)]
+    last_seen = {}
+    rows = []
+
+    def message(sender, receiver, at):
+        row = {
+            "id": str(uuid.uuid4()),
+            "sender_id": sender,
+            "sender_username": "bench",
+            "receiver_id": receiver,
+            "conversation_key": ChatService.conversation_key(sender, receiver),
+            "message": "hello",
+            "created_at": at,
+        }
+        rows.append(row)
+        return row
+
+    for n, user_id in enumerate(ids):
+        partners = [ids[(n + k) % users] for k in range(1, PARTNERS + 1)]
+        at = start + timedelta(seconds=n)
+        for j in range(HISTORY_PER_PARTNER):
+            for partner_id in partners:
+                at += timedelta(milliseconds=1)
+                last_seen[user_id] = message(partner_id, user_id, at)["id"]
+        for j in range(MISSED_PER_USER):
+            at += timedelta(milliseconds=1)
+            message(partners[j % PARTNERS], user_id, at + timedelta(hours=12))
+    db.execute(insert(ChatMessage), rows)
+    db.commit()
+    return ids, last_seen
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    init_db()
+    db = SessionLocal()
+    ids, last_seen = seed(db, users)
+    print(f"{users} users reconnecting, {PARTNERS} conversations and {MISSED_PER_USER} missed messages each")
+    print(f"{'':<22} {'queries':>8} {'rows':>8} {'ms':>10}")
+
+    rows = 0
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        for n, user_id in enumerate(ids):
+            for k in range(1, PARTNERS + 1):
+                rows += len(ChatService.get_messages(db, user_id, ids[(n + k) % users], 100))
+            db.expire_all()
+    print(f"{'refetch per chat':<22} {counter.count:>8} {rows:>8} {elapsed['elapsed'] * 1000:>10.1f}")
+
+    rows = 0
+    with QueryCounter(engine) as counter, timer() as elapsed:
+        for user_id in ids:
+            missed = ChatService.get_missed_messages(db, user_id, last_seen[user_id], 200)
+            assert len(missed) == MISSED_PER_USER
+            rows += len(missed)
+            db.expire_all()
+    print(f"{'sync from cursor':<22} {counter.count:>8} {rows:>8} {elapsed['elapsed'] * 1000:>10.1f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
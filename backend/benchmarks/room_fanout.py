@@ -0,0 +1,89 @@
+"""
+Fan-out of one room message to 1,000 connected members.
+
+Members are stub sockets whose send_text takes a few milliseconds; a
+handful never complete, standing in for stalled mobile clients. Compares
+a sequential send loop with ConnectionManager.broadcast, which only
+enqueues onto each socket's outbound queue, and reports how long the
+writers take to drain. Also counts membership queries per broadcast.
+
+    cd backend && python -m benchmarks.room_fanout [members]
+"""
+import os
+os.environ.setdefault("WS_SEND_TIMEOUT_SECONDS", "0.5")
+
+from benchmarks.common import QueryCounter, timer
+
+import asyncio
+import random
+import sys
+from src.database import SessionLocal, engine, init_db
+from src.models.chat import ChatRoomCreate
+from src.realtime.connection_manager import ConnectionManager
+from src.realtime.broker import InMemoryBroker
+from src.services.chat_service import ChatService
+
+MEMBERS = 1000
+STALLED = 5
+
+
+class StubSocket:
+    def __init__(self, stalled: bool):
+        self.stalled = stalled
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(3600 if self.stalled else random.uniform(0.001, 0.005))
+        self.received += 1
+
+
+async def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else MEMBERS
+    init_db()
+    db = SessionLocal()
+    room = ChatService.create_room(db, "owner", ChatRoomCreate(name="bench room"))
+    for i in range(members):
+        ChatService.join_room(db, room.id, f"member-{i}", f"member{i}")
+
+    manager = ConnectionManager(InMemoryBroker())
+    await manager.start()
+    sockets = {f"member-{i}": StubSocket(stalled=i < STALLED) for i in range(members)}
+    for user_id, socket in sockets.items():
+        await manager.connect(user_id, socket)
+
+    from src.realtime.rooms import room_members
+    room_members.invalidate(room.id)
+    with QueryCounter(engine) as cold:
+        member_ids = ChatService.get_room_member_ids(db, room.id)
+    with QueryCounter(engine) as warm:
+        ChatService.get_room_member_ids(db, room.id)
+    print(f"membership lookup: {cold.count} queries cold, {warm.count} warm")
+
+    healthy = [uid for uid in member_ids if not sockets[uid].stalled][:200]
+    with timer() as sequential:
+        for user_id in healthy:
+            await sockets[user_id].send_text("x")
+    per_socket = sequential["elapsed"] / len(healthy)
+    print(f"sequential: {per_socket * members * 1000:.0f} ms projected for {members} healthy members "
+          f"(and blocks forever on the first stalled one)")
+
+    with timer() as enqueue:
+        await manager.broadcast("x", member_ids)
+    with timer() as drain:
+        expected = len(healthy) + members - STALLED
+        while sum(s.received for s in sockets.values()) < expected:
+            await asyncio.sleep(0.001)
+    print(f"broadcast:  {enqueue['elapsed'] * 1000:.1f} ms to enqueue for {members} members, "
+          f"{drain['elapsed'] * 1000:.0f} ms until every healthy socket received it")
+    await manager.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""
+Response serialization and compression: CPU time and bytes on the wire.
+
+Builds realistic list payloads (a page of 100 messages, 100 users with
+avatars, 200 conversations) and times each way of turning them into a
+response body, with the routes' response models:
+  - jsonable: validate, to Python, json.dumps (any custom response_class)
+  - orjson:   validate, to Python, orjson (ORJSONResponse as the default)
+  - pydantic: validate and dump_json in pydantic-core (FastAPI's default
+              for routes with a response_model)
+  - direct:   FastJSONResponse on the service's dicts (no response_model)
+Then compresses the body with each encoding CompressionMiddleware can
+pick, reporting size and time.
+
+    cd backend && python -m benchmarks.serialization [runs]
+"""
+from benchmarks.common import timer
+
+import json
+import random
+import statistics
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from src.models.chat import ChatMessage, MessageResponse
+from src.models.user import User, UserResponse
+from src.services.compression import COMPRESSORS, BrotliCompressor, GzipCompressor, ZstdCompressor
+from src.services.responses import dumps
+
+RUNS = 200
+WORDS = ("ok", "thanks", "see you", "tomorrow", "the harvest", "price per kg", "delivery", "rain",
+         "maize", "👍", "café", "on my way", "can you call me", "invoice sent", "field 3", "tractor")
+
+
+def sentence(rng) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 30)))
+
+
+def messages(rng, count: int = 100) -> list:
+    me, other = str(uuid.uuid4()), str(uuid.uuid4())
+    now = datetime.utcnow()
+    return [
+        ChatMessage(
+            id=str(uuid.uuid4()), sender_id=sender, sender_username=f"user_{sender[:6]}", sender_name="Amina Haddad",
+            receiver_id=receiver, room_id=None, message=sentence(rng), message_type="text",
+            is_read=rng.random() < 0.8, created_at=now - timedelta(seconds=30 * n)
+        )
+        for n, (sender, receiver) in enumerate(rng.choice([(me, other), (other, me)]) for _ in range(count))
+    ]
+
+
+def users(rng, count: int = 100) -> list:
+    now = datetime.utcnow()
+    return [
+        User(
+            id=str(uuid.uuid4()), email=f"user{n}@example.com", username=f"user{n}", full_name=f"User {n}",
+            farm_name=rng.choice([None, "Green Acres", "Hill Farm"]), phone=None, role="user", is_active=True,
+            is_superuser=False, avatar=f"{uuid.uuid4().hex * 2}.jpg" if rng.random() < 0.7 else None,
+            created_at=now - timedelta(days=n)
+        )
+        for n in range(count)
+    ]
+
+
+def conversations(rng, count: int = 200) -> list:
+    now = datetime.utcnow()
+    return [
+        {
+            "user_id": str(uuid.uuid4()), "username": f"user{n}", "full_name": f"User {n}",
+            "last_message": sentence(rng), "last_message_time": now - timedelta(minutes=n),
+            "unread_count": rng.randint(0, 5), "is_online": rng.random() < 0.3,
+        }
+        for n in range(count)
+    ]
+
+
+def median_us(func, runs: int):
+    samples = []
+    for _ in range(runs):
+        with timer() as t:
+            result = func()
+        samples.append(t["elapsed"] * 1_000_000)
+    return statistics.median(samples), result
+
+
+def to_python(adapter: TypeAdapter, content):
+    """What FastAPI hands a custom response class: validated, then dumped to JSON-ready Python"""
+    return adapter.dump_python(adapter.validate_python(content), mode="json")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    rng = random.Random(7)
+    payloads = {
+        "GET /chat/messages": (TypeAdapter(List[MessageResponse]), messages(rng)),
+        "GET /auth/users": (TypeAdapter(List[UserResponse]), users(rng)),
+        "GET /chat/conversations": (None, conversations(rng)),
+    }
+    compressors = {"gzip 6": GzipCompressor, "gzip 9": lambda: GzipCompressor(9)}
+    if "br" in COMPRESSORS:
+        compressors["br 4"] = BrotliCompressor
+    if "zstd" in COMPRESSORS:
+        compressors["zstd 3"] = ZstdCompressor
+
+    for label, (adapter, content) in payloads.items():
+        print(f"{label} ({len(content)} items)")
+        print(f"  {'encoder':<10} {'us':>9} {'bytes':>9}")
+        if adapter:
+            options = {
+                "jsonable": lambda: json.dumps(to_python(adapter, content), ensure_ascii=False,
+                                               separators=(",", ":")).encode(),
+                "orjson": lambda: dumps(to_python(adapter, content)),
+                "pydantic": lambda: adapter.dump_json(adapter.validate_python(content)),
+            }
+        else:
+            options = {
+                "jsonable": lambda: json.dumps(jsonable_encoder(content), ensure_ascii=False,
+                                               separators=(",", ":")).encode(),
+                "direct": lambda: dumps(content),
+            }
+        for name, encode in options.items():
+            us, body = median_us(encode, runs)
+            print(f"  {name:<10} {us:>9.0f} {len(body):>9}")
+
+        print(f"  {'encoding':<10} {'us':>9} {'bytes':>9} {'ratio':>7}")
+        for name, factory in compressors.items():
+            us, compressed = median_us(lambda: factory().compress(body, True), runs)
+            print(f"  {name:<10} {us:>9.0f} {len(compressed):>9} {len(body) / len(compressed):>7.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+POST /chat/messages latency with a fast versus a slow recipient.
+
+The recipient is a stub WebSocket registered with the connection manager
+whose send_text takes SLOW_SEND seconds. With per-connection outbound
+queues the sender's latency should not depend on it.
+
+    cd backend && python -m benchmarks.slow_consumer [requests]
+"""
+from benchmarks.common import timer
+
+import asyncio
+import statistics
+import sys
+import httpx
+from src import oreon
+from src.auth.jwt_handler import JWTHandler
+from src.database import SessionLocal
+from src.models.user import User
+from src.realtime.connection_manager import manager
+
+SLOW_SEND = 0.5
+
+
+class StubSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+
+
+async def measure(client, headers, requests: int) -> float:
+    latencies = []
+    for _ in range(requests):
+        with timer() as elapsed:
+            response = await client.post("/api/v1/chat/messages", headers=headers,
+                                          json={"receiver_id": "recipient", "message": "hi"})
+            assert response.status_code == 200
+        latencies.append(elapsed["elapsed"] * 1000)
+    return statistics.median(latencies)
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    app = oreon()
+    db = SessionLocal()
+    for user_id in ("sender", "recipient"):
+        db.add(User(id=user_id, email=f"{user_id}@example.com", username=user_id, hashed_password="x"))
+    db.commit()
+    db.close()
+    headers = {"Authorization": f"Bearer {JWTHandler.create_access_token({'sub': 'sender'})}"}
+
+    await manager.start()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for label, delay in (("fast", 0.0), ("slow", SLOW_SEND)):
+            await manager.connect("recipient", StubSocket(delay))
+            p50 = await measure(client, headers, requests)
+            stats = manager.queue_stats()["recipient"]
+            print(f"{label} recipient: POST p50 {p50:.1f} ms, queue depth {stats['depth']}, dropped {stats['dropped']}")
+            await manager.disconnect("recipient")
+    await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
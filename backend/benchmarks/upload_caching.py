@@ -0,0 +1,149 @@
+"""
+Avatar caching: bytes and latency of repeat views.
+
+Writes content-addressed avatars (and their 64px thumbnails) into a
+temp uploads directory, starts a uvicorn worker there and has a client
+scroll a feed showing every avatar several times over:
+  - refetch: no client cache, every view downloads the full image
+  - revalidate: the client keeps the ETag and asks with If-None-Match
+  - immutable: the client honours Cache-Control and skips fresh entries
+  - thumbnail: as immutable, requesting ?size=64
+A Range request for the first KiB of each avatar is timed as well.
+
+    cd backend && python -m benchmarks.upload_caching [avatars] [views]
+"""
+from benchmarks.common import BENCH_DIR
+
+import asyncio
+import hashlib
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.cross_worker import BACKEND_DIR, free_port, seed_users, wait_until_up
+
+AVATARS = 50
+VIEWS = 10
+SIDE = 512
+AVATAR_PATH = "/api/v1/auth/uploads/avatars"
+
+
+def write_avatars(count: int) -> list:
+    """Random-noise JPEGs (so they don't compress away), stored like store_avatar does"""
+    from PIL import Image
+    from src.services.avatars import AVATAR_DIR, render_variants
+
+    directory = os.path.join(BENCH_DIR, AVATAR_DIR)
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(7)
+    names = []
+    for n in range(count):
+        temp = os.path.join(directory, f"seed-{n}.jpg")
+        Image.frombytes("RGB", (SIDE, SIDE), rng.randbytes(SIDE * SIDE * 3)).save(temp, quality=90)
+        with open(temp, "rb") as f:
+            name = f"{hashlib.sha256(f.read()).hexdigest()}.jpg"
+        path = os.path.join(directory, name)
+        os.replace(temp, path)
+        render_variants(path, [64], "webp")
+        names.append(name)
+    return names
+
+
+class ClientCache:
+    """Just enough of a browser cache: entries with an ETag and an expiry"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def fresh(self, url: str) -> bool:
+        entry = self.entries.get(url)
+        return entry is not None and entry["expires"] > time.monotonic()
+
+    def store(self, url: str, response: httpx.Response):
+        max_age = 0
+        for directive in response.headers.get("cache-control", "").split(","):
+            key, _, value = directive.strip().partition("=")
+            if key == "max-age":
+                max_age = int(value)
+        self.entries[url] = {"etag": response.headers.get("etag"), "expires": time.monotonic() + max_age}
+
+
+async def feed(client, urls: list, views: int, mode: str) -> dict:
+    cache = ClientCache()
+    requests = transferred = 0
+    latencies = []
+    for _ in range(views):
+        for url in urls:
+            headers = {}
+            if mode in ("immutable", "thumbnail") and cache.fresh(url):
+                continue
+            if mode == "revalidate" and url in cache.entries:
+                headers["If-None-Match"] = cache.entries[url]["etag"]
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            requests += 1
+            transferred += len(response.content)
+            if response.status_code == 200:
+                cache.store(url, response)
+    return {
+        "requests": requests,
+        "kib": transferred / 1024,
+        "p50": statistics.median(latencies),
+        "p95": statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0],
+    }
+
+
+async def ranges(client, urls: list) -> dict:
+    latencies = []
+    statuses = set()
+    transferred = 0
+    for url in urls:
+        start = time.perf_counter()
+        response = await client.get(url, headers={"Range": "bytes=0-1023"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses.add(response.status_code)
+        transferred += len(response.content)
+    return {"statuses": statuses, "kib": transferred / 1024, "p50": statistics.median(latencies)}
+
+
+async def run(port: int, names: list, views: int):
+    base = f"http://127.0.0.1:{port}{AVATAR_PATH}"
+    originals = [f"{base}/{name}" for name in names]
+    thumbnails = [f"{url}?size=64" for url in originals]
+    print(f"{len(names)} avatars ({SIDE}px JPEG), {views} views each")
+    print(f"{'':<12} {'requests':>9} {'KiB':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    async with httpx.AsyncClient() as client:
+        for mode, urls in (("refetch", originals), ("revalidate", originals),
+                           ("immutable", originals), ("thumbnail", thumbnails)):
+            result = await feed(client, urls, views, mode)
+            print(f"{mode:<12} {result['requests']:>9} {result['kib']:>10.0f} {result['p50']:>8.2f} {result['p95']:>8.2f}")
+        result = await ranges(client, originals)
+        print(f"range 1KiB: status {sorted(result['statuses'])}, {result['kib']:.0f} KiB, p50 {result['p50']:.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else AVATARS
+    views = int(sys.argv[2]) if len(sys.argv) > 2 else VIEWS
+    seed_users(0)
+    names = write_avatars(count)
+
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, DEBUG="False", UPLOADS_ACCEL_REDIRECT="")
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BENCH_DIR, env=env
+    )
+    try:
+        asyncio.run(wait_until_up(port))
+        asyncio.run(run(port, names, views))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
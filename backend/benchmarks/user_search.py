@@ -0,0 +1,110 @@
+"""
+User search: ilike scans vs the prefix + trigram index.
+
+Builds a users table from combinations of common first and last names,
+inserted through the normal table so the search triggers index them.
+Then, for typical search-box inputs, compares the previous query
+(ilike '%q%' on full_name or username, ordered by full_name) with
+UserService.search_users uncached and cached.
+
+    cd backend && python -m benchmarks.user_search [users]
+"""
+from benchmarks.common import timer
+
+import random
+import statistics
+import sys
+import uuid
+from sqlalchemy import or_
+from src.database import SessionLocal, engine, init_db
+from src.models.user import User, normalize_search_text
+from src.services.search_cache import user_search_cache
+from src.services.user_service import UserService
+
+USERS = 1_000_000
+CHUNK = 50_000
+RUNS = 5
+FIRST = ["anna", "maria", "john", "mohamed", "li", "sofia", "pierre", "amina", "kofi", "yuki",
+         "carlos", "fatima", "ivan", "chen", "olga", "pedro", "aisha", "lucas", "emma", "omar"]
+LAST = ["smith", "garcia", "nguyen", "okafor", "muller", "rossi", "kowalski", "tanaka", "haddad",
+        "silva", "dubois", "jensen", "mensah", "petrov", "santos", "wang", "khan", "lopez", "brown", "ali"]
+
+
+def build(users: int, rng):
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for offset in range(0, users, CHUNK):
+            rows = []
+            for n in range(offset, min(offset + CHUNK, users)):
+                full_name = f"{rng.choice(FIRST).title()} {rng.choice(LAST).title()}"
+                username = f"{full_name.split()[0].lower()}{n}"
+                rows.append((
+                    str(uuid.uuid4()), f"{username}@bench.io", username, full_name, "x", True, False, "user",
+                    username, normalize_search_text(full_name)
+                ))
+            cursor.executemany(
+                "INSERT INTO users (id, email, username, full_name, hashed_password, is_active, is_superuser, "
+                "role, username_lower, full_name_lower) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            raw.commit()
+            print(f"  {min(offset + CHUNK, users):>10} users", end="\r", flush=True)
+        print()
+    finally:
+        raw.close()
+
+
+def ilike_search(db, user_id: str, q: str):
+    pattern = f"%{q}%"
+    return db.query(User).filter(User.id != user_id).filter(
+        or_(User.full_name.ilike(pattern), User.username.ilike(pattern))
+    ).order_by(User.full_name.asc()).limit(10).all()
+
+
+def median_ms(func):
+    samples = []
+    for _ in range(RUNS):
+        with timer() as t:
+            result = func()
+        samples.append(t["elapsed"] * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    rng = random.Random(7)
+    init_db()
+    print(f"building {users} users")
+    with timer() as t:
+        build(users, rng)
+    print(f"built in {t['elapsed']:.0f} s")
+
+    db = SessionLocal()
+    me = str(uuid.uuid4())
+    username = db.query(User.username).offset(users // 2).limit(1).scalar()
+    queries = {
+        "1 char": "m",
+        "first name": "Maria",
+        "name prefix": "moh",
+        "full name": "Amina Haddad",
+        "username": username,
+        "infix": "ssi",
+        "no match": "zzzq",
+    }
+    print(f"{'':<12} {'q':<14} {'hits':>5} {'ilike ms':>10} {'index ms':>10} {'cached ms':>10}")
+    for label, q in queries.items():
+        ilike, _ = median_ms(lambda: ilike_search(db, me, q))
+
+        def uncached():
+            user_search_cache.clear()
+            return UserService.search_users(db, me, q)
+        indexed, results = median_ms(uncached)
+        cached, _ = median_ms(lambda: UserService.search_users(db, me, q))
+        db.expire_all()
+        print(f"{label:<12} {q:<14} {len(results):>5} {ilike:>10.1f} {indexed:>10.2f} {cached:>10.3f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Concurrent ChatService.send_message writers on SQLite.
+
+Runs the same threaded write load with the tuned pragma profile (WAL,
+synchronous=NORMAL, busy_timeout) and with SQLite's defaults, in separate
+processes, and reports throughput, "database is locked" failures and
+pool wait times.
+
+    cd backend && python -m benchmarks.write_contention [threads] [messages]
+"""
+import json
+import os
+import subprocess
+import sys
+
+THREADS = 16
+MESSAGES_PER_THREAD = 50
+
+PROFILES = {
+    "tuned": {},
+    "defaults": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "0",
+        "SQLITE_MMAP_SIZE": "0",
+    },
+}
+
+
+def child(threads: int, messages: int):
+    import benchmarks.common  # points DATABASE_URL at a temp database before src loads
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy.exc import OperationalError
+    from src.database import SessionLocal, init_db, pool_stats
+    from src.models.chat import MessageCreate
+    from src.services.chat_service import ChatService
+
+    import src.models  # noqa: F401  register every table before init_db
+    init_db()
+
+    def writer(index: int) -> int:
+        locked = 0
+        db = SessionLocal()
+        try:
+            for i in range(messages):
+                try:
+                    ChatService.send_message(
+                        db, f"sender-{index}", f"sender{index}", None,
+                        MessageCreate(receiver_id=f"receiver-{i % 10}", message=f"message {i}")
+                    )
+                except OperationalError:
+                    db.rollback()
+                    locked += 1
+        finally:
+            db.close()
+        return locked
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        locked = sum(executor.map(writer, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    attempted = threads * messages
+    print(json.dumps({
+        "written": attempted - locked,
+        "locked": locked,
+        "msgs_per_sec": (attempted - locked) / elapsed,
+        "pool": pool_stats()["sync"],
+    }))
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else THREADS
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else MESSAGES_PER_THREAD
+    print(f"{'profile':>9} {'written':>8} {'locked':>7} {'msg/s':>8} {'pool wait max ms':>17}")
+    for name, overrides in PROFILES.items():
+        env = dict(os.environ, BENCH_CHILD="1", **overrides)
+        env.pop("DATABASE_URL", None)
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-m", "benchmarks.write_contention", str(threads), str(messages)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:>9} {result['written']:>8} {result['locked']:>7} {result['msgs_per_sec']:>8.0f} "
+              f"{result['pool']['wait_max_ms']:>17.1f}")
+
+
+if __name__ == "__main__":
+    if os.environ.get("BENCH_CHILD"):
+        child(int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,107 @@
+"""
+Sustained chat message writes: one commit per message vs the write batcher.
+
+Concurrent producers stand in for WebSocket connections, each sending
+direct messages to a partner. The per-message run stores every message
+with ChatService.send_message (commit + refresh, as the REST route
+does); the batched run submits them to MessageWriteBatcher and waits
+for each ack. Reports messages/sec and ack latency.
+
+    cd backend && python -m benchmarks.ws_write_batching [messages] [producers]
+
+Set DATABASE_URL to run it against Postgres instead of a temp SQLite file.
+"""
+from benchmarks.common import timer
+
+import asyncio
+import statistics
+import sys
+import time
+from src.database import SessionLocal, init_db
+from src.models.chat import MessageCreate
+from src.services.chat_service import ChatService
+from src.services.message_batcher import MessageWriteBatcher
+
+MESSAGES = 5000
+PRODUCERS = 50
+# Per-message writers each hold a pooled connection; stay below 5 + 10 overflow
+PER_MESSAGE_WRITERS = 10
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, count, elapsed, latencies):
+    print(
+        f"{label:<22} {count / elapsed:>9.0f} msg/s   "
+        f"ack p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+        f"p99 {percentile(latencies, 99) * 1000:7.1f} ms"
+    )
+
+
+def payload(i, producers):
+    sender = f"user-{i % producers}"
+    receiver = f"user-{(i + 1) % producers}"
+    return sender, MessageCreate(receiver_id=receiver, message=f"message {i}")
+
+
+async def per_message(count, producers):
+    semaphore = asyncio.Semaphore(PER_MESSAGE_WRITERS)
+    latencies = []
+
+    def store(i):
+        sender, content = payload(i, producers)
+        db = SessionLocal()
+        try:
+            ChatService.send_message(db, sender, sender, sender, content)
+        finally:
+            db.close()
+
+    async def send(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await asyncio.to_thread(store, i)
+            latencies.append(time.perf_counter() - start)
+
+    with timer() as t:
+        await asyncio.gather(*(send(i) for i in range(count)))
+    return t["elapsed"], latencies
+
+
+async def batched(count, producers):
+    batcher = MessageWriteBatcher(batch_size=100, window=0.005)
+    await batcher.start()
+    latencies = []
+
+    async def producer(p):
+        for i in range(p, count, producers):
+            sender, content = payload(i, producers)
+            msg = ChatService.build_message(sender, sender, sender, content)
+            start = time.perf_counter()
+            await (await batcher.submit(msg))
+            latencies.append(time.perf_counter() - start)
+
+    with timer() as t:
+        await asyncio.gather(*(producer(p) for p in range(producers)))
+    await batcher.close()
+    return t["elapsed"], latencies, batcher.stats()
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    producers = int(sys.argv[2]) if len(sys.argv) > 2 else PRODUCERS
+    init_db()
+    print(f"{count} messages from {producers} producers")
+
+    elapsed, latencies = await per_message(count, producers)
+    report("commit per message", count, elapsed, latencies)
+
+    elapsed, latencies, stats = await batched(count, producers)
+    report("write batcher", count, elapsed, latencies)
+    print(f"  {stats['batches']} batches, avg {stats['avg_batch']} / max {stats['max_batch']} messages")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
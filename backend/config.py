@@ -6,6 +6,23 @@ load_dotenv()
 class Config:
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db/oreon.db")
+    # Serve requests through an AsyncSession (aiosqlite / asyncpg)
+    DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "False") == "True"
+    # Defaults to DATABASE_URL with the async driver swapped in
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+    
+    # Connection pool
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds, -1 disables
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True") == "True"
+    
+    # SQLite pragmas applied to every new connection (empty value skips the pragma)
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    SQLITE_MMAP_SIZE = os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))
     
     # API Settings
     API_TITLE = "Oreon App API"
@@ -16,6 +33,88 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "*THt![\^WBHzd'X2xCq2+x{Qh%T474`P;T[hnqf?:X2=2s?%D8")
     ALGORITHM = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+    JWT_BACKEND = os.getenv("JWT_BACKEND", "jose")  # jose, pyjwt, hmac (stdlib, HS* only)
+    # Verified tokens remembered per worker until they expire (0 disables)
+    JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 10000))
+    # Put user id, name and active/superuser flags in access tokens so most routes skip
+    # loading the user; changes to those take effect at the next login
+    JWT_EMBED_CLAIMS = os.getenv("JWT_EMBED_CLAIMS", "False") == "True"
+    
+    # Authenticated-user cache
+    USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "True") == "True"
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+    # Recent /users/search results (0 disables), cleared on user writes
+    USER_SEARCH_CACHE_SIZE = int(os.getenv("USER_SEARCH_CACHE_SIZE", 1000))
+    USER_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("USER_SEARCH_CACHE_TTL_SECONDS", 30))
+    
+    # Password hashing pool (HASH_POOL_WORKERS=0 hashes inline on the event loop)
+    HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")  # thread, process
+    HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 2))
+    HASH_POOL_MAX_PENDING = int(os.getenv("HASH_POOL_MAX_PENDING", 64))
+    
+    # Avatar thumbnails: square variants (px) rendered after upload on a thread pool
+    AVATAR_VARIANT_SIZES = [int(size) for size in os.getenv("AVATAR_VARIANT_SIZES", "64,128,256").split(",")]
+    AVATAR_VARIANT_FORMAT = os.getenv("AVATAR_VARIANT_FORMAT", "webp")  # webp, jpeg
+    AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", 2))
+    # Cache lifetime of uploads with versioned names (hash/timestamp) and of anything else
+    UPLOADS_IMMUTABLE_MAX_AGE = int(os.getenv("UPLOADS_IMMUTABLE_MAX_AGE", 365 * 24 * 3600))
+    UPLOADS_MAX_AGE = int(os.getenv("UPLOADS_MAX_AGE", 300))
+    # Internal nginx location serving ./uploads; when set, nginx sends the files with sendfile
+    UPLOADS_ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT", "")
+    
+    # Response compression: encodings by preference (those not installed are skipped), and
+    # the smallest body worth compressing
+    COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+    COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+    COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+    
+    # Realtime fan-out: memory:// for a single process, redis://host:port/db across workers
+    BROKER_URL = os.getenv("BROKER_URL", "memory://")
+    BROKER_CHANNEL_PREFIX = os.getenv("BROKER_CHANNEL_PREFIX", "oreon")
+    # Per-socket send timeout, so one slow client can't stall the rest
+    WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 2))
+    # Bounded outbound queue per WebSocket and what to do when it fills up (keyed updates such as
+    # presence and read receipts always replace a queued one; coalesce drops those first when full)
+    WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", 256))
+    WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")  # drop_oldest, coalesce, disconnect
+    # Room member sets cached per worker for fan-out
+    ROOM_MEMBERS_CACHE_SIZE = int(os.getenv("ROOM_MEMBERS_CACHE_SIZE", 10000))
+    ROOM_MEMBERS_CACHE_TTL_SECONDS = float(os.getenv("ROOM_MEMBERS_CACHE_TTL_SECONDS", 300))
+    # Messages sent over WebSockets are stored in batches of up to N or every few ms
+    WS_WRITE_BATCH_SIZE = int(os.getenv("WS_WRITE_BATCH_SIZE", 100))
+    WS_WRITE_BATCH_WINDOW_MS = float(os.getenv("WS_WRITE_BATCH_WINDOW_MS", 5))
+    # Reconnect sync (?since=<message id>): page size and how much to replay before deferring to REST
+    WS_SYNC_PAGE_SIZE = int(os.getenv("WS_SYNC_PAGE_SIZE", 200))
+    WS_SYNC_MAX_MESSAGES = int(os.getenv("WS_SYNC_MAX_MESSAGES", 2000))
+    # Presence: memory:// or redis://, defaulting to the broker's; online state expires
+    # after TTL without a heartbeat, and each user's changes are pushed at most once per interval
+    PRESENCE_URL = os.getenv("PRESENCE_URL", BROKER_URL)
+    PRESENCE_TTL_SECONDS = float(os.getenv("PRESENCE_TTL_SECONDS", 60))
+    PRESENCE_NOTIFY_INTERVAL_SECONDS = float(os.getenv("PRESENCE_NOTIFY_INTERVAL_SECONDS", 5))
+    
+    # Rate limits: "<requests>/<second|minute|hour>" token buckets (bursts up to <requests>,
+    # refilled evenly over the period), empty to disable one; memory:// or redis:// buckets
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True") == "True"
+    RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", BROKER_URL)
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))  # memory:// buckets per worker
+    RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")  # per client IP
+    RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "5/minute")  # per client IP
+    RATE_LIMIT_USER_SEARCH = os.getenv("RATE_LIMIT_USER_SEARCH", "120/minute")  # per user
+    RATE_LIMIT_SEND_MESSAGE = os.getenv("RATE_LIMIT_SEND_MESSAGE", "120/minute")  # per user, REST and WebSocket sends
+    # Header with the client address set by a trusted reverse proxy (e.g. X-Real-IP); empty
+    # uses the connecting address, which behind a proxy is the proxy's
+    RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+    
+    # Prometheus metrics at /metrics (request latency, queries per request, WebSocket queues)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+    # Development/canary query profiling: logs likely N+1 loops (a statement shape repeated this
+    # often in one request) and slow statements with their plan, and adds Server-Timing headers
+    QUERY_PROFILING = os.getenv("QUERY_PROFILING", "False") == "True"
+    QUERY_PROFILING_SLOW_MS = float(os.getenv("QUERY_PROFILING_SLOW_MS", 100))
+    QUERY_PROFILING_REPEAT_THRESHOLD = int(os.getenv("QUERY_PROFILING_REPEAT_THRESHOLD", 5))
     
     # App Settings
     DEBUG = os.getenv("DEBUG", "True") == "True"
@@ -0,0 +1,73 @@
+"""
+Shared pytest fixtures for the backend.
+
+Tests run against a throwaway SQLite database, with the working
+directory (and so ./uploads) in the same temporary directory and rate
+limits off. This has to happen before anything from `src` is imported.
+"""
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="oreon-test-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite:///{TEST_DIR}/test.db")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+os.chdir(TEST_DIR)
+
+import uuid
+from contextlib import contextmanager
+import pytest
+from fastapi.testclient import TestClient
+from src import oreon
+from src.auth.jwt_handler import JWTHandler
+from src.database import SessionLocal, async_engine, engine
+from src.models.user import User
+from src.services.query_profiler import capture_queries
+
+@pytest.fixture(scope="session")
+def client():
+    """The app, with its startup hooks run (WebSocket write batcher, presence)"""
+    with TestClient(oreon()) as client:
+        yield client
+
+@pytest.fixture
+def make_user():
+    """Insert a user directly (no password hashing); returns (user id, auth headers)"""
+    def create(**fields):
+        user_id = str(uuid.uuid4())
+        username = fields.pop("username", f"u_{user_id[:12]}")
+        db = SessionLocal()
+        try:
+            db.add(User(id=user_id, email=f"{username}@example.com", username=username, hashed_password="x", **fields))
+            db.commit()
+        finally:
+            db.close()
+        return user_id, {"Authorization": f"Bearer {JWTHandler.create_access_token({'sub': username})}"}
+    return create
+
+@pytest.fixture
+def max_queries():
+    """Fail if a block runs more SQL statements than allowed
+        
+        def test_conversations(client, max_queries):
+            with max_queries(2):
+                client.get("/api/v1/chat/conversations", headers=auth)
+    
+    Statements are counted on the engines themselves, so requests served
+    by TestClient's thread are included. The failure lists the
+    statements, most repeated shape first.
+    """
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    
+    @contextmanager
+    def check(limit: int):
+        with capture_queries(engines) as profile:
+            yield profile
+        if len(profile.queries) > limit:
+            repeated = "\n".join(f"  {count} x {shape}" for shape, count in profile.repeated(2))
+            statements = "\n".join(f"  {query.statement}" for query in profile.queries)
+            pytest.fail(
+                f"{len(profile.queries)} queries, expected at most {limit}\n"
+                f"repeated:\n{repeated or '  (none)'}\nstatements:\n{statements}"
+            )
+    
+    return check
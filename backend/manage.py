@@ -0,0 +1,34 @@
+"""
+Maintenance commands for the Oreon backend.
+
+    python manage.py rebuild-summaries [--user-id USER_ID]
+"""
+import argparse
+from src.database import SessionLocal, init_db
+from src.services.chat_service import ChatService
+
+
+def rebuild_summaries(args):
+    db = SessionLocal()
+    try:
+        count = ChatService.rebuild_conversation_summaries(db, args.user_id)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} conversation summary rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Oreon backend maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild = commands.add_parser("rebuild-summaries", help="Backfill or repair conversation_summary from chat_messages")
+    rebuild.add_argument("--user-id", default=None, help="Only rebuild the rows owned by this user")
+    rebuild.set_defaults(handler=rebuild_summaries)
+    
+    args = parser.parse_args()
+    init_db()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
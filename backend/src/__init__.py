@@ -1,16 +1,26 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 from src.routes.chat import router as chat_router
 from config import Config
-from src.database import init_db
+from src.database import async_engine, engine, init_db
+from src.auth.hash_password import password_hasher
+from src.realtime.connection_manager import manager
+from src.services.message_batcher import message_batcher
+from src.services.avatars import avatar_processor
+from src.services.static_files import upload_files
+from src.services.compression import CompressionMiddleware
+from src.services.rate_limit import rate_limiter
+from src.services.metrics import MetricsMiddleware, instrument_engine
+from src.services import query_profiler
 
 # IMPORT LOGIC:
 # We import both the Authentication router and the User search router 
 # from your auth.py file using explicit naming.
 from src.routes.auth import router as auth_router, user_router
 from src.routes.api import router as api_router
+from src.routes.system import router as system_router
+from src.routes.metrics import router as metrics_router
 
 def oreon() -> FastAPI:
     """
@@ -30,16 +40,41 @@ def oreon() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # zstd/br/gzip by what the client accepts; small bodies and images go out as is
+    app.add_middleware(CompressionMiddleware)
+    if Config.QUERY_PROFILING:
+        # Development/canary only: per-request SQL log, N+1 and slow query warnings
+        app.add_middleware(query_profiler.QueryProfilerMiddleware)
+        query_profiler.instrument_engine(engine)
+        if async_engine is not None:
+            query_profiler.instrument_engine(async_engine.sync_engine)
+    if Config.METRICS_ENABLED:
+        # Outermost, so the latency includes every other middleware
+        app.add_middleware(MetricsMiddleware)
+        instrument_engine(engine)
+        if async_engine is not None:
+            instrument_engine(async_engine.sync_engine)
     app.include_router(chat_router, prefix="/api/v1")
     
     # --- Database Initialization ---
     init_db()
     
+    # --- Startup / Shutdown Hooks ---
+    app.router.on_startup.append(manager.start)
+    app.router.on_startup.append(message_batcher.start)
+    # Flush queued WebSocket messages before the broker goes away
+    app.router.on_shutdown.append(message_batcher.close)
+    app.router.on_shutdown.append(manager.close)
+    app.router.on_shutdown.append(password_hasher.shutdown)
+    app.router.on_shutdown.append(avatar_processor.close)
+    app.router.on_shutdown.append(rate_limiter.close)
+    
     # --- Static Files Management ---
     # Ensure the upload directory exists
     if not os.path.exists("uploads"):
         os.makedirs("uploads")
-    app.mount("/api/uploads", StaticFiles(directory="uploads"), name="uploads")
+    # Versioned upload names are served as immutable, with 304s and byte ranges
+    app.mount("/api/uploads", upload_files, name="uploads")
 
     # --- Router Registration ---
     # The order of registration doesn't matter, but the prefixes do.
@@ -52,6 +87,13 @@ def oreon() -> FastAPI:
     
     # Resulting path: /api/v1/ oreon or other business logic
     app.include_router(api_router, prefix="/api/v1")
+    
+    # Resulting path: /api/v1/system/db/pool
+    app.include_router(system_router, prefix="/api/v1")
+    
+    # Resulting path: /metrics (scraped from inside the network, not exposed by nginx)
+    if Config.METRICS_ENABLED:
+        app.include_router(metrics_router)
 
     # --- Root Endpoint ---
     @app.get("/", tags=["Root"])
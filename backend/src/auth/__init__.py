@@ -1,11 +1,22 @@
-from src.auth.dependecies import get_current_active_user, get_current_superuser , get_current_user
-from src.auth.jwt_handler import JWTHandler
-from src.auth.hash_password import HashPassword
+from src.auth.dependecies import get_current_active_profile, get_current_active_user, get_current_superuser , get_current_user, get_token_user
+from src.auth.jwt_handler import InvalidToken, JWTHandler, TokenCache, token_cache
+from src.auth.hash_password import HashPassword, HashingPoolSaturated, PasswordHasherPool, password_hasher
+from src.auth.user_cache import UserCache, user_cache
 
 __all__ = [
+    "get_current_active_profile",
     "get_current_active_user",
     "get_current_superuser",
     "get_current_user",
+    "get_token_user",
+    "InvalidToken",
     "JWTHandler",
-    "HashPassword"
+    "TokenCache",
+    "token_cache",
+    "HashPassword",
+    "HashingPoolSaturated",
+    "PasswordHasherPool",
+    "password_hasher",
+    "UserCache",
+    "user_cache"
 ]
\ No newline at end of file
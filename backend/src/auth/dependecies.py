@@ -1,15 +1,61 @@
-from fastapi import Depends, HTTPException, status
+import math
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from src.database import get_db
+from typing import Optional
+from src.database import DbSession, get_session, run_in_session
 from src.models.user import User
 from src.auth.jwt_handler import JWTHandler
+from src.auth.user_cache import user_cache
+from src.services.rate_limit import rate_limiter
+from config import Config
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+def _get_user_by_username(db: Session, username: str):
+    return db.query(User).filter(User.username == username).first()
+
+def _user_from_claims(claims: dict) -> Optional[User]:
+    """A transient User holding only the claims embedded in the token, if it has them"""
+    if "uid" not in claims:
+        return None
+    return User(
+        id=claims["uid"],
+        username=claims["sub"],
+        full_name=claims.get("name"),
+        is_active=claims.get("active", False),
+        is_superuser=claims.get("su", False)
+    )
+
+async def authenticate_token(db: DbSession, token: str, from_claims: bool = False) -> Optional[User]:
+    """Resolve a bearer token to its user, or None if it isn't valid
+    
+    With from_claims, a token carrying embedded claims (JWT_EMBED_CLAIMS)
+    is resolved without the database, to a User with only id, username,
+    full_name, is_active and is_superuser set.
+    """
+    claims = JWTHandler.decode_token(token)
+    username = claims.get("sub") if claims is not None else None
+    if username is None:
+        return None
+    
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+    
+    if from_claims:
+        user = _user_from_claims(claims)
+        if user is not None:
+            return user
+    
+    user = await run_in_session(db, _get_user_by_username, username)
+    if user is not None:
+        user_cache.set(user)
+    return user
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_session)
 ) -> User:
     """Get the current authenticated user"""
     credentials_exception = HTTPException(
@@ -18,26 +64,43 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    username = JWTHandler.verify_token(token)
-    if username is None:
+    user = await authenticate_token(db, token)
+    if user is None:
         raise credentials_exception
+    return user
+
+async def get_token_user(
+    token: str = Depends(oauth2_scheme),
+    db: DbSession = Depends(get_session)
+) -> User:
+    """The authenticated user, possibly only the columns embedded in the token"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
     
-    user = db.query(User).filter(User.username == username).first()
+    user = await authenticate_token(db, token, from_claims=True)
     if user is None:
         raise credentials_exception
-    
     return user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_token_user)
 ) -> User:
-    """Get the current active user"""
+    """Get the current active user (see get_token_user for the columns set)"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-async def get_current_superuser(
+async def get_current_active_profile(
     current_user: User = Depends(get_current_user)
+) -> User:
+    """The current active user with every column loaded"""
+    return await get_current_active_user(current_user)
+
+async def get_current_superuser(
+    current_user: User = Depends(get_token_user)
 ) -> User:
     """Get the current superuser"""
     if not current_user.is_superuser:
@@ -45,4 +108,33 @@ async def get_current_superuser(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def client_ip(request: Request) -> str:
+    """The client's address, from RATE_LIMIT_CLIENT_IP_HEADER when set"""
+    if Config.RATE_LIMIT_CLIENT_IP_HEADER:
+        forwarded = request.headers.get(Config.RATE_LIMIT_CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+async def _enforce(name: str, key: str):
+    wait = await rate_limiter.check(name, key)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+def rate_limit_ip(name: str):
+    """Dependency applying the named limit per client IP, e.g. before authentication"""
+    async def check(request: Request):
+        await _enforce(name, client_ip(request))
+    return check
+
+def rate_limit_user(name: str):
+    """Dependency applying the named limit per authenticated user"""
+    async def check(current_user: User = Depends(get_token_user)):
+        await _enforce(name, current_user.id)
+    return check
\ No newline at end of file
@@ -1,4 +1,8 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
 from passlib.context import CryptContext
+from config import Config
 
 # Use argon2 instead of bcrypt (better for Python 3.13+)
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
@@ -12,4 +16,72 @@ class HashPassword:
     @staticmethod
     def get_password_hash(password: str) -> str:
         """Hash a password"""
-        return pwd_context.hash(password)
\ No newline at end of file
+        return pwd_context.hash(password)
+
+class HashingPoolSaturated(Exception):
+    """Raised when too many hashing jobs are already waiting for a worker"""
+
+class PasswordHasherPool:
+    """Runs argon2 hashing off the event loop on a bounded worker pool
+    
+    At most `max_pending` jobs may be queued or running at once; further
+    calls raise HashingPoolSaturated so callers can shed load instead of
+    queueing without limit. With `workers=0` hashing runs inline, which
+    is the old blocking behaviour.
+    """
+    
+    def __init__(self, workers: int, max_pending: int, kind: str = "thread"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        return self._executor
+    
+    async def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        
+        if self.pending >= self.max_pending:
+            raise HashingPoolSaturated()
+        
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+    
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a plain password against a hashed password"""
+        return await self._run(HashPassword.verify_password, plain_password, hashed_password)
+    
+    async def get_password_hash(self, password: str) -> str:
+        """Hash a password"""
+        return await self._run(HashPassword.get_password_hash, password)
+    
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+        }
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasherPool(
+    workers=Config.HASH_POOL_WORKERS,
+    max_pending=Config.HASH_POOL_MAX_PENDING,
+    kind=Config.HASH_POOL_KIND
+)
@@ -1,9 +1,152 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt, JWTError
+from src.services.ttl_cache import TTLCache
 from config import Config
 
+try:
+    import jwt as pyjwt
+except ModuleNotFoundError:
+    pyjwt = None  # optional dependency
+
+class InvalidToken(Exception):
+    """The token is malformed, badly signed or expired"""
+
+class JoseCodec:
+    """python-jose, supporting every algorithm it knows"""
+    
+    def __init__(self, secret: str, algorithm: str):
+        self.secret = secret
+        self.algorithm = algorithm
+    
+    def encode(self, claims: dict) -> str:
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm)
+    
+    def decode(self, token: str) -> dict:
+        try:
+            return jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except JWTError as e:
+            raise InvalidToken(str(e))
+
+class PyJWTCodec:
+    """PyJWT; only used when installed"""
+    
+    def __init__(self, secret: str, algorithm: str):
+        if pyjwt is None:
+            raise RuntimeError("JWT_BACKEND=pyjwt needs the PyJWT package")
+        self.secret = secret
+        self.algorithm = algorithm
+    
+    def encode(self, claims: dict) -> str:
+        return pyjwt.encode(claims, self.secret, algorithm=self.algorithm)
+    
+    def decode(self, token: str) -> dict:
+        try:
+            return pyjwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except pyjwt.PyJWTError as e:
+            raise InvalidToken(str(e))
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+class HmacCodec:
+    """HS256/384/512 with the standard library alone
+    
+    Does only what access tokens need: checks the header's alg against
+    the configured one, the signature, and the exp and nbf claims.
+    Several times faster than the general-purpose libraries, which spend
+    most of a decode on key and claim handling rather than the HMAC.
+    """
+    
+    DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+    
+    def __init__(self, secret: str, algorithm: str):
+        if algorithm not in self.DIGESTS:
+            raise RuntimeError(f"JWT_BACKEND=hmac supports {', '.join(self.DIGESTS)}, not {algorithm}")
+        self.key = secret.encode()
+        self.algorithm = algorithm
+        self.digest = self.DIGESTS[algorithm]
+        self.header = _b64encode(json.dumps({"alg": algorithm, "typ": "JWT"}, separators=(",", ":")).encode())
+    
+    def _sign(self, signing_input: str) -> bytes:
+        return hmac.new(self.key, signing_input.encode("ascii"), self.digest).digest()
+    
+    def encode(self, claims: dict) -> str:
+        claims = {
+            key: calendar.timegm(value.utctimetuple()) if isinstance(value, datetime) else value
+            for key, value in claims.items()
+        }
+        signing_input = self.header + "." + _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        return signing_input + "." + _b64encode(self._sign(signing_input))
+    
+    def decode(self, token: str) -> dict:
+        try:
+            signing_input, _, signature = token.rpartition(".")
+            header, _, payload = signing_input.partition(".")
+            if json.loads(_b64decode(header)).get("alg") != self.algorithm:
+                raise InvalidToken("unexpected algorithm")
+            if not hmac.compare_digest(self._sign(signing_input), _b64decode(signature)):
+                raise InvalidToken("signature verification failed")
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, AttributeError) as e:  # bad base64 / JSON / unicode, non-object header
+            raise InvalidToken(str(e))
+        if not isinstance(claims, dict):
+            raise InvalidToken("claims are not an object")
+        now = time.time()
+        if "exp" in claims and (not isinstance(claims["exp"], (int, float)) or claims["exp"] <= now):
+            raise InvalidToken("token expired")
+        if "nbf" in claims and (not isinstance(claims["nbf"], (int, float)) or claims["nbf"] > now):
+            raise InvalidToken("token not yet valid")
+        return claims
+
+CODECS = {"jose": JoseCodec, "pyjwt": PyJWTCodec, "hmac": HmacCodec}
+
+class TokenCache:
+    """Bounded LRU cache of verified token claims keyed by the token's digest
+    
+    Only tokens that verified are stored, and each only until its exp, so
+    a hit is as good as a fresh decode. The claims dict is shared between
+    hits; callers must not modify it.
+    """
+    
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize, clock=time.time)
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+    
+    def get(self, token: str) -> Optional[dict]:
+        if self._cache.maxsize <= 0:
+            return None
+        return self._cache.get(self._key(token))
+    
+    def set(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        if self._cache.maxsize <= 0 or not isinstance(exp, (int, float)):
+            return
+        self._cache.set(self._key(token), claims, expires=exp)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> dict:
+        return {"backend": Config.JWT_BACKEND, **self._cache.stats()}
+
+token_cache = TokenCache(maxsize=Config.JWT_CACHE_SIZE)
+
 class JWTHandler:
+    codec = CODECS[Config.JWT_BACKEND](Config.SECRET_KEY, Config.ALGORITHM)
+    
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
         """Create a JWT access token"""
@@ -15,17 +158,44 @@ class JWTHandler:
             expire = datetime.utcnow() + timedelta(minutes=Config.ACCESS_TOKEN_EXPIRE_MINUTES)
         
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, Config.SECRET_KEY, algorithm=Config.ALGORITHM)
+        encoded_jwt = JWTHandler.codec.encode(to_encode)
         return encoded_jwt
     
+    @staticmethod
+    def user_claims(user) -> dict:
+        """Claims identifying user in its access token
+        
+        With JWT_EMBED_CLAIMS the token also carries the user's id, name
+        and flags, so requests can be authorized without loading the user.
+        """
+        claims = {"sub": user.username}
+        if Config.JWT_EMBED_CLAIMS:
+            claims.update({
+                "uid": user.id,
+                "name": user.full_name,
+                "active": bool(user.is_active),
+                "su": bool(user.is_superuser),
+            })
+        return claims
+    
+    @staticmethod
+    def decode_token(token: str) -> Optional[dict]:
+        """Verified claims of a token, or None if it isn't valid; don't modify the result"""
+        claims = token_cache.get(token)
+        if claims is not None:
+            return claims
+        try:
+            claims = JWTHandler.codec.decode(token)
+        except InvalidToken:
+            return None
+        token_cache.set(token, claims)
+        return claims
+    
     @staticmethod
     def verify_token(token: str) -> Optional[str]:
         """Verify and decode a JWT token"""
-        try:
-            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=[Config.ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                return None
-            return username
-        except JWTError:
+        claims = JWTHandler.decode_token(token)
+        if claims is None:
             return None
+        username: str = claims.get("sub")
+        return username
@@ -0,0 +1,53 @@
+from typing import Optional
+from sqlalchemy.orm import make_transient_to_detached
+from src.models.user import User
+from src.services.ttl_cache import TTLCache
+from config import Config
+
+class UserCache:
+    """Bounded LRU cache of authenticated users keyed by token subject
+    
+    Stores a snapshot of the user's columns rather than the ORM instance,
+    so each request gets its own detached User that can be safely added to
+    that request's session.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.enabled = enabled
+        self._cache = TTLCache(maxsize, ttl)
+    
+    def get(self, username: str) -> Optional[User]:
+        """Return a fresh detached User for username, or None on a miss"""
+        if not self.enabled:
+            return None
+        
+        data = self._cache.get(username)
+        if data is None:
+            return None
+        user = User(**data)
+        make_transient_to_detached(user)
+        return user
+    
+    def set(self, user: User):
+        """Cache a snapshot of user under its username"""
+        if not self.enabled:
+            return
+        
+        data = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        self._cache.set(user.username, data)
+    
+    def invalidate(self, username: str):
+        """Drop a cached user after it was modified or deleted"""
+        self._cache.pop(username)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self._cache.stats()}
+
+user_cache = UserCache(
+    maxsize=Config.USER_CACHE_SIZE,
+    ttl=Config.USER_CACHE_TTL_SECONDS,
+    enabled=Config.USER_CACHE_ENABLED
+)
@@ -1,12 +1,77 @@
-from sqlalchemy import create_engine
+import functools
+import time
+from contextlib import asynccontextmanager
+from typing import Union
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from config import Config
 
-engine = create_engine(
-    Config.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in Config.DATABASE_URL else {}
-)
+# --- Connection pooling ---
+
+class _TimedPoolMixin:
+    """Records how long callers wait to check a connection out of the pool"""
+    wait_count = 0
+    wait_total = 0.0
+    wait_max = 0.0
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _engine_options(url: str, poolclass) -> dict:
+    """create_engine keyword arguments for the configured pool profile"""
+    options = {}
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        if url.rstrip("/").endswith(":memory:") or url.split(":", 1)[1].strip("/") == "":
+            # In-memory databases keep SQLAlchemy's single-connection pool
+            return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+    )
+    return options
+
+def _sqlite_pragmas() -> dict:
+    pragmas = {
+        "journal_mode": Config.SQLITE_JOURNAL_MODE,
+        "synchronous": Config.SQLITE_SYNCHRONOUS,
+        "busy_timeout": Config.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": Config.SQLITE_MMAP_SIZE,
+    }
+    return {name: value for name, value in pragmas.items() if value}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in _sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+engine = create_engine(Config.DATABASE_URL, **_engine_options(Config.DATABASE_URL, TimedQueuePool))
+if _is_sqlite(Config.DATABASE_URL):
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -18,5 +83,91 @@ def get_db():
     finally:
         db.close()
 
+# --- Async engine (aiosqlite / asyncpg), only built when enabled ---
+
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver"""
+    scheme, rest = url.split(":", 1)
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite:{rest}"
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        return f"postgresql+asyncpg:{rest}"
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+if Config.DATABASE_ASYNC:
+    _async_url = Config.ASYNC_DATABASE_URL or async_database_url(Config.DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **_engine_options(_async_url, TimedAsyncQueuePool))
+    if _is_sqlite(_async_url):
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+@asynccontextmanager
+async def session_scope():
+    """Open a session of the configured kind outside a request, e.g. in a WebSocket"""
+    if Config.DATABASE_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Session dependency used by the routes, selected by Config.DATABASE_ASYNC
+get_session = get_async_db if Config.DATABASE_ASYNC else get_db
+DbSession = Union[Session, AsyncSession]
+
+async def run_in_session(db, func, *args, **kwargs):
+    """Call a synchronous service function with either session type
+    
+    With an AsyncSession the function runs through `run_sync`, so its
+    queries go through the async driver without blocking the event loop.
+    """
+    if isinstance(db, Session):
+        return func(db, *args, **kwargs)
+    return await db.run_sync(func, *args, **kwargs)
+
+def awaitable(func):
+    """Wrap a `func(db, ...)` service method as an async static method"""
+    @functools.wraps(func)
+    async def wrapper(db, *args, **kwargs):
+        return await run_in_session(db, func, *args, **kwargs)
+    return staticmethod(wrapper)
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, _TimedPoolMixin):
+        stats.update(
+            checkouts=pool.wait_count,
+            wait_total_ms=round(pool.wait_total * 1000, 3),
+            wait_avg_ms=round(pool.wait_total * 1000 / pool.wait_count, 3) if pool.wait_count else 0.0,
+            wait_max_ms=round(pool.wait_max * 1000, 3),
+        )
+    return stats
+
+def pool_stats() -> dict:
+    """Connection pool usage for the sync and (if enabled) async engines"""
+    stats = {"sync": _pool_stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = _pool_stats(async_engine.pool)
+    return stats
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from src.migrations import run_migrations
+    
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
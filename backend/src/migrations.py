@@ -0,0 +1,240 @@
+"""
+Lightweight, idempotent schema migrations.
+
+`Base.metadata.create_all` only creates missing tables; it never adds
+columns or indexes to tables that already exist. Each step below checks
+the live schema first, so running them on every start is safe.
+"""
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(engine: Engine, table: str) -> set:
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def _create_missing_indexes(engine: Engine):
+    """Create indexes declared on the models but absent from the database"""
+    from src.database import Base
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _add_column(engine: Engine, table: str, column: str, ddl_type: str) -> bool:
+    """Add a nullable column if missing; returns True when it was added"""
+    if column in _columns(engine, table):
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return True
+
+
+def add_conversation_key(engine: Engine):
+    """Add chat_messages.conversation_key and backfill it for direct messages"""
+    if not _add_column(engine, "chat_messages", "conversation_key", "VARCHAR"):
+        return
+    
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE chat_messages SET conversation_key = CASE "
+            "WHEN sender_id < receiver_id THEN sender_id || ':' || receiver_id "
+            "ELSE receiver_id || ':' || sender_id END "
+            "WHERE receiver_id IS NOT NULL"
+        ))
+
+
+def add_room_id(engine: Engine):
+    """Add chat_messages.room_id for group messages"""
+    _add_column(engine, "chat_messages", "room_id", "VARCHAR")
+
+
+def add_user_search_columns(engine: Engine):
+    """Add users.username_lower / full_name_lower and backfill them"""
+    from src.models.user import normalize_search_text
+    
+    added = _add_column(engine, "users", "username_lower", "VARCHAR")
+    added = _add_column(engine, "users", "full_name_lower", "VARCHAR") or added
+    if not added:
+        return
+    
+    # Normalized in Python so existing rows match what the ORM writes
+    with engine.begin() as conn:
+        rows = conn.execute(text("SELECT id, username, full_name FROM users")).all()
+        if rows:
+            conn.execute(
+                text("UPDATE users SET username_lower = :username, full_name_lower = :full_name WHERE id = :id"),
+                [
+                    {"id": id, "username": normalize_search_text(username), "full_name": normalize_search_text(full_name)}
+                    for id, username, full_name in rows
+                ]
+            )
+
+
+def backfill_conversation_summary(engine: Engine):
+    """Populate conversation_summary the first time it is empty"""
+    from src.database import SessionLocal
+    from src.services.chat_service import ChatService
+    
+    with engine.connect() as conn:
+        has_summaries = conn.execute(text("SELECT 1 FROM conversation_summary LIMIT 1")).first()
+        has_messages = conn.execute(
+            text("SELECT 1 FROM chat_messages WHERE receiver_id IS NOT NULL LIMIT 1")
+        ).first()
+    if has_summaries or not has_messages:
+        return
+    
+    db = SessionLocal()
+    try:
+        ChatService.rebuild_conversation_summaries(db)
+    finally:
+        db.close()
+
+
+# Space-separated tokens naming who can see a message: "u<user id>" for both
+# ends of a direct message, "r<room id>" for a room message. Searching
+# with these as a second FTS column scopes results inside the index.
+_PARTICIPANTS_SQL = (
+    "CASE WHEN {row}room_id IS NOT NULL THEN 'r' || replace({row}room_id, '-', '') "
+    "ELSE 'u' || replace({row}sender_id, '-', '') || ' u' || replace({row}receiver_id, '-', '') END"
+)
+
+
+def create_message_search_index(engine: Engine):
+    """Full-text index on chat_messages.message
+    
+    SQLite: an FTS5 table using a view over chat_messages as external
+    content, kept in sync by triggers. Postgres: a generated tsvector
+    column with a GIN index. Other backends are left without one.
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(message, ''))) STORED"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_chat_messages_search ON chat_messages USING gin (search_vector)"
+            ))
+        return
+    if dialect != "sqlite":
+        return
+    
+    with engine.connect() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'chat_messages_fts'")
+        ).first()
+    if exists:
+        return
+    
+    new, old = _PARTICIPANTS_SQL.format(row="new."), _PARTICIPANTS_SQL.format(row="old.")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIEW IF NOT EXISTS chat_messages_search AS "
+            f"SELECT rowid AS message_rowid, message, {_PARTICIPANTS_SQL.format(row='')} AS participants "
+            "FROM chat_messages"
+        ))
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE chat_messages_fts USING fts5("
+            "message, participants, content='chat_messages_search', content_rowid='message_rowid')"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN "
+            "INSERT INTO chat_messages_fts(rowid, message, participants) "
+            f"VALUES (new.rowid, new.message, {new}); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN "
+            "INSERT INTO chat_messages_fts(chat_messages_fts, rowid, message, participants) "
+            f"VALUES ('delete', old.rowid, old.message, {old}); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER chat_messages_fts_update AFTER UPDATE OF message, sender_id, receiver_id, room_id "
+            "ON chat_messages BEGIN "
+            "INSERT INTO chat_messages_fts(chat_messages_fts, rowid, message, participants) "
+            f"VALUES ('delete', old.rowid, old.message, {old}); "
+            "INSERT INTO chat_messages_fts(rowid, message, participants) "
+            f"VALUES (new.rowid, new.message, {new}); END"
+        ))
+        # Index the messages already stored
+        conn.execute(text("INSERT INTO chat_messages_fts(chat_messages_fts) VALUES ('rebuild')"))
+
+
+def create_user_search_index(engine: Engine):
+    """Substring index for /users/search
+    
+    SQLite: an FTS5 trigram table over the normalized name columns, kept
+    in sync by triggers. Postgres: pg_trgm GIN indexes on the normalized
+    columns, which LIKE '%q%' uses directly. Without one, infix matches
+    fall back to scanning.
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for column in ("username_lower", "full_name_lower"):
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_users_{column}_trgm ON users USING gin ({column} gin_trgm_ops)"
+                    ))
+        except DBAPIError:
+            logger.warning("pg_trgm is unavailable; user search will scan for infix matches")
+        return
+    if dialect != "sqlite":
+        return
+    
+    with engine.connect() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'users_search'")).first()
+    if exists:
+        return
+    
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE users_search USING fts5("
+                "username_lower, full_name_lower, content='users', content_rowid='rowid', tokenize='trigram')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER users_search_insert AFTER INSERT ON users BEGIN "
+                "INSERT INTO users_search(rowid, username_lower, full_name_lower) "
+                "VALUES (new.rowid, new.username_lower, new.full_name_lower); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER users_search_delete AFTER DELETE ON users BEGIN "
+                "INSERT INTO users_search(users_search, rowid, username_lower, full_name_lower) "
+                "VALUES ('delete', old.rowid, old.username_lower, old.full_name_lower); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER users_search_update AFTER UPDATE OF username_lower, full_name_lower ON users BEGIN "
+                "INSERT INTO users_search(users_search, rowid, username_lower, full_name_lower) "
+                "VALUES ('delete', old.rowid, old.username_lower, old.full_name_lower); "
+                "INSERT INTO users_search(rowid, username_lower, full_name_lower) "
+                "VALUES (new.rowid, new.username_lower, new.full_name_lower); END"
+            ))
+            conn.execute(text("INSERT INTO users_search(users_search) VALUES ('rebuild')"))
+    except DBAPIError:
+        # The trigram tokenizer needs SQLite 3.34+
+        logger.warning("FTS5 trigram tokenizer is unavailable; user search will scan for infix matches")
+
+
+# Applied in order after create_all
+MIGRATIONS = [
+    add_conversation_key,
+    add_room_id,
+    add_user_search_columns,
+    _create_missing_indexes,
+    backfill_conversation_summary,
+    create_message_search_index,
+    create_user_search_index,
+]
+
+
+def run_migrations(engine: Engine):
+    for migration in MIGRATIONS:
+        migration(engine)
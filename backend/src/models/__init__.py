@@ -1,10 +1,11 @@
 from src.models.user import User
-from src.models.chat import ChatMessage, ChatRoom, ChatRoomMember
+from src.models.chat import ChatMessage, ChatRoom, ChatRoomMember, ConversationSummary
 
 __all__ = [
     "User",
     'ChatMessage',
     'ChatRoom',
-    'ChatRoomMember'
+    'ChatRoomMember',
+    'ConversationSummary'
 ]
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Integer
+from sqlalchemy import Column, String, DateTime, Boolean, Integer, Index
 from src.database import Base
 from pydantic import BaseModel
 from datetime import datetime
@@ -12,11 +12,20 @@ class ChatMessage(Base):
     sender_username = Column(String, nullable=False)
     sender_name = Column(String, nullable=True)
     receiver_id = Column(String, nullable=True, index=True)  # null for group messages
+    room_id = Column(String, nullable=True)  # set for group messages
+    conversation_key = Column(String, nullable=True)  # "<low id>:<high id>" for direct messages
     message = Column(String, nullable=False)
     message_type = Column(String, default="text")  # text, image, file
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_chat_messages_conversation", "conversation_key", "created_at", "id"),
+        Index("ix_chat_messages_room", "room_id", "created_at", "id"),
+        Index("ix_chat_messages_inbox", "receiver_id", "created_at", "id"),
+        Index("ix_chat_messages_unread", "receiver_id", "sender_id", "is_read"),
+    )
 
 class ChatRoom(Base):
     __tablename__ = "chat_rooms"
@@ -39,6 +48,21 @@ class ChatRoomMember(Base):
     joined_at = Column(DateTime, default=datetime.utcnow)
     unread_count = Column(Integer, default=0)
 
+class ConversationSummary(Base):
+    """Denormalized inbox row per (user, partner), maintained on write"""
+    __tablename__ = "conversation_summary"
+    
+    user_id = Column(String, primary_key=True)
+    partner_id = Column(String, primary_key=True)
+    last_message_id = Column(String, nullable=True)
+    last_message = Column(String, nullable=True)
+    last_message_time = Column(DateTime, nullable=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_conversation_summary_user_time", "user_id", "last_message_time", "partner_id"),
+    )
+
 # Pydantic Schemas
 class MessageCreate(BaseModel):
     receiver_id: Optional[str] = None
@@ -51,6 +75,7 @@ class MessageResponse(BaseModel):
     sender_username: str
     sender_name: Optional[str]
     receiver_id: Optional[str]
+    room_id: Optional[str] = None
     message: str
     message_type: str
     is_read: bool
@@ -59,6 +84,20 @@ class MessageResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class MessageSearchResult(MessageResponse):
+    snippet: str
+
+class RoomMessageCreate(BaseModel):
+    message: str
+    message_type: str = "text"
+
+class ReadMarker(BaseModel):
+    sender_id: str
+    up_to_message_id: Optional[str] = None  # omit to mark everything from this sender
+
+class BulkReadRequest(BaseModel):
+    markers: List[ReadMarker]
+
 class ChatRoomCreate(BaseModel):
     name: str
     description: Optional[str] = None
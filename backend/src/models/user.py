@@ -1,9 +1,9 @@
-from sqlalchemy import Column, String, Boolean, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Boolean, DateTime, event
 from src.database import Base
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, computed_field
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional
+from src.services.avatars import avatar_urls
 
 
 class User(Base):
@@ -22,9 +22,20 @@ class User(Base):
     farm_name = Column(String, nullable=True)
     phone = Column(String, nullable=True)
     avatar = Column(String, nullable=True) # Useful for the Chat UI
-    
-    # Relationships
-    conversations = relationship("Conversation", back_populates="user", cascade="all, delete-orphan")
+    # Normalized copies for /users/search prefix lookups, kept in sync below.
+    # Binary collation on Postgres so range scans on the index match prefixes.
+    username_lower = Column(String().with_variant(String(collation="C"), "postgresql"), index=True)
+    full_name_lower = Column(String().with_variant(String(collation="C"), "postgresql"), index=True)
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Case-folded, whitespace-collapsed form used for user search"""
+    return " ".join((value or "").casefold().split())
+
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def _normalize_search_columns(mapper, connection, user: User):
+    user.username_lower = normalize_search_text(user.username)
+    user.full_name_lower = normalize_search_text(user.full_name)
 
 # --- Pydantic Schemas (Data Transfer Objects) ---
 
@@ -55,9 +66,32 @@ class UserResponse(UserBase):
     avatar: Optional[str] = None  # Add this line
     created_at: datetime
     
+    @computed_field
+    @property
+    def avatar_urls(self) -> Optional[Dict[str, str]]:
+        """Original and thumbnail URLs; clients should pick the smallest that fits"""
+        return avatar_urls(self.avatar)
+    
     class Config:
         from_attributes = True # Allows Pydantic to read SQLAlchemy objects
 
+class UserSearchResult(BaseModel):
+    """Public profile fields returned by /users/search"""
+    id: str
+    username: str
+    full_name: Optional[str] = None
+    farm_name: Optional[str] = None
+    role: str
+    avatar: Optional[str] = None
+    
+    @computed_field
+    @property
+    def avatar_urls(self) -> Optional[Dict[str, str]]:
+        return avatar_urls(self.avatar)
+    
+    class Config:
+        from_attributes = True
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -0,0 +1,22 @@
+from src.realtime.broker import MessageBroker, InMemoryBroker, RedisBroker, create_broker
+from src.realtime.outbound import OutboundQueue
+from src.realtime.presence import PresenceBackend, InMemoryPresence, RedisPresence, PresenceRegistry, create_presence_backend
+from src.realtime.connection_manager import ConnectionManager, manager
+from src.realtime.rooms import RoomMembershipCache, room_members
+
+__all__ = [
+    "MessageBroker",
+    "InMemoryBroker",
+    "RedisBroker",
+    "create_broker",
+    "OutboundQueue",
+    "PresenceBackend",
+    "InMemoryPresence",
+    "RedisPresence",
+    "PresenceRegistry",
+    "create_presence_backend",
+    "ConnectionManager",
+    "manager",
+    "RoomMembershipCache",
+    "room_members"
+]
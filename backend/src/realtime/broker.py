@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Iterable, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Called with (user_id, message, coalesce_key) for every message this worker should deliver
+DeliverCallback = Callable[[str, str, Optional[str]], Awaitable[None]]
+# Called on every worker with each message sent through `publish_control`
+ControlCallback = Callable[[str], Awaitable[None]]
+
+class MessageBroker(ABC):
+    """Routes messages for a user to whichever worker holds their socket
+    
+    Each worker subscribes to the users connected to it and receives,
+    through the `deliver` callback, every message published for them by
+    any worker. Control messages (e.g. cache invalidations) go to every
+    worker, this one included, through `on_control`.
+    """
+    
+    def __init__(self):
+        self.deliver: Optional[DeliverCallback] = None
+        self.on_control: Optional[ControlCallback] = None
+    
+    async def start(self, deliver: DeliverCallback, on_control: Optional[ControlCallback] = None):
+        self.deliver = deliver
+        self.on_control = on_control
+    
+    @abstractmethod
+    async def subscribe(self, user_id: str):
+        ...
+    
+    @abstractmethod
+    async def unsubscribe(self, user_id: str):
+        ...
+    
+    @abstractmethod
+    async def publish(self, user_id: str, message: str, coalesce_key: Optional[str] = None):
+        ...
+    
+    async def publish_many(self, user_ids: Iterable[str], message: str, coalesce_key: Optional[str] = None):
+        """Publish one message to many users, e.g. a room broadcast"""
+        await asyncio.gather(*[self.publish(user_id, message, coalesce_key) for user_id in user_ids])
+    
+    @abstractmethod
+    async def publish_control(self, message: str):
+        """Send a message to every worker's `on_control`"""
+        ...
+    
+    async def close(self):
+        pass
+
+class InMemoryBroker(MessageBroker):
+    """Single-process broker: publishing delivers straight to local sockets"""
+    
+    async def subscribe(self, user_id: str):
+        pass
+    
+    async def unsubscribe(self, user_id: str):
+        pass
+    
+    async def publish(self, user_id: str, message: str, coalesce_key: Optional[str] = None):
+        if self.deliver is not None:
+            await self.deliver(user_id, message, coalesce_key)
+    
+    async def publish_many(self, user_ids: Iterable[str], message: str, coalesce_key: Optional[str] = None):
+        # Local delivery only enqueues, so a plain loop beats gathering tasks
+        if self.deliver is not None:
+            for user_id in user_ids:
+                await self.deliver(user_id, message, coalesce_key)
+    
+    async def publish_control(self, message: str):
+        if self.on_control is not None:
+            await self.on_control(message)
+
+# Separates an optional coalesce key from the message in Redis payloads
+_KEY_MARK = "\x1e"
+
+class RedisBroker(MessageBroker):
+    """Redis pub/sub broker with one channel per connected user"""
+    
+    def __init__(self, url: str, prefix: str = "oreon"):
+        super().__init__()
+        # Optional dependency, only needed when a redis:// broker is configured
+        import redis.asyncio as redis
+        
+        self.prefix = prefix
+        self.redis = redis.from_url(url)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+        
+        self.control_channel = f"{prefix}:control"
+    
+    def _channel(self, user_id: str) -> str:
+        return f"{self.prefix}:user:{user_id}"
+    
+    async def start(self, deliver: DeliverCallback, on_control: Optional[ControlCallback] = None):
+        await super().start(deliver, on_control)
+        # Always subscribed, which also keeps the reader's connection live
+        await self.pubsub.subscribe(self.control_channel)
+        self._reader = asyncio.create_task(self._read())
+    
+    async def _read(self):
+        channel_prefix = f"{self.prefix}:user:"
+        while True:
+            try:
+                async for event in self.pubsub.listen():
+                    if event["type"] != "message":
+                        continue
+                    channel = event["channel"].decode()
+                    data = event["data"].decode()
+                    if channel == self.control_channel:
+                        if self.on_control is not None:
+                            await self.on_control(data)
+                        continue
+                    if not channel.startswith(channel_prefix):
+                        continue
+                    coalesce_key = None
+                    if data.startswith(_KEY_MARK):
+                        coalesce_key, data = data[1:].split(_KEY_MARK, 1)
+                    await self.deliver(channel[len(channel_prefix):], data, coalesce_key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis broker reader failed, reconnecting")
+                await asyncio.sleep(1)
+    
+    async def subscribe(self, user_id: str):
+        await self.pubsub.subscribe(self._channel(user_id))
+    
+    async def unsubscribe(self, user_id: str):
+        await self.pubsub.unsubscribe(self._channel(user_id))
+    
+    @staticmethod
+    def _encode(message: str, coalesce_key: Optional[str]) -> str:
+        if coalesce_key is None:
+            return message
+        return f"{_KEY_MARK}{coalesce_key}{_KEY_MARK}{message}"
+    
+    async def publish(self, user_id: str, message: str, coalesce_key: Optional[str] = None):
+        await self.redis.publish(self._channel(user_id), self._encode(message, coalesce_key))
+    
+    async def publish_many(self, user_ids: Iterable[str], message: str, coalesce_key: Optional[str] = None):
+        # One round trip for the whole fan-out
+        data = self._encode(message, coalesce_key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.publish(self._channel(user_id), data)
+            await pipe.execute()
+    
+    async def publish_control(self, message: str):
+        await self.redis.publish(self.control_channel, message)
+    
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+def create_broker(url: Optional[str] = None) -> MessageBroker:
+    """Build the broker configured by Config.BROKER_URL"""
+    url = url or Config.BROKER_URL
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url, Config.BROKER_CHANNEL_PREFIX)
+    if url.startswith("memory://"):
+        return InMemoryBroker()
+    raise ValueError(f"Unsupported BROKER_URL: {url}")
@@ -0,0 +1,123 @@
+import json
+import logging
+import time
+from typing import Iterable, Optional
+from fastapi import WebSocket
+from src.realtime.broker import MessageBroker, create_broker
+from src.realtime.outbound import OutboundQueue
+from src.realtime.presence import PresenceRegistry, create_presence_backend
+from src.realtime.rooms import room_members
+from src.services.metrics import ws_fanout
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# WebSocket connection manager
+class ConnectionManager:
+    """Tracks this worker's WebSockets and delivers messages through a broker
+    
+    `send_personal_message` publishes to the broker; the worker holding the
+    recipient's socket (possibly this one) receives it in `deliver_local`
+    and enqueues it on that socket's outbound queue, so senders never wait
+    on a recipient's network.
+    """
+    
+    def __init__(self, broker: Optional[MessageBroker] = None, presence: Optional[PresenceRegistry] = None):
+        self.active_connections: dict = {}
+        self.outbound: dict = {}
+        self.broker = broker or create_broker()
+        self.presence = presence or PresenceRegistry(
+            create_presence_backend(),
+            ttl=Config.PRESENCE_TTL_SECONDS,
+            notify_interval=Config.PRESENCE_NOTIFY_INTERVAL_SECONDS
+        )
+    
+    async def start(self):
+        await self.broker.start(self.deliver_local, self.handle_control)
+        await self.presence.start(self.broadcast)
+    
+    async def close(self):
+        for queue in list(self.outbound.values()):
+            await queue.stop()
+        await self.presence.close()
+        await self.broker.close()
+    
+    async def connect(self, user_id: str, websocket: WebSocket, paused: bool = False):
+        """Register a socket; with `paused`, live messages queue up until `resume`"""
+        await websocket.accept()
+        previous = self.outbound.pop(user_id, None)
+        if previous is not None:
+            await previous.stop()
+        
+        async def evict():
+            await self.disconnect(user_id, websocket)
+            await websocket.close(code=1013)  # try again later
+        
+        queue = OutboundQueue(
+            websocket,
+            maxsize=Config.WS_OUTBOUND_QUEUE_SIZE,
+            policy=Config.WS_OVERFLOW_POLICY,
+            send_timeout=Config.WS_SEND_TIMEOUT_SECONDS,
+            on_evict=evict
+        )
+        if not paused:
+            queue.start()
+        self.active_connections[user_id] = websocket
+        self.outbound[user_id] = queue
+        await self.broker.subscribe(user_id)
+        await self.presence.connected(user_id)
+    
+    def resume(self, user_id: str):
+        """Start delivering live messages to a socket connected with `paused`"""
+        queue = self.outbound.get(user_id)
+        if queue is not None:
+            queue.start()
+    
+    async def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        # Ignore a stale socket when the user has already reconnected
+        if websocket is not None and self.active_connections.get(user_id) is not websocket:
+            return
+        if user_id in self.active_connections:
+            del self.active_connections[user_id]
+            queue = self.outbound.pop(user_id, None)
+            if queue is not None:
+                await queue.stop()
+            await self.broker.unsubscribe(user_id)
+            await self.presence.disconnected(user_id)
+    
+    async def send_personal_message(self, message: str, user_id: str, coalesce_key: Optional[str] = None):
+        start = time.perf_counter()
+        await self.broker.publish(user_id, message, coalesce_key)
+        ws_fanout.observe(time.perf_counter() - start, "personal")
+    
+    async def broadcast(self, message: str, user_ids: Iterable[str], coalesce_key: Optional[str] = None):
+        """Send one message to many users, e.g. every member of a room"""
+        start = time.perf_counter()
+        await self.broker.publish_many(user_ids, message, coalesce_key)
+        ws_fanout.observe(time.perf_counter() - start, "broadcast")
+    
+    async def deliver_local(self, user_id: str, message: str, coalesce_key: Optional[str] = None):
+        """Queue for the user's socket if it is connected to this worker"""
+        queue = self.outbound.get(user_id)
+        if queue is not None:
+            queue.put(message, coalesce_key)
+    
+    async def invalidate_room(self, room_id: str):
+        """Drop a room's cached members on every worker after its membership changed"""
+        room_members.invalidate(room_id)
+        await self.broker.publish_control(json.dumps({"type": "room_members", "room_id": room_id}))
+    
+    async def handle_control(self, message: str):
+        try:
+            event = json.loads(message)
+        except ValueError:
+            logger.warning("Ignoring malformed control message: %r", message)
+            return
+        if event.get("type") == "room_members":
+            room_members.invalidate(event["room_id"])
+    
+    def queue_stats(self) -> dict:
+        """Outbound queue metrics per connected user"""
+        return {user_id: queue.stats() for user_id, queue in self.outbound.items()}
+
+manager = ConnectionManager()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+class OutboundQueue:
+    """Bounded per-connection send queue drained by its own writer task
+    
+    `put` never waits on the network, so a slow recipient only fills its
+    own queue. A message with a coalesce key (presence updates, read
+    receipts) replaces a queued one with the same key, whatever the
+    policy. When the queue is full the overflow policy decides:
+    - drop_oldest: discard the oldest queued message
+    - coalesce: discard the oldest keyed message, since a later update
+      supersedes it anyway; without one, fall back to drop_oldest
+    - disconnect: evict the slow consumer
+    """
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        maxsize: int,
+        policy: str = "drop_oldest",
+        send_timeout: Optional[float] = None,
+        on_evict: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_evict = on_evict
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self._entries: deque = deque()
+        self._by_key: dict = {}
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._evicted = False
+    
+    @property
+    def depth(self) -> int:
+        return len(self._entries)
+    
+    def start(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._drain())
+    
+    async def stop(self):
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._writer = None
+    
+    def put(self, message: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a message; returns False if it was not accepted"""
+        if self._evicted:
+            return False
+        
+        if coalesce_key is not None:
+            entry = self._by_key.get(coalesce_key)
+            if entry is not None:
+                entry[1] = message
+                self.coalesced += 1
+                return True
+        
+        if len(self._entries) >= self.maxsize:
+            if self.policy == "disconnect":
+                self._evict()
+                return False
+            if self.policy == "coalesce" and self._by_key:
+                self._drop_oldest_keyed()
+            else:
+                self._drop_oldest()
+        
+        entry = [coalesce_key, message]
+        self._entries.append(entry)
+        if coalesce_key is not None:
+            self._by_key[coalesce_key] = entry
+        self.max_depth = max(self.max_depth, len(self._entries))
+        self._ready.set()
+        return True
+    
+    def _pop(self) -> list:
+        entry = self._entries.popleft()
+        if entry[0] is not None and self._by_key.get(entry[0]) is entry:
+            del self._by_key[entry[0]]
+        return entry
+    
+    def _drop_oldest(self):
+        self._pop()
+        self.dropped += 1
+    
+    def _drop_oldest_keyed(self):
+        for index, entry in enumerate(self._entries):
+            if entry[0] is not None:
+                break
+        del self._entries[index]
+        del self._by_key[entry[0]]
+        self.dropped += 1
+    
+    def _evict(self):
+        self._evicted = True
+        self.dropped += len(self._entries) + 1
+        self._entries.clear()
+        self._by_key.clear()
+        logger.warning("Evicting slow WebSocket consumer")
+        if self.on_evict is not None:
+            asyncio.create_task(self.on_evict())
+    
+    async def _drain(self):
+        while True:
+            if not self._entries:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            
+            message = self._pop()[1]
+            try:
+                await asyncio.wait_for(self.websocket.send_text(message), self.send_timeout)
+                self.sent += 1
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                if self.policy == "disconnect":
+                    self._evict()
+                    return
+            except Exception:
+                # Socket is gone; the receive loop will clean the connection up
+                return
+    
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import logging
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Called with (message, user_ids, coalesce_key), i.e. ConnectionManager.broadcast
+NotifyCallback = Callable[[str, Iterable[str], Optional[str]], Awaitable[None]]
+# Maps changed user ids to the users who should hear about it
+WatchersCallback = Callable[[List[str]], Awaitable[Dict[str, Iterable[str]]]]
+
+def _sizeof(mapping: dict) -> int:
+    """Shallow size of a dict plus its keys and values"""
+    return sys.getsizeof(mapping) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in mapping.items())
+
+class PresenceBackend(ABC):
+    """Shared record of who is online; entries expire unless refreshed"""
+    
+    @abstractmethod
+    async def touch(self, user_ids: Iterable[str], ttl: float):
+        ...
+    
+    @abstractmethod
+    async def remove(self, user_ids: Iterable[str]):
+        ...
+    
+    @abstractmethod
+    async def get_many(self, user_ids: List[str]) -> List[bool]:
+        ...
+    
+    def memory_usage(self) -> Optional[int]:
+        """Bytes held in this process, or None when the data lives elsewhere"""
+        return None
+    
+    async def close(self):
+        pass
+
+class InMemoryPresence(PresenceBackend):
+    """Single-process backend: user id -> monotonic expiry time"""
+    
+    def __init__(self):
+        self._expires: Dict[str, float] = {}
+        self._next_prune = 0.0
+    
+    async def touch(self, user_ids: Iterable[str], ttl: float):
+        now = time.monotonic()
+        # Drop expired entries now and then, keeping per-connect touches O(1)
+        if now >= self._next_prune:
+            for user_id in [u for u, expires in self._expires.items() if expires <= now]:
+                del self._expires[user_id]
+            self._next_prune = now + ttl
+        for user_id in user_ids:
+            self._expires[user_id] = now + ttl
+    
+    async def remove(self, user_ids: Iterable[str]):
+        for user_id in user_ids:
+            self._expires.pop(user_id, None)
+    
+    async def get_many(self, user_ids: List[str]) -> List[bool]:
+        now = time.monotonic()
+        return [self._expires.get(user_id, 0) > now for user_id in user_ids]
+    
+    def memory_usage(self) -> Optional[int]:
+        return _sizeof(self._expires)
+
+class RedisPresence(PresenceBackend):
+    """One expiring key per online user, shared by every worker"""
+    
+    def __init__(self, url: str, prefix: str = "oreon"):
+        # Optional dependency, only needed when a redis:// backend is configured
+        import redis.asyncio as redis
+    
+        self.prefix = prefix
+        self.redis = redis.from_url(url)
+    
+    def _key(self, user_id: str) -> str:
+        return f"{self.prefix}:presence:{user_id}"
+    
+    async def touch(self, user_ids: Iterable[str], ttl: float):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.set(self._key(user_id), 1, px=int(ttl * 1000))
+            await pipe.execute()
+    
+    async def remove(self, user_ids: Iterable[str]):
+        keys = [self._key(user_id) for user_id in user_ids]
+        if keys:
+            await self.redis.delete(*keys)
+    
+    async def get_many(self, user_ids: List[str]) -> List[bool]:
+        if not user_ids:
+            return []
+        values = await self.redis.mget([self._key(user_id) for user_id in user_ids])
+        return [value is not None for value in values]
+    
+    async def close(self):
+        await self.redis.aclose()
+
+def create_presence_backend(url: Optional[str] = None) -> PresenceBackend:
+    """Build the backend configured by Config.PRESENCE_URL"""
+    url = url or Config.PRESENCE_URL
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisPresence(url, Config.BROKER_CHANNEL_PREFIX)
+    if url.startswith("memory://"):
+        return InMemoryPresence()
+    raise ValueError(f"Unsupported PRESENCE_URL: {url}")
+
+async def conversation_partners(user_ids: List[str]) -> Dict[str, Iterable[str]]:
+    """Default watchers: everyone with a conversation with the user"""
+    from src.database import session_scope
+    from src.services.chat_service import AsyncChatService
+    
+    async with session_scope() as db:
+        return await AsyncChatService.get_conversation_partners(db, user_ids)
+
+class PresenceRegistry:
+    """Who is online, fed by ConnectionManager connect/disconnect and heartbeats
+    
+    Sockets on this worker are tracked with their last heartbeat. A
+    sweeper refreshes them all in the backend in one batch every ttl/3
+    and expires the ones that stopped heartbeating.
+    
+    Changes are pushed to watchers as `presence` events. Each user gets at
+    most one event per notify_interval, and only if their state differs
+    from what watchers last saw, so a flapping client stays quiet.
+    """
+    
+    def __init__(
+        self,
+        backend: PresenceBackend,
+        ttl: float,
+        notify_interval: float,
+        watchers: Optional[WatchersCallback] = None
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.notify_interval = notify_interval
+        self.watchers = watchers or conversation_partners
+        self.notify: Optional[NotifyCallback] = None
+        self.events_sent = 0
+        self.changes_suppressed = 0
+        self._heartbeats: Dict[str, float] = {}
+        # user id -> state watchers last saw, for users with an unsent change
+        self._pending: Dict[str, bool] = {}
+        # user id -> when their last event went out, for rate limiting
+        self._last_sent: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self, notify: NotifyCallback):
+        self.notify = notify
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Don't leave this worker's users online until their keys expire
+        await self.backend.remove(list(self._heartbeats))
+        self._heartbeats.clear()
+        await self.backend.close()
+    
+    def _changed(self, user_id: str, was_online: bool):
+        self._pending.setdefault(user_id, was_online)
+    
+    async def connected(self, user_id: str):
+        if user_id not in self._heartbeats:
+            self._changed(user_id, False)
+        self._heartbeats[user_id] = time.monotonic()
+        await self.backend.touch([user_id], self.ttl)
+    
+    async def heartbeat(self, user_id: str):
+        if user_id in self._heartbeats:
+            self._heartbeats[user_id] = time.monotonic()
+        else:
+            # Expired while the socket stayed open; back online
+            await self.connected(user_id)
+    
+    async def disconnected(self, user_id: str):
+        if self._heartbeats.pop(user_id, None) is not None:
+            self._changed(user_id, True)
+            await self.backend.remove([user_id])
+    
+    async def lookup(self, user_ids: List[str]) -> Dict[str, bool]:
+        """Online state for many users in one backend round trip"""
+        return dict(zip(user_ids, await self.backend.get_many(user_ids)))
+    
+    async def _run(self):
+        tick = min(self.notify_interval, self.ttl / 3)
+        next_refresh = time.monotonic() + self.ttl / 3
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                if time.monotonic() >= next_refresh:
+                    await self._sweep()
+                    next_refresh = time.monotonic() + self.ttl / 3
+                await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Presence sweep failed")
+    
+    async def _sweep(self):
+        cutoff = time.monotonic() - self.ttl
+        expired = [user_id for user_id, seen in self._heartbeats.items() if seen < cutoff]
+        for user_id in expired:
+            await self.disconnected(user_id)
+        await self.backend.touch(list(self._heartbeats), self.ttl)
+    
+    async def _flush(self):
+        now = time.monotonic()
+        for user_id in [u for u, sent in self._last_sent.items() if now - sent >= self.notify_interval]:
+            del self._last_sent[user_id]
+    
+        changes = {}
+        for user_id, was_online in list(self._pending.items()):
+            if user_id in self._last_sent:
+                continue  # rate limited, keep it pending
+            del self._pending[user_id]
+            online = user_id in self._heartbeats
+            if online == was_online:
+                self.changes_suppressed += 1
+                continue
+            changes[user_id] = online
+        if not changes or self.notify is None:
+            return
+    
+        watchers = await self.watchers(list(changes))
+        for user_id, online in changes.items():
+            self._last_sent[user_id] = now
+            recipients = watchers.get(user_id)
+            if not recipients:
+                continue
+            event = json.dumps({"type": "presence", "user_id": user_id, "online": online})
+            await self.notify(event, recipients, f"presence:{user_id}")
+            self.events_sent += 1
+    
+    def stats(self) -> dict:
+        local = _sizeof(self._heartbeats) + _sizeof(self._pending) + _sizeof(self._last_sent)
+        backend = self.backend.memory_usage()
+        tracked = len(self._heartbeats)
+        total = local + (backend or 0)
+        return {
+            "backend": type(self.backend).__name__,
+            "tracked_users": tracked,
+            "pending_changes": len(self._pending),
+            "events_sent": self.events_sent,
+            "changes_suppressed": self.changes_suppressed,
+            "memory_bytes": total,
+            "bytes_per_user": round(total / tracked, 1) if tracked else 0,
+        }
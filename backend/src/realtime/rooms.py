@@ -0,0 +1,33 @@
+from typing import FrozenSet, Iterable, Optional
+from src.services.ttl_cache import TTLCache
+from config import Config
+
+class RoomMembershipCache:
+    """In-memory room_id -> member user ids, so broadcasts skip the DB
+    
+    Membership changes are announced over the broker and every worker
+    drops the room (ConnectionManager.invalidate_room); the TTL bounds
+    how long a lost announcement can go unseen. A stale set only decides
+    fan-out: access checks re-read the database before refusing a user
+    missing from it.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl)
+    
+    def get(self, room_id: str) -> Optional[FrozenSet[str]]:
+        return self._cache.get(room_id)
+    
+    def set(self, room_id: str, user_ids: Iterable[str]):
+        self._cache.set(room_id, frozenset(user_ids))
+    
+    def invalidate(self, room_id: str):
+        self._cache.pop(room_id)
+    
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+room_members = RoomMembershipCache(
+    maxsize=Config.ROOM_MEMBERS_CACHE_SIZE,
+    ttl=Config.ROOM_MEMBERS_CACHE_TTL_SECONDS
+)
@@ -1,45 +1,82 @@
+import asyncio
 import os
-from datetime import timedelta, datetime
-from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from datetime import timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from src.database import get_db
-from src.models.user import UserCreate, UserResponse, Token, User
-from src.services.user_service import UserService
-from src.auth.jwt_handler import JWTHandler
-from src.auth.dependecies import get_current_active_user, get_current_superuser, get_current_user
+from src.database import DbSession, get_session, run_in_session, session_scope
+from src.models.user import UserCreate, UserResponse, UserSearchResult, Token, User
+from src.services.user_service import AsyncUserService
+from src.auth.jwt_handler import JWTHandler, token_cache
+from src.auth.dependecies import (
+    get_current_active_profile, get_current_active_user, get_current_superuser, get_current_user, rate_limit_ip, rate_limit_user
+)
+from src.auth.user_cache import user_cache
+from src.auth.hash_password import HashingPoolSaturated, password_hasher
+from src.services.search_cache import user_search_cache
+from src.services.uploads import InvalidUpload, UploadTooLarge, receive_upload
+from src.services.avatars import AVATAR_DIR, avatar_urls, remove_avatar, resolve_avatar_path, settle_avatar, store_avatar
+from src.services.static_files import SHORT_LIVED, upload_files
 from config import Config
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 user_router = APIRouter(prefix="/users", tags=["Users"])
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+def hashing_busy_exception() -> HTTPException:
+    """429 returned when the password hashing pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+@router.post(
+    "/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit_ip("register"))]
+)
+async def register(user: UserCreate, db: DbSession = Depends(get_session)):
     """Register a new user"""
     # Check if user already exists
-    if UserService.get_user_by_username(db, user.username):
+    if await AsyncUserService.get_user_by_username(db, user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
-    if UserService.get_user_by_email(db, user.email):
+    if await AsyncUserService.get_user_by_email(db, user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    return UserService.create_user(db, user)
+    # Hashing takes a while; don't hold a pooled connection through it
+    await run_in_session(db, Session.commit)
+    try:
+        hashed_password = await password_hasher.get_password_hash(user.password)
+    except HashingPoolSaturated:
+        raise hashing_busy_exception()
+    
+    return await AsyncUserService.create_user(db, user, hashed_password)
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limit_ip("login"))])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_session)
 ):
     """Login and get access token"""
-    user = UserService.authenticate_user(db, form_data.username, form_data.password)
+    user = await AsyncUserService.get_user_by_username(db, form_data.username)
+    # Release the connection before verifying; the user is detached so it stays loaded
+    if user is not None:
+        await run_in_session(db, Session.expunge, user)
+    await run_in_session(db, Session.commit)
+    try:
+        if user and not await password_hasher.verify_password(form_data.password, user.hashed_password):
+            user = None
+    except HashingPoolSaturated:
+        raise hashing_busy_exception()
+    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,13 +92,13 @@ async def login(
     
     access_token_expires = timedelta(minutes=Config.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = JWTHandler.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=JWTHandler.user_claims(user), expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_active_profile)):
     """Get current user information"""
     return current_user
 
@@ -69,12 +106,18 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
 async def update_user_me(
     user_update: dict,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_session)
 ):
     """Update current user information"""
     from src.models.user import UserUpdate
     user_data = UserUpdate(**user_update)
-    updated_user = UserService.update_user(db, current_user.username, user_data)
+    hashed_password = None
+    if user_data.password:
+        try:
+            hashed_password = await password_hasher.get_password_hash(user_data.password)
+        except HashingPoolSaturated:
+            raise hashing_busy_exception()
+    updated_user = await AsyncUserService.update_user(db, current_user.username, user_data, hashed_password)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
     return updated_user
@@ -84,148 +127,156 @@ async def get_all_users(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_superuser),
-    db: Session = Depends(get_db)
+    db: DbSession = Depends(get_session)
 ):
     """Get all users (superuser only)"""
-    return UserService.get_all_users(db, skip, limit)
+    return await AsyncUserService.get_all_users(db, skip, limit)
+
+@router.get("/cache/stats")
+async def get_user_cache_stats(current_user: User = Depends(get_current_superuser)):
+    """Authenticated-user cache hit/miss counters (superuser only)"""
+    return user_cache.stats()
+
+@router.get("/token-cache/stats")
+async def get_token_cache_stats(current_user: User = Depends(get_current_superuser)):
+    """Verified-token cache hit/miss counters (superuser only)"""
+    return token_cache.stats()
 
-@user_router.get("/search")
+@user_router.get("/search", response_model=List[UserSearchResult], dependencies=[Depends(rate_limit_user("user_search"))])
 async def search_users(
     q: str = "", 
     role: str = None, # Make role optional to prevent empty results
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
-    from sqlalchemy import or_
-    
-    # 1. Start the query base
-    query = db.query(User).filter(User.id != current_user.id)
-    
-    # 2. Filter by role ONLY if one is provided
-    if role:
-        query = query.filter(User.role == role)
-        
-    # 3. Apply the search string
-    if q:
-        search_pattern = f"%{q}%"
-        query = query.filter(
-            or_(
-                User.full_name.ilike(search_pattern),
-                User.username.ilike(search_pattern)
-            )
-        )
-    
-    # 4. Order by name and limit
-    return query.order_by(User.full_name.asc()).limit(10).all()
+    """Search other users by name or username, exact and prefix matches first"""
+    return await AsyncUserService.search_users(db, current_user.id, q, role)
+
+@user_router.get("/search/cache/stats")
+async def get_user_search_cache_stats(current_user: User = Depends(get_current_superuser)):
+    """Cached /users/search results on this worker (superuser only)"""
+    return user_search_cache.stats()
 
-UPLOAD_DIR = "uploads/avatars"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(AVATAR_DIR, exist_ok=True)
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
-@router.post("/me/avatar")
+# The body is read by receive_upload rather than a File() parameter, so
+# describe the form for the docs by hand
+AVATAR_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+async def avatar_in_use(filename: str) -> bool:
+    # A new session per check, so remove_avatar's second check sees commits made since the first
+    async with session_scope() as db:
+        return await AsyncUserService.avatar_in_use(db, filename)
+
+@router.post("/me/avatar", openapi_extra=AVATAR_UPLOAD_BODY)
 async def upload_avatar(
-    file: UploadFile = File(...),
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
 ):
-    """Upload user avatar/profile picture"""
+    """Upload user avatar/profile picture
     
+    The file is streamed to disk and rejected as soon as it passes 5MB;
+    its type is taken from its magic bytes, not its name, and Pillow
+    (when installed) must be able to parse it. It is stored under its
+    content hash, and thumbnails are rendered in the background.
+    """
+    old_avatar = current_user.avatar
+    # End the auth lookup's transaction so a slow upload doesn't hold a pooled connection
+    await run_in_session(db, Session.commit)
     try:
-        # Validate file type
-        file_ext = Path(file.filename).suffix.lower()
-        if file_ext not in ALLOWED_EXTENSIONS:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
-        
-        # Validate file size
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Maximum size: 5MB"
-            )
-        
-        # Create filename with user ID and timestamp
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"{current_user.id}_{timestamp}{file_ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        
-        # Save file
-        with open(filepath, "wb") as f:
-            f.write(file_content)
-        
-        # Delete old avatar if exists
-        if current_user.avatar:
-            old_path = os.path.join(UPLOAD_DIR, current_user.avatar)
-            if os.path.exists(old_path):
-                os.remove(old_path)
+        upload = await receive_upload(request, "file", AVATAR_DIR, MAX_FILE_SIZE)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: 5MB",
+            # Drop the connection so the client stops sending the rest
+            headers={"Connection": "close"}
+        )
+    except InvalidUpload as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    try:
+        filename = await store_avatar(upload)
         
-        # Update user avatar in database
-        current_user.avatar = filename
-        current_user.updated_at = datetime.utcnow()
-        db.add(current_user)
-        db.commit()
-        db.refresh(current_user)
+        # Update user avatar in database, then drop the old files if nobody else uses them
+        await AsyncUserService.set_avatar(db, current_user, filename)
+        await settle_avatar(upload, filename)
+        if old_avatar and old_avatar != filename:
+            await remove_avatar(old_avatar, lambda: avatar_in_use(old_avatar))
         
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "message": "Avatar uploaded successfully",
                 "avatar": filename,
-                "avatar_url": f"/api/uploads/avatars/{filename}"
+                "avatar_url": f"/api/uploads/avatars/{filename}",
+                "avatar_urls": avatar_urls(filename)
             }
         )
     
-    except HTTPException:
-        raise
     except Exception as e:
-        db.rollback()
+        await upload.discard()
+        await run_in_session(db, Session.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload avatar: {str(e)}"
         )
 
 @router.get("/uploads/avatars/{filename}")
-async def get_avatar(filename: str):
-    """Retrieve avatar image"""
-    filepath = os.path.join(UPLOAD_DIR, filename)
+async def get_avatar(request: Request, filename: str, size: Optional[int] = Query(None, ge=1)):
+    """Retrieve avatar image, or with ?size= its smallest thumbnail at least that many px wide"""
+    filepath = await asyncio.to_thread(resolve_avatar_path, filename, size)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, filepath) if filepath else None
+    except FileNotFoundError:
+        stat_result = None
     
-    if not os.path.exists(filepath):
+    if stat_result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Avatar not found"
         )
     
-    from fastapi.responses import FileResponse
-    return FileResponse(filepath)
+    # A size served from the original until its thumbnail is rendered must not be cached for good
+    fallback = size is not None and os.path.basename(filepath) == filename
+    return upload_files.file_response(filepath, stat_result, request.scope, cache_control=SHORT_LIVED if fallback else None)
 
 @router.delete("/me/avatar")
 async def delete_avatar(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
 ):
     """Delete user avatar"""
     
     try:
-        if current_user.avatar:
-            filepath = os.path.join(UPLOAD_DIR, current_user.avatar)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        
-        current_user.avatar = None
-        current_user.updated_at = datetime.utcnow()
-        db.add(current_user)
-        db.commit()
+        old_avatar = current_user.avatar
+        await AsyncUserService.set_avatar(db, current_user, None)
+        if old_avatar:
+            await remove_avatar(old_avatar, lambda: avatar_in_use(old_avatar))
         
         return {"message": "Avatar deleted successfully"}
     
     except Exception as e:
-        db.rollback()
+        await run_in_session(db, Session.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete avatar: {str(e)}"
@@ -1,55 +1,182 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from src.database import get_db
-from src.auth.dependecies import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, Response, WebSocket, WebSocketDisconnect
+from src.database import DbSession, get_session, session_scope
+from src.auth.dependecies import authenticate_token, get_current_active_user, rate_limit_user
 from src.models.user import User
-from src.models.chat import MessageCreate, MessageResponse, ChatRoomCreate, ChatRoomResponse
-from src.services.chat_service import ChatService
-from typing import List, Optional
+from src.models.chat import BulkReadRequest, ChatMessage, MessageCreate, MessageResponse, MessageSearchResult, RoomMessageCreate, ChatRoomCreate, ChatRoomResponse
+from src.services.chat_service import AsyncChatService, ChatService, SearchUnavailable
+from src.services.message_batcher import message_batcher
+from src.services.rate_limit import rate_limiter
+from src.services.responses import FastJSONResponse
+from src.realtime.connection_manager import manager
+from config import Config
+from datetime import datetime
+from typing import Iterable, List, Optional
+import asyncio
 import json
+import math
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict = {}
-    
-    async def connect(self, user_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-    
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-    
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
+MAX_PRESENCE_IDS = 500
+MAX_READ_MARKERS = 500
+MAX_SEARCH_RESULTS = 100
+
+def message_event(msg: ChatMessage) -> str:
+    """WebSocket payload announcing a stored message"""
+    event = {
+        "id": msg.id,
+        "sender_id": msg.sender_id,
+        "sender_username": msg.sender_username,
+        "message": msg.message,
+        "created_at": msg.created_at.isoformat()
+    }
+    if msg.room_id:
+        event["room_id"] = msg.room_id
+    return json.dumps(event)
+
+async def room_member_ids(room_id: str, require: Optional[str] = None) -> frozenset:
+    async with session_scope() as db:
+        return await AsyncChatService.get_room_member_ids(db, room_id, require)
+
+def ack_event(msg: ChatMessage, client_id: Optional[str]) -> str:
+    """WebSocket payload confirming to the sender that a message was stored"""
+    return json.dumps({
+        "type": "ack",
+        "client_id": client_id,
+        "id": msg.id,
+        "created_at": msg.created_at.isoformat()
+    })
+
+async def deliver_when_stored(stored: asyncio.Future, user: User, client_id: Optional[str], recipients: Iterable[str]):
+    try:
+        msg = await stored
+    except Exception:
+        await manager.send_personal_message(
+            json.dumps({"type": "error", "client_id": client_id, "detail": "Message could not be stored"}),
+            user.id
+        )
+        return
+    await manager.send_personal_message(ack_event(msg, client_id), user.id)
+    await manager.broadcast(message_event(msg), recipients)
 
-manager = ConnectionManager()
+async def stream_missed_messages(websocket: WebSocket, user_id: str, since: str):
+    """Replay what a user missed after `since`, oldest first, page by page
+    
+    Ends with a `sync` frame carrying the last replayed id as `cursor`.
+    `has_more` means the replay stopped at WS_SYNC_MAX_MESSAGES and the
+    rest should be paged through REST; `reset` means `since` is unknown.
+    """
+    cursor, sent, has_more = since, 0, False
+    while True:
+        async with session_scope() as db:
+            page = await AsyncChatService.get_missed_messages(db, user_id, cursor, Config.WS_SYNC_PAGE_SIZE)
+        if page is None:
+            await websocket.send_text(json.dumps({"type": "sync", "cursor": since, "has_more": False, "reset": True}))
+            return
+        for msg in page:
+            await websocket.send_text(message_event(msg))
+        sent += len(page)
+        if page:
+            cursor = page[-1].id
+        if len(page) < Config.WS_SYNC_PAGE_SIZE:
+            break
+        if sent >= Config.WS_SYNC_MAX_MESSAGES:
+            has_more = True
+            break
+    await websocket.send_text(json.dumps({"type": "sync", "cursor": cursor, "has_more": has_more, "reset": False}))
 
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(user_id, websocket)
+async def websocket_endpoint(websocket: WebSocket, user_id: str, token: Optional[str] = None, since: Optional[str] = None):
+    """Send and receive messages
+    
+    Connect with `?token=<access token>`. Frames carrying `receiver_id` or
+    `room_id` are stored through the write batcher; the sender gets an
+    `ack` with the stored id (echoing `client_id`) once it commits, and
+    only then is the message delivered to its recipients.
+    
+    Sends share the REST `send_message` rate limit; a refused one gets an
+    `error` frame echoing `client_id`, with `retry_after` in seconds.
+    
+    Any frame counts as a presence heartbeat; idle clients should send
+    `{"type": "ping"}` (answered with a pong) well within
+    PRESENCE_TTL_SECONDS to stay online.
+    
+    Reconnect with `&since=<last seen message id>` to first receive the
+    messages missed while offline. Live messages arriving meanwhile are
+    held back until the replay finishes, so a message can show up twice;
+    clients should dedupe by id.
+    """
+    async with session_scope() as db:
+        user = await authenticate_token(db, token, from_claims=True) if token else None
+    if user is None or user.id != user_id or not user.is_active:
+        await websocket.close(code=1008)  # policy violation
+        return
+    
+    await manager.connect(user_id, websocket, paused=since is not None)
+    if since is not None:
+        try:
+            await stream_missed_messages(websocket, user_id, since)
+        except Exception:
+            # Client went away mid-replay
+            await manager.disconnect(user_id, websocket)
+            return
+        manager.resume(user_id)
+    pending = set()
     try:
         while True:
             data = await websocket.receive_text()
-            # Broadcast message to recipient
-            message_data = json.loads(data)
-            if 'receiver_id' in message_data:
-                await manager.send_personal_message(data, message_data['receiver_id'])
+            await manager.presence.heartbeat(user_id)
+            try:
+                message_data = json.loads(data)
+                if message_data.get("type") == "ping":
+                    await manager.deliver_local(user_id, json.dumps({"type": "pong"}))
+                    continue
+                client_id = message_data.get("client_id")
+                if message_data.get("receiver_id"):
+                    content = MessageCreate(**message_data)
+                    room_id = None
+                    recipients = {content.receiver_id}
+                elif message_data.get("room_id"):
+                    content = RoomMessageCreate(**message_data)
+                    room_id = message_data["room_id"]
+                    members = await room_member_ids(room_id, require=user_id)
+                    if user_id not in members:
+                        continue
+                    recipients = members - {user_id}
+                else:
+                    continue
+            except (ValueError, TypeError, AttributeError):
+                continue
+            
+            # Same bucket as REST sends, so switching transports doesn't double the allowance
+            wait = await rate_limiter.check("send_message", user_id)
+            if wait > 0:
+                await manager.deliver_local(user_id, json.dumps({
+                    "type": "error",
+                    "client_id": client_id,
+                    "detail": "Too many messages, please retry later",
+                    "retry_after": max(1, math.ceil(wait))
+                }))
+                continue
+            
+            msg = ChatService.build_message(
+                user.id, user.username, user.full_name or user.username, content, room_id
+            )
+            stored = await message_batcher.submit(msg)
+            task = asyncio.create_task(deliver_when_stored(stored, user, client_id, recipients))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        await manager.disconnect(user_id, websocket)
 
-@router.post("/messages", response_model=MessageResponse)
+@router.post("/messages", response_model=MessageResponse, dependencies=[Depends(rate_limit_user("send_message"))])
 async def send_message(
     message: MessageCreate,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Send a message"""
-    msg = ChatService.send_message(
+    msg = await AsyncChatService.send_message(
         db,
         current_user.id,
         current_user.username,
@@ -59,16 +186,7 @@ async def send_message(
     
     # Notify via WebSocket
     if message.receiver_id:
-        await manager.send_personal_message(
-            json.dumps({
-                "id": msg.id,
-                "sender_id": msg.sender_id,
-                "sender_username": msg.sender_username,
-                "message": msg.message,
-                "created_at": msg.created_at.isoformat()
-            }),
-            message.receiver_id
-        )
+        await manager.send_personal_message(message_event(msg), message.receiver_id)
     
     return msg
 
@@ -76,53 +194,207 @@ async def send_message(
 async def get_messages(
     other_user_id: Optional[str] = None,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get messages"""
-    return ChatService.get_messages(db, current_user.id, other_user_id, limit)
+    """Get messages
+    
+    Use `before=<message id>` to scroll back through history and
+    `after=<message id>` to fetch what arrived since a known message.
+    """
+    return await AsyncChatService.get_messages(db, current_user.id, other_user_id, limit, before, after)
 
-@router.get("/conversations")
+@router.get("/messages/search", response_model=List[MessageSearchResult])
+async def search_messages(
+    response: Response,
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: DbSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Search message text in the current user's conversations and rooms
+    
+    Results are ranked best match first; the cursor for the next page is
+    returned in the `X-Next-Cursor` header.
+    """
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    try:
+        results = await AsyncChatService.search_messages(db, current_user.id, q, limit, cursor)
+    except SearchUnavailable as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    if len(results) == limit:
+        last = results[-1]
+        response.headers["X-Next-Cursor"] = ChatService.encode_search_cursor(last["rank"], last["id"])
+    return results
+
+@router.get("/conversations", response_class=FastJSONResponse)
 async def get_conversations(
-    db: Session = Depends(get_db),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: DbSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all conversations
+    
+    Pass `limit` to page the list; the cursor for the next page is
+    returned in the `X-Next-Cursor` header.
+    """
+    conversations = await AsyncChatService.get_conversations(db, current_user.id, limit, cursor)
+    online = await manager.presence.lookup([c["user_id"] for c in conversations])
+    for conversation in conversations:
+        conversation["is_online"] = online[conversation["user_id"]]
+    headers = {}
+    if limit and len(conversations) == limit:
+        last = conversations[-1]
+        headers["X-Next-Cursor"] = ChatService.encode_conversation_cursor(
+            last["last_message_time"], last["user_id"]
+        )
+    # Plain dicts, encoded directly instead of through jsonable_encoder
+    return FastJSONResponse(conversations, headers=headers)
+
+@router.get("/presence", response_class=FastJSONResponse)
+async def get_presence(
+    ids: str,
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get all conversations"""
-    return ChatService.get_conversations(db, current_user.id)
+    """Online state for a comma-separated list of user ids"""
+    user_ids = list(dict.fromkeys(i for i in ids.split(",") if i))
+    if len(user_ids) > MAX_PRESENCE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PRESENCE_IDS} ids per request")
+    return FastJSONResponse(await manager.presence.lookup(user_ids))
+
+async def push_read_receipts(reader_id: str, receipts: dict):
+    """Tell each sender how far the reader has read
+    
+    One event per sender; the coalesce key lets a newer receipt from the
+    same reader replace one still queued for that sender.
+    """
+    read_at = datetime.utcnow().isoformat()
+    await asyncio.gather(*[
+        manager.send_personal_message(
+            json.dumps({
+                "type": "read",
+                "reader_id": reader_id,
+                "up_to_message_id": receipt["up_to_message_id"],
+                "count": receipt["count"],
+                "read_at": read_at
+            }),
+            sender_id,
+            coalesce_key=f"read:{reader_id}"
+        )
+        for sender_id, receipt in receipts.items()
+    ])
 
 @router.put("/messages/read/{sender_id}")
 async def mark_messages_as_read(
     sender_id: str,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Mark messages as read"""
-    ChatService.mark_as_read(db, current_user.id, sender_id)
+    receipts = await AsyncChatService.mark_as_read(db, current_user.id, sender_id)
+    await push_read_receipts(current_user.id, receipts)
     return {"message": "Messages marked as read"}
 
+@router.post("/messages/read")
+async def mark_many_as_read(
+    request: BulkReadRequest,
+    db: DbSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Mark several conversations as read in one request
+    
+    Each marker marks one sender's messages up to `up_to_message_id`
+    (or all of them); senders are sent a `read` receipt over WebSocket.
+    """
+    if len(request.markers) > MAX_READ_MARKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_READ_MARKERS} markers per request")
+    receipts = await AsyncChatService.mark_many_as_read(db, current_user.id, request.markers)
+    await push_read_receipts(current_user.id, receipts)
+    return {
+        "message": "Messages marked as read",
+        "updated": {sender_id: receipt["count"] for sender_id, receipt in receipts.items()}
+    }
+
 @router.post("/rooms", response_model=ChatRoomResponse)
 async def create_room(
     room: ChatRoomCreate,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a chat room"""
-    return ChatService.create_room(db, current_user.id, room)
+    return await AsyncChatService.create_room(db, current_user.id, room)
 
 @router.get("/rooms", response_model=List[ChatRoomResponse])
 async def get_rooms(
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all chat rooms"""
-    return ChatService.get_rooms(db, current_user.id)
+    return await AsyncChatService.get_rooms(db, current_user.id)
 
 @router.post("/rooms/{room_id}/join")
 async def join_room(
     room_id: str,
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Join a chat room"""
-    ChatService.join_room(db, room_id, current_user.id, current_user.username)
+    await AsyncChatService.join_room(db, room_id, current_user.id, current_user.username)
+    await manager.invalidate_room(room_id)
     return {"message": "Joined room successfully"}
+
+async def _require_room_member(db: DbSession, room_id: str, user_id: str) -> frozenset:
+    members = await AsyncChatService.get_room_member_ids(db, room_id, require=user_id)
+    if user_id not in members:
+        raise HTTPException(status_code=403, detail="Not a member of this room")
+    return members
+
+@router.post(
+    "/rooms/{room_id}/messages", response_model=MessageResponse,
+    dependencies=[Depends(rate_limit_user("send_message"))]
+)
+async def send_room_message(
+    room_id: str,
+    message: RoomMessageCreate,
+    db: DbSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Post a message to a room and fan it out to connected members"""
+    members = await _require_room_member(db, room_id, current_user.id)
+    msg = await AsyncChatService.send_room_message(
+        db,
+        room_id,
+        current_user.id,
+        current_user.username,
+        current_user.full_name or current_user.username,
+        message
+    )
+    await manager.broadcast(message_event(msg), members - {current_user.id})
+    return msg
+
+@router.get("/rooms/{room_id}/messages", response_model=List[MessageResponse])
+async def get_room_messages(
+    room_id: str,
+    limit: int = 100,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db: DbSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get room history, newest first, with the same cursors as /messages"""
+    await _require_room_member(db, room_id, current_user.id)
+    return await AsyncChatService.get_room_messages(db, room_id, limit, before, after)
+
+@router.put("/rooms/{room_id}/read")
+async def mark_room_as_read(
+    room_id: str,
+    db: DbSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Reset the current user's unread count for a room"""
+    await AsyncChatService.mark_room_as_read(db, room_id, current_user.id)
+    return {"message": "Room marked as read"}
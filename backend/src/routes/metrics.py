@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Response
+from src.auth.hash_password import password_hasher
+from src.database import pool_stats
+from src.realtime.connection_manager import manager
+from src.services.avatars import avatar_processor
+from src.services.message_batcher import message_batcher
+from src.services.metrics import CONTENT_TYPE, registry
+
+router = APIRouter(tags=["System"])
+
+def _queue_depths() -> list:
+    return [queue.depth for queue in list(manager.outbound.values())]
+
+def _pool_checked_out() -> dict:
+    return {name: stats.get("checked_out", 0) for name, stats in pool_stats().items()}
+
+# Read when scraped, so they cost nothing between scrapes
+registry.gauge("oreon_ws_connections", "WebSockets connected to this worker", lambda: len(manager.active_connections))
+registry.gauge("oreon_ws_outbound_queue_depth", "Messages waiting in outbound WebSocket queues", lambda: sum(_queue_depths()))
+registry.gauge(
+    "oreon_ws_outbound_queue_max_depth", "Deepest outbound WebSocket queue right now",
+    lambda: max(_queue_depths(), default=0)
+)
+registry.gauge("oreon_ws_write_batch_pending", "WebSocket messages waiting to be stored", lambda: message_batcher.stats()["pending"])
+registry.gauge("oreon_password_hash_pending", "Password hashes queued or running", lambda: password_hasher.pending)
+registry.gauge("oreon_avatar_renders_pending", "Avatar thumbnail renders queued or running", lambda: avatar_processor.stats()["pending"])
+registry.gauge("oreon_db_pool_checked_out", "Database connections checked out, per engine", _pool_checked_out, ("engine",))
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Metrics of this worker in the Prometheus text format"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends
+from src.auth.dependecies import get_current_superuser
+from src.database import pool_stats
+from src.models.user import User
+from src.realtime.connection_manager import manager
+from src.services.avatars import avatar_processor
+from src.services.message_batcher import message_batcher
+from src.services.rate_limit import rate_limiter
+
+router = APIRouter(prefix="/system", tags=["System"])
+
+@router.get("/db/pool")
+async def get_pool_stats(current_user: User = Depends(get_current_superuser)):
+    """Database connection pool statistics (superuser only)"""
+    return pool_stats()
+
+@router.get("/ws/queues")
+async def get_ws_queue_stats(current_user: User = Depends(get_current_superuser)):
+    """Outbound WebSocket queue depth per connected user on this worker (superuser only)"""
+    queues = manager.queue_stats()
+    return {
+        "connections": len(queues),
+        "total_depth": sum(q["depth"] for q in queues.values()),
+        "queues": queues,
+    }
+
+@router.get("/ws/writes")
+async def get_ws_write_stats(current_user: User = Depends(get_current_superuser)):
+    """Batched message writes from WebSockets on this worker (superuser only)"""
+    return message_batcher.stats()
+
+@router.get("/presence")
+async def get_presence_stats(current_user: User = Depends(get_current_superuser)):
+    """Presence registry size and memory per tracked user on this worker (superuser only)"""
+    return manager.presence.stats()
+
+@router.get("/avatars")
+async def get_avatar_stats(current_user: User = Depends(get_current_superuser)):
+    """Avatar thumbnail rendering on this worker (superuser only)"""
+    return avatar_processor.stats()
+
+@router.get("/rate-limits")
+async def get_rate_limit_stats(current_user: User = Depends(get_current_superuser)):
+    """Configured rate limits and requests allowed/refused on this worker (superuser only)"""
+    return rate_limiter.stats()
@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config import Config
-from .database import *
+from src.database import *
 
 def polygone():
     app = FastAPI(
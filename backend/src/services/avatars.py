@@ -0,0 +1,222 @@
+"""
+Avatar storage: content-addressed originals with pre-generated variants.
+
+An avatar is stored once per distinct image as <sha256><ext>, so users
+uploading the same picture share one file. Square thumbnails are
+rendered next to it as <sha256>_<px>.<format> on a small worker pool
+after the upload returns; until they exist, requests for a size fall
+back to the original.
+"""
+import asyncio
+import functools
+import importlib.util
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from config import Config
+from src.services.uploads import StoredUpload, remove_file
+
+logger = logging.getLogger(__name__)
+
+AVATAR_DIR = "uploads/avatars"
+AVATAR_ROUTE = "/api/v1/auth/uploads/avatars"
+FORMAT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+def variant_filename(filename: str, size: int, fmt: str = Config.AVATAR_VARIANT_FORMAT) -> str:
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}_{size}{FORMAT_EXTENSIONS[fmt]}"
+
+def closest_variant_size(requested: int, sizes: List[int] = Config.AVATAR_VARIANT_SIZES) -> int:
+    """Smallest variant at least `requested` px wide, else the largest"""
+    larger = [size for size in sizes if size >= requested]
+    return min(larger) if larger else max(sizes)
+
+def avatar_urls(filename: Optional[str]) -> Optional[Dict[str, str]]:
+    """URLs of an avatar's original and each variant size, for API responses"""
+    if not filename:
+        return None
+    urls = {"original": f"{AVATAR_ROUTE}/{filename}"}
+    for size in Config.AVATAR_VARIANT_SIZES:
+        urls[str(size)] = f"{AVATAR_ROUTE}/{filename}?size={size}"
+    return urls
+
+def resolve_avatar_path(filename: str, size: Optional[int] = None) -> Optional[str]:
+    """Path of the variant closest to `size` if rendered, else the original"""
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        return None
+    if size:
+        path = os.path.join(AVATAR_DIR, variant_filename(filename, closest_variant_size(size)))
+        if os.path.exists(path):
+            return path
+    path = os.path.join(AVATAR_DIR, filename)
+    return path if os.path.exists(path) else None
+
+def avatar_files(filename: str) -> List[str]:
+    """The original and every variant path for an avatar"""
+    paths = [os.path.join(AVATAR_DIR, filename)]
+    for fmt in FORMAT_EXTENSIONS:
+        paths += [os.path.join(AVATAR_DIR, variant_filename(filename, size, fmt)) for size in Config.AVATAR_VARIANT_SIZES]
+    return paths
+
+def render_variants(path: str, sizes: List[int], fmt: str) -> int:
+    """Write the missing square variants of the image at `path`; returns how many"""
+    # Optional dependency, checked by AvatarProcessor.enabled
+    from PIL import Image, ImageOps
+    
+    filename = os.path.basename(path)
+    targets = {
+        size: os.path.join(os.path.dirname(path), variant_filename(filename, size, fmt))
+        for size in sorted(sizes, reverse=True)
+    }
+    missing = {size: target for size, target in targets.items() if not os.path.exists(target)}
+    if not missing:
+        return 0
+    
+    with Image.open(path) as image:
+        # Let JPEG decode at a reduced scale when the original is much larger
+        image.draft("RGB", (max(missing), max(missing)))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if fmt == "webp" else "RGB")
+        # Center square crop, as avatars are shown in circles
+        side = min(image.size)
+        left, top = (image.width - side) // 2, (image.height - side) // 2
+        image = image.crop((left, top, left + side, top + side))
+        # Largest first, each size resized from the previous one
+        for size, target in missing.items():
+            image = image.resize((min(size, side),) * 2, Image.LANCZOS, reducing_gap=3.0)
+            # Unique per thread and process, as other workers may render the same image
+            temp = f"{target}.{os.getpid()}-{threading.get_ident()}.tmp"
+            image.save(temp, format=fmt.upper(), quality=82)
+            os.replace(temp, target)
+    return len(missing)
+
+class AvatarProcessor:
+    """Renders avatar variants on a thread pool without blocking uploads
+    
+    schedule() returns immediately; failures are logged. With
+    `workers=0` variants are rendered inline before it returns, and
+    without Pillow installed nothing is rendered.
+    """
+    
+    def __init__(self, workers: int, sizes: List[int], fmt: str):
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported AVATAR_VARIANT_FORMAT: {fmt}")
+        self.workers = workers
+        self.sizes = sizes
+        self.fmt = fmt
+        self.enabled = importlib.util.find_spec("PIL") is not None
+        self.rendered = 0
+        self.failed = 0
+        self._executor: Optional[Executor] = None
+        self._tasks: Set[asyncio.Future] = set()
+        self._rendering: Set[str] = set()
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="avatars")
+        return self._executor
+    
+    def _render(self, path: str):
+        try:
+            self.rendered += render_variants(path, self.sizes, self.fmt)
+        except Exception:
+            self.failed += 1
+            logger.exception("Rendering avatar variants for %s failed", path)
+    
+    def _done(self, path: str, future: asyncio.Future):
+        self._rendering.discard(path)
+        self._tasks.discard(future)
+    
+    def schedule(self, path: str):
+        """Render the variants of `path` that don't exist yet"""
+        if not self.enabled or path in self._rendering:
+            return  # an identical upload is already being rendered
+        if self.workers <= 0:
+            self._render(path)
+            return
+        future = asyncio.get_running_loop().run_in_executor(self._get_executor(), self._render, path)
+        self._rendering.add(path)
+        self._tasks.add(future)
+        future.add_done_callback(functools.partial(self._done, path))
+    
+    async def wait(self):
+        """Wait for every scheduled render to finish"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "format": self.fmt,
+            "sizes": self.sizes,
+            "pending": len(self._tasks),
+            "rendered": self.rendered,
+            "failed": self.failed,
+        }
+    
+    async def close(self):
+        await self.wait()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+avatar_processor = AvatarProcessor(
+    workers=Config.AVATAR_WORKERS,
+    sizes=Config.AVATAR_VARIANT_SIZES,
+    fmt=Config.AVATAR_VARIANT_FORMAT
+)
+
+async def store_avatar(upload: StoredUpload) -> str:
+    """Move a StoredUpload to its content address and queue its variants
+    
+    Returns the avatar filename. If the same image is already stored the
+    existing file is reused, and the upload is kept until settle_avatar
+    in case that file is removed before the user row points at it.
+    """
+    filename = f"{upload.sha256}{upload.extension}"
+    path = os.path.join(AVATAR_DIR, filename)
+    if not await asyncio.to_thread(os.path.exists, path):
+        await upload.save_as(path)
+    avatar_processor.schedule(path)
+    return filename
+
+async def settle_avatar(upload: StoredUpload, filename: str):
+    """Once the user row points at `filename`, make sure the file exists and drop the upload
+    
+    A deduplicated upload's file can be deleted by remove_avatar between
+    store_avatar and the commit; the upload is then put in its place.
+    """
+    path = os.path.join(AVATAR_DIR, filename)
+    if upload.path == path:
+        return
+    if await asyncio.to_thread(os.path.exists, path):
+        await upload.discard()
+    else:
+        await upload.save_as(path)
+        avatar_processor.schedule(path)
+
+async def remove_avatar(filename: str, in_use: Callable[[], Awaitable[bool]]):
+    """Delete an avatar's original and variants if `in_use()` says no user points at it
+    
+    The original is moved aside before usage is checked a second time, so
+    an upload deduplicated onto it that committed in between gets it back,
+    and one that commits later finds it gone and re-creates it in
+    settle_avatar.
+    """
+    if await in_use():
+        return
+    path = os.path.join(AVATAR_DIR, filename)
+    doomed = os.path.join(AVATAR_DIR, f".deleting-{uuid.uuid4().hex}-{filename}")
+    try:
+        await asyncio.to_thread(os.rename, path, doomed)
+    except FileNotFoundError:
+        return  # already gone, or another request is removing it
+    if await in_use():
+        await asyncio.to_thread(os.replace, doomed, path)
+        return
+    for path in [doomed] + avatar_files(filename)[1:]:
+        await remove_file(path)
@@ -1,38 +1,247 @@
+from sqlalchemy import Float, and_, bindparam, case, delete, func, insert, or_, select, text, union, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from src.models.chat import ChatMessage, ChatRoom, ChatRoomMember, MessageCreate, ChatRoomCreate
+from src.database import awaitable
+from src.models.chat import ChatMessage, ChatRoom, ChatRoomMember, ConversationSummary, MessageCreate, ReadMarker, RoomMessageCreate, ChatRoomCreate
+from src.realtime.rooms import room_members
 from src.models.user import User
-from typing import List, Optional
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple, Union
+import base64
+import re
 import uuid
 from datetime import datetime
 
+class SearchUnavailable(Exception):
+    """Raised when the database has no full-text search that message search can use"""
+
 class ChatService:
     @staticmethod
-    def send_message(db: Session, sender_id: str, sender_username: str, sender_name: str, message: MessageCreate) -> ChatMessage:
-        """Send a new message"""
-        db_message = ChatMessage(
+    def conversation_key(user_id: str, other_user_id: str) -> str:
+        """Canonical key for a direct conversation, independent of direction"""
+        low, high = sorted((user_id, other_user_id))
+        return f"{low}:{high}"
+    
+    @staticmethod
+    def build_message(
+        sender_id: str,
+        sender_username: str,
+        sender_name: Optional[str],
+        message: Union[MessageCreate, RoomMessageCreate],
+        room_id: Optional[str] = None
+    ) -> ChatMessage:
+        """Create an unsaved ChatMessage, timestamped now"""
+        receiver_id = getattr(message, "receiver_id", None)
+        return ChatMessage(
             id=str(uuid.uuid4()),
             sender_id=sender_id,
             sender_username=sender_username,
             sender_name=sender_name,
-            receiver_id=message.receiver_id,
+            receiver_id=receiver_id,
+            room_id=room_id,
+            conversation_key=ChatService.conversation_key(sender_id, receiver_id) if receiver_id else None,
             message=message.message,
             message_type=message.message_type,
+            is_read=False,
+            created_at=datetime.utcnow(),
         )
-        db.add(db_message)
+    
+    @staticmethod
+    def store_messages(db: Session, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """Persist a batch of built messages in one transaction
+        
+        Conversation summaries and room unread counts are updated in the
+        same transaction.
+        """
+        db.add_all(messages)
+        db.flush()
+        
+        direct = [m for m in messages if m.receiver_id]
+        if direct:
+            ChatService._record_messages_in_summary(db, direct)
+        
+        room_posts = Counter((m.room_id, m.sender_id) for m in messages if m.room_id)
+        for (room_id, sender_id), count in room_posts.items():
+            db.execute(
+                update(ChatRoomMember).where(
+                    ChatRoomMember.room_id == room_id,
+                    ChatRoomMember.user_id != sender_id
+                ).values(unread_count=func.coalesce(ChatRoomMember.unread_count, 0) + count)
+            )
+        
         db.commit()
+        return messages
+    
+    @staticmethod
+    def send_message(db: Session, sender_id: str, sender_username: str, sender_name: str, message: MessageCreate) -> ChatMessage:
+        """Send a new message"""
+        db_message = ChatService.build_message(sender_id, sender_username, sender_name, message)
+        ChatService.store_messages(db, [db_message])
         db.refresh(db_message)
         return db_message
     
     @staticmethod
-    def get_messages(db: Session, user_id: str, other_user_id: Optional[str] = None, limit: int = 100) -> List[ChatMessage]:
-        """Get messages for a user"""
+    def _upsert_summaries(db: Session, rows: List[dict]):
+        """Insert or update conversation_summary rows in the current transaction
+        
+        Each row's `unread_count` is added to the stored count. The last
+        message only moves forward in time: a message built earlier but
+        committed later (e.g. one waiting in the WebSocket write batch
+        while a REST send commits) still counts as unread but doesn't
+        replace the newer last message.
+        """
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            dialect_insert = sqlite_insert if dialect == "sqlite" else pg_insert
+            stmt = dialect_insert(ConversationSummary)
+            newer = or_(
+                ConversationSummary.last_message_time.is_(None),
+                stmt.excluded.last_message_time >= ConversationSummary.last_message_time
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "partner_id"],
+                set_={
+                    **{
+                        column: case((newer, stmt.excluded[column]), else_=getattr(ConversationSummary, column))
+                        for column in ("last_message_id", "last_message", "last_message_time")
+                    },
+                    "unread_count": ConversationSummary.unread_count + stmt.excluded.unread_count,
+                }
+            )
+            # executemany keeps the compiled statement cacheable across batch sizes
+            db.execute(stmt, rows)
+            return
+        
+        # Generic fallback for other backends
+        for row in rows:
+            summary = db.get(ConversationSummary, (row["user_id"], row["partner_id"]))
+            if summary is None:
+                db.add(ConversationSummary(**row))
+            else:
+                if summary.last_message_time is None or row["last_message_time"] >= summary.last_message_time:
+                    summary.last_message_id = row["last_message_id"]
+                    summary.last_message = row["last_message"]
+                    summary.last_message_time = row["last_message_time"]
+                summary.unread_count = (summary.unread_count or 0) + row["unread_count"]
+    
+    @staticmethod
+    def _record_messages_in_summary(db: Session, messages: List[ChatMessage]):
+        """Update both participants' inbox rows for new direct messages
+        
+        Collapses the batch to one row per (user, partner) and writes them
+        with a single upsert.
+        """
+        latest = {}
+        unread = defaultdict(int)
+        for m in sorted(messages, key=lambda m: (m.created_at, m.id)):
+            # The receiver's row gains an unread message, the sender's does not
+            latest[(m.receiver_id, m.sender_id)] = m
+            unread[(m.receiver_id, m.sender_id)] += 1
+            if m.sender_id != m.receiver_id:
+                latest[(m.sender_id, m.receiver_id)] = m
+        
+        ChatService._upsert_summaries(db, [
+            {
+                "user_id": user_id,
+                "partner_id": partner_id,
+                "last_message_id": m.id,
+                "last_message": m.message,
+                "last_message_time": m.created_at,
+                "unread_count": unread[(user_id, partner_id)],
+            }
+            for (user_id, partner_id), m in latest.items()
+        ])
+    
+    @staticmethod
+    def rebuild_conversation_summaries(db: Session, user_id: Optional[str] = None) -> int:
+        """Rebuild conversation_summary from chat_messages
+        
+        Repairs every row, or only the rows owned by user_id when given.
+        Returns the number of summary rows written.
+        """
+        direct = ChatMessage.receiver_id.isnot(None)
+        columns = (ChatMessage.id, ChatMessage.message, ChatMessage.created_at)
+        outgoing = select(
+            ChatMessage.sender_id.label("user_id"), ChatMessage.receiver_id.label("partner_id"), *columns
+        ).where(direct)
+        incoming = select(
+            ChatMessage.receiver_id.label("user_id"), ChatMessage.sender_id.label("partner_id"), *columns
+        ).where(direct)
+        if user_id:
+            outgoing = outgoing.where(ChatMessage.sender_id == user_id)
+            incoming = incoming.where(ChatMessage.receiver_id == user_id)
+        pairs = union(outgoing, incoming).subquery()
+        
+        ranked = select(
+            pairs.c.user_id,
+            pairs.c.partner_id,
+            pairs.c.id,
+            pairs.c.message,
+            pairs.c.created_at,
+            func.row_number().over(
+                partition_by=(pairs.c.user_id, pairs.c.partner_id),
+                order_by=(pairs.c.created_at.desc(), pairs.c.id.desc())
+            ).label("rn")
+        ).subquery()
+        
+        unread = select(
+            ChatMessage.receiver_id.label("user_id"),
+            ChatMessage.sender_id.label("partner_id"),
+            func.count(ChatMessage.id).label("unread_count")
+        ).where(direct, ChatMessage.is_read == False)
+        if user_id:
+            unread = unread.where(ChatMessage.receiver_id == user_id)
+        unread = unread.group_by(ChatMessage.receiver_id, ChatMessage.sender_id).subquery()
+        
+        rows = select(
+            ranked.c.user_id,
+            ranked.c.partner_id,
+            ranked.c.id,
+            ranked.c.message,
+            ranked.c.created_at,
+            func.coalesce(unread.c.unread_count, 0)
+        ).select_from(
+            ranked.outerjoin(
+                unread,
+                and_(unread.c.user_id == ranked.c.user_id, unread.c.partner_id == ranked.c.partner_id)
+            )
+        ).where(ranked.c.rn == 1)
+        
+        clear = delete(ConversationSummary)
+        if user_id:
+            clear = clear.where(ConversationSummary.user_id == user_id)
+        db.execute(clear)
+        result = db.execute(
+            insert(ConversationSummary).from_select(
+                ["user_id", "partner_id", "last_message_id", "last_message", "last_message_time", "unread_count"],
+                rows
+            )
+        )
+        db.commit()
+        return result.rowcount
+    
+    @staticmethod
+    def get_messages(
+        db: Session,
+        user_id: str,
+        other_user_id: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> List[ChatMessage]:
+        """Get messages for a user
+        
+        `before` / `after` are message ids used as keyset cursors: only
+        messages strictly older / newer than that message are returned.
+        Results are always ordered newest first.
+        """
         query = db.query(ChatMessage)
         
         if other_user_id:
-            # Direct messages between two users
+            # Direct messages between two users: a range scan on the conversation index
             query = query.filter(
-                ((ChatMessage.sender_id == user_id) & (ChatMessage.receiver_id == other_user_id)) |
-                ((ChatMessage.sender_id == other_user_id) & (ChatMessage.receiver_id == user_id))
+                ChatMessage.conversation_key == ChatService.conversation_key(user_id, other_user_id)
             )
         else:
             # All messages for user
@@ -40,64 +249,326 @@ class ChatService:
                 (ChatMessage.sender_id == user_id) | (ChatMessage.receiver_id == user_id)
             )
         
-        return query.order_by(ChatMessage.created_at.desc()).limit(limit).all()
-    
-    @staticmethod
-    def get_conversations(db: Session, user_id: str):
-        """Get list of conversations for a user"""
-        # Get unique users this user has messaged with
-        sent = db.query(ChatMessage.receiver_id).filter(
-            ChatMessage.sender_id == user_id,
-            ChatMessage.receiver_id.isnot(None)
-        ).distinct().all()
-        
-        received = db.query(ChatMessage.sender_id).filter(
-            ChatMessage.receiver_id == user_id
-        ).distinct().all()
-        
-        user_ids = set([s[0] for s in sent] + [r[0] for r in received])
-        
-        conversations = []
-        for other_user_id in user_ids:
-            if other_user_id:
-                # Get last message
-                last_msg = db.query(ChatMessage).filter(
-                    ((ChatMessage.sender_id == user_id) & (ChatMessage.receiver_id == other_user_id)) |
-                    ((ChatMessage.sender_id == other_user_id) & (ChatMessage.receiver_id == user_id))
-                ).order_by(ChatMessage.created_at.desc()).first()
-                
-                # Get unread count
-                unread = db.query(ChatMessage).filter(
-                    ChatMessage.sender_id == other_user_id,
-                    ChatMessage.receiver_id == user_id,
-                    ChatMessage.is_read == False
-                ).count()
-                
-                # Get the other user's info
-                other_user = db.query(User).filter(User.id == other_user_id).first()
-                
-                if last_msg and other_user:
-                    conversations.append({
-                        "user_id": other_user_id,
-                        "username": other_user.username,
-                        "full_name": other_user.full_name,
-                        "last_message": last_msg.message,
-                        "last_message_time": last_msg.created_at,
-                        "unread_count": unread,
-                        "is_online": False  # Can be enhanced with real-time status
-                    })
-        
-        return sorted(conversations, key=lambda x: x['last_message_time'], reverse=True)
-    
-    @staticmethod
-    def mark_as_read(db: Session, user_id: str, sender_id: str):
+        return ChatService._page_messages(db, query, limit, before, after)
+    
+    @staticmethod
+    def _page_messages(db: Session, query, limit: int, before: Optional[str], after: Optional[str]) -> List[ChatMessage]:
+        """Apply (created_at, id) keyset cursors to a message query"""
+        cursor_id = before or after
+        if cursor_id:
+            anchor = db.query(ChatMessage.created_at, ChatMessage.id).filter(ChatMessage.id == cursor_id).first()
+            if anchor is None:
+                return []
+            if before:
+                query = query.filter(
+                    or_(
+                        ChatMessage.created_at < anchor.created_at,
+                        and_(ChatMessage.created_at == anchor.created_at, ChatMessage.id < anchor.id)
+                    )
+                )
+            else:
+                query = query.filter(
+                    or_(
+                        ChatMessage.created_at > anchor.created_at,
+                        and_(ChatMessage.created_at == anchor.created_at, ChatMessage.id > anchor.id)
+                    )
+                )
+        
+        if after and not before:
+            # Take the page closest to the cursor, then flip it back to newest first
+            messages = query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).limit(limit).all()
+            return messages[::-1]
+        
+        return query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit).all()
+    
+    @staticmethod
+    def get_missed_messages(db: Session, user_id: str, since: str, limit: int) -> Optional[List[ChatMessage]]:
+        """Messages that reached a user after the `since` message, oldest first
+        
+        Covers direct messages to the user and other members' posts in the
+        user's rooms. Returns None if `since` is not a known message id.
+        """
+        anchor = db.query(ChatMessage.created_at, ChatMessage.id).filter(ChatMessage.id == since).first()
+        if anchor is None:
+            return None
+        
+        # Written as a range on created_at so each source is an index range scan
+        after_anchor = and_(
+            ChatMessage.created_at >= anchor.created_at,
+            or_(ChatMessage.created_at > anchor.created_at, ChatMessage.id > anchor.id)
+        )
+        oldest_first = (ChatMessage.created_at.asc(), ChatMessage.id.asc())
+        
+        messages = db.query(ChatMessage).filter(
+            ChatMessage.receiver_id == user_id, after_anchor
+        ).order_by(*oldest_first).limit(limit).all()
+        
+        room_ids = [r[0] for r in db.query(ChatRoomMember.room_id).filter(ChatRoomMember.user_id == user_id).all()]
+        if room_ids:
+            messages += db.query(ChatMessage).filter(
+                ChatMessage.room_id.in_(room_ids),
+                ChatMessage.sender_id != user_id,
+                after_anchor
+            ).order_by(*oldest_first).limit(limit).all()
+        
+        return sorted(messages, key=lambda m: (m.created_at, m.id))[:limit]
+    
+    @staticmethod
+    def encode_conversation_cursor(last_message_time: datetime, partner_id: str) -> str:
+        """Build an opaque keyset cursor pointing after a conversation row"""
+        raw = f"{last_message_time.isoformat()}|{partner_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def decode_conversation_cursor(cursor: str) -> Optional[Tuple[datetime, str]]:
+        """Parse a cursor produced by encode_conversation_cursor"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            timestamp, partner_id = raw.split("|", 1)
+            return datetime.fromisoformat(timestamp), partner_id
+        except (ValueError, UnicodeDecodeError):
+            return None
+    
+    @staticmethod
+    def get_conversations(db: Session, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+        """Get list of conversations for a user
+        
+        Reads the maintained conversation_summary rows in one indexed
+        lookup. Results are ordered newest first and can be paged with a
+        cursor.
+        """
+        query = db.query(
+            User.id,
+            User.username,
+            User.full_name,
+            ConversationSummary.last_message,
+            ConversationSummary.last_message_time,
+            ConversationSummary.unread_count
+        ).join(
+            User, User.id == ConversationSummary.partner_id
+        ).filter(ConversationSummary.user_id == user_id)
+        
+        if cursor:
+            position = ChatService.decode_conversation_cursor(cursor)
+            if position:
+                last_time, last_partner = position
+                query = query.filter(
+                    or_(
+                        ConversationSummary.last_message_time < last_time,
+                        and_(
+                            ConversationSummary.last_message_time == last_time,
+                            ConversationSummary.partner_id < last_partner
+                        )
+                    )
+                )
+        
+        query = query.order_by(
+            ConversationSummary.last_message_time.desc(),
+            ConversationSummary.partner_id.desc()
+        )
+        if limit:
+            query = query.limit(limit)
+        
+        return [
+            {
+                "user_id": other_user_id,
+                "username": username,
+                "full_name": full_name,
+                "last_message": last_message,
+                "last_message_time": last_message_time,
+                "unread_count": unread_count,
+                "is_online": False  # The route fills this in from presence
+            }
+            for other_user_id, username, full_name, last_message, last_message_time, unread_count in query.all()
+        ]
+    
+    @staticmethod
+    def encode_search_cursor(rank: float, message_id: str) -> str:
+        """Build an opaque keyset cursor pointing after a search result"""
+        raw = f"{rank!r}|{message_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def decode_search_cursor(cursor: str) -> Optional[Tuple[float, str]]:
+        """Parse a cursor produced by encode_search_cursor"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            rank, message_id = raw.split("|", 1)
+            return float(rank), message_id
+        except (ValueError, UnicodeDecodeError):
+            return None
+    
+    @staticmethod
+    def search_messages(db: Session, user_id: str, q: str, limit: int = 20, cursor: Optional[str] = None) -> List[dict]:
+        """Full-text search over the messages a user can see, best match first
+        
+        Every word must match as a whole word; prefix matching would expand
+        to every term sharing the prefix and is much slower. Each result
+        carries a `snippet` with the hits wrapped in <b></b> and its `rank`
+        (lower is better) for building the next cursor.
+        Needs the index from migrations.create_message_search_index;
+        raises SearchUnavailable on databases other than SQLite and Postgres.
+        """
+        terms = re.findall(r"\w+", q.lower())
+        if not terms:
+            return []
+        room_ids = [r[0] for r in db.query(ChatRoomMember.room_id).filter(ChatRoomMember.user_id == user_id).all()]
+        position = ChatService.decode_search_cursor(cursor) if cursor else None
+        params = {"limit": limit}
+        if position:
+            params["after_rank"], params["after_id"] = position
+        
+        fields = (
+            "id", "sender_id", "sender_username", "sender_name", "receiver_id", "room_id",
+            "message", "message_type", "is_read", "created_at"
+        )
+        columns = ", ".join(f"m.{field}" for field in fields)
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            rank = "bm25(chat_messages_fts, 1.0, 0.0)"
+            words = " AND ".join(f'"{t}"' for t in terms)
+            # Scope inside the index: the participants column holds u<user id> / r<room id> tokens
+            scope = " OR ".join(
+                [f"u{user_id.replace('-', '')}"] + [f"r{room_id.replace('-', '')}" for room_id in room_ids]
+            )
+            params["match"] = f"message : ({words}) AND participants : ({scope})"
+            sql = (
+                f"SELECT {columns}, {rank} AS rank, "
+                "snippet(chat_messages_fts, 0, '<b>', '</b>', '…', 12) AS snippet "
+                "FROM chat_messages_fts JOIN chat_messages m ON m.rowid = chat_messages_fts.rowid "
+                "WHERE chat_messages_fts MATCH :match "
+            )
+        elif dialect == "postgresql":
+            rank = "-ts_rank_cd(m.search_vector, query)"
+            params.update(tsquery=" & ".join(terms), user_id=user_id, room_ids=room_ids)
+            sql = (
+                "SELECT r.*, ts_headline('simple', r.message, to_tsquery('simple', :tsquery), "
+                "'StartSel=<b>, StopSel=</b>, MaxWords=24, MinWords=8') AS snippet FROM ("
+                f"SELECT {columns}, {rank} AS rank "
+                "FROM chat_messages m, to_tsquery('simple', :tsquery) AS query "
+                "WHERE m.search_vector @@ query "
+                "AND (m.sender_id = :user_id OR m.receiver_id = :user_id OR m.room_id IN :room_ids) "
+            )
+        else:
+            raise SearchUnavailable(f"Message search is not available on {dialect}")
+        
+        if position:
+            sql += f"AND ({rank} > :after_rank OR ({rank} = :after_rank AND m.id > :after_id)) "
+        sql += "ORDER BY rank, m.id LIMIT :limit"
+        if dialect == "postgresql":
+            sql += ") AS r ORDER BY r.rank, r.id"
+        
+        stmt = text(sql)
+        if dialect == "postgresql":
+            stmt = stmt.bindparams(bindparam("room_ids", expanding=True))
+        stmt = stmt.columns(ChatMessage.__table__.c.created_at, ChatMessage.__table__.c.is_read, rank=Float)
+        return [dict(row) for row in db.execute(stmt, params).mappings()]
+    
+    @staticmethod
+    def get_conversation_partners(db: Session, user_ids: List[str]) -> dict:
+        """Map each user id to the users they have a conversation with"""
+        partners = defaultdict(list)
+        rows = db.query(ConversationSummary.user_id, ConversationSummary.partner_id).filter(
+            ConversationSummary.user_id.in_(user_ids)
+        ).all()
+        for user_id, partner_id in rows:
+            partners[user_id].append(partner_id)
+        return dict(partners)
+    
+    @staticmethod
+    def mark_as_read(db: Session, user_id: str, sender_id: str) -> dict:
         """Mark messages as read"""
-        db.query(ChatMessage).filter(
-            ChatMessage.sender_id == sender_id,
+        return ChatService.mark_many_as_read(db, user_id, [ReadMarker(sender_id=sender_id)])
+    
+    @staticmethod
+    def mark_many_as_read(db: Session, user_id: str, markers: List[ReadMarker]) -> dict:
+        """Mark messages from many senders as read in one transaction
+        
+        Each marker covers one sender's messages up to and including
+        `up_to_message_id`, or all of them. All senders are marked with a
+        single UPDATE, and unread counters are decremented by what it
+        actually changed. Returns {sender_id: {"up_to_message_id",
+        "count"}} for senders that had messages marked, one entry per sender.
+        """
+        anchor_ids = [m.up_to_message_id for m in markers if m.up_to_message_id]
+        anchors = {}
+        if anchor_ids:
+            rows = db.query(ChatMessage.id, ChatMessage.created_at, ChatMessage.sender_id).filter(
+                ChatMessage.id.in_(anchor_ids),
+                ChatMessage.receiver_id == user_id
+            ).all()
+            anchors = {row.id: row for row in rows}
+        
+        # Collapse to one marker per sender, keeping the furthest point
+        limits = {}
+        for marker in markers:
+            if marker.up_to_message_id is None:
+                limits[marker.sender_id] = None
+                continue
+            anchor = anchors.get(marker.up_to_message_id)
+            if anchor is None or anchor.sender_id != marker.sender_id:
+                continue  # not a message from this sender to the user
+            if marker.sender_id in limits:
+                current = limits[marker.sender_id]
+                if current is None or (current.created_at, current.id) >= (anchor.created_at, anchor.id):
+                    continue
+            limits[marker.sender_id] = anchor
+        
+        if not limits:
+            return {}
+        
+        def covers(sender_id, anchor):
+            condition = ChatMessage.sender_id == sender_id
+            if anchor is None:
+                return condition
+            return and_(
+                condition,
+                ChatMessage.created_at <= anchor.created_at,
+                or_(ChatMessage.created_at < anchor.created_at, ChatMessage.id <= anchor.id)
+            )
+        
+        stmt = update(ChatMessage).where(
             ChatMessage.receiver_id == user_id,
+            ChatMessage.sender_id.in_(list(limits)),
             ChatMessage.is_read == False
-        ).update({"is_read": True})
+        ).values(is_read=True).execution_options(synchronize_session=False)
+        if any(anchor is not None for anchor in limits.values()):
+            stmt = stmt.where(or_(*[covers(sender_id, anchor) for sender_id, anchor in limits.items()]))
+        
+        if db.get_bind().dialect.update_returning:
+            counts = Counter(row[0] for row in db.execute(stmt.returning(ChatMessage.sender_id)))
+        else:
+            # One statement per sender so each rowcount is that sender's
+            counts = {}
+            for sender_id, anchor in limits.items():
+                counts[sender_id] = db.execute(stmt.where(covers(sender_id, anchor))).rowcount
+        counts = {sender_id: count for sender_id, count in counts.items() if count}
+        
+        if counts:
+            summary = ConversationSummary.__table__
+            db.execute(
+                update(summary).where(
+                    summary.c.user_id == bindparam("reader_id"),
+                    summary.c.partner_id == bindparam("sender_id")
+                ).values(unread_count=case(
+                    (summary.c.unread_count > bindparam("read_count"), summary.c.unread_count - bindparam("read_count")),
+                    else_=0
+                )),
+                [
+                    {"reader_id": user_id, "sender_id": sender_id, "read_count": count}
+                    for sender_id, count in counts.items()
+                ]
+            )
+        
+        receipts = {
+            sender_id: {
+                "up_to_message_id": limits[sender_id].id if limits[sender_id] is not None else None,
+                "count": count
+            }
+            for sender_id, count in counts.items()
+        }
         db.commit()
+        return receipts
     
     @staticmethod
     def create_room(db: Session, user_id: str, room: ChatRoomCreate) -> ChatRoom:
@@ -128,6 +599,13 @@ class ChatService:
     @staticmethod
     def join_room(db: Session, room_id: str, user_id: str, username: str):
         """Join a chat room"""
+        member = db.query(ChatRoomMember).filter(
+            ChatRoomMember.room_id == room_id,
+            ChatRoomMember.user_id == user_id
+        ).first()
+        if member:
+            return member
+        
         member = ChatRoomMember(
             id=str(uuid.uuid4()),
             room_id=room_id,
@@ -138,3 +616,60 @@ class ChatService:
         db.commit()
         return member
     
+    @staticmethod
+    def get_room_member_ids(db: Session, room_id: str, require: Optional[str] = None) -> frozenset:
+        """Member user ids of a room, served from the membership cache when warm
+        
+        With `require`, a cached set that lacks that user is re-read from
+        the database, so a join another worker hasn't announced yet can't
+        lock the user out.
+        """
+        member_ids = room_members.get(room_id)
+        if member_ids is None or (require is not None and require not in member_ids):
+            rows = db.query(ChatRoomMember.user_id).filter(ChatRoomMember.room_id == room_id).all()
+            member_ids = frozenset(r[0] for r in rows)
+            room_members.set(room_id, member_ids)
+        return member_ids
+    
+    @staticmethod
+    def send_room_message(db: Session, room_id: str, sender_id: str, sender_username: str, sender_name: str, message: RoomMessageCreate) -> ChatMessage:
+        """Post a message to a room and bump the other members' unread counts"""
+        db_message = ChatService.build_message(sender_id, sender_username, sender_name, message, room_id)
+        ChatService.store_messages(db, [db_message])
+        db.refresh(db_message)
+        return db_message
+    
+    @staticmethod
+    def get_room_messages(db: Session, room_id: str, limit: int = 100, before: Optional[str] = None, after: Optional[str] = None) -> List[ChatMessage]:
+        """Get a page of a room's history, newest first"""
+        query = db.query(ChatMessage).filter(ChatMessage.room_id == room_id)
+        return ChatService._page_messages(db, query, limit, before, after)
+    
+    @staticmethod
+    def mark_room_as_read(db: Session, room_id: str, user_id: str):
+        """Reset a member's unread count for a room"""
+        db.query(ChatRoomMember).filter(
+            ChatRoomMember.room_id == room_id,
+            ChatRoomMember.user_id == user_id
+        ).update({"unread_count": 0})
+        db.commit()
+
+class AsyncChatService:
+    """Awaitable ChatService for routes, working with Session or AsyncSession"""
+    send_message = awaitable(ChatService.send_message)
+    store_messages = awaitable(ChatService.store_messages)
+    rebuild_conversation_summaries = awaitable(ChatService.rebuild_conversation_summaries)
+    get_messages = awaitable(ChatService.get_messages)
+    get_missed_messages = awaitable(ChatService.get_missed_messages)
+    get_conversations = awaitable(ChatService.get_conversations)
+    get_conversation_partners = awaitable(ChatService.get_conversation_partners)
+    search_messages = awaitable(ChatService.search_messages)
+    mark_as_read = awaitable(ChatService.mark_as_read)
+    mark_many_as_read = awaitable(ChatService.mark_many_as_read)
+    create_room = awaitable(ChatService.create_room)
+    get_rooms = awaitable(ChatService.get_rooms)
+    join_room = awaitable(ChatService.join_room)
+    get_room_member_ids = awaitable(ChatService.get_room_member_ids)
+    send_room_message = awaitable(ChatService.send_room_message)
+    get_room_messages = awaitable(ChatService.get_room_messages)
+    mark_room_as_read = awaitable(ChatService.mark_room_as_read)
@@ -0,0 +1,129 @@
+"""
+Negotiated response compression: zstd, brotli or gzip.
+
+Starlette's GZipMiddleware only speaks gzip. This picks the first of
+COMPRESSION_ENCODINGS the client accepts (honouring q-values, so
+`br;q=0` rules brotli out) and reuses Starlette's responder for the
+rest: bodies under the minimum size, already-encoded bodies, partial
+content and images are passed through untouched, streamed bodies are
+compressed chunk by chunk, and `Vary: Accept-Encoding` is added. zstd
+and brotli are optional and skipped when not installed.
+"""
+import asyncio
+import zlib
+from typing import Callable, Dict, List, Optional
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+from config import Config
+
+try:
+    import brotli
+except ModuleNotFoundError:  # optional dependency
+    brotli = None
+try:
+    import zstandard
+except ModuleNotFoundError:  # optional dependency
+    zstandard = None
+
+# Bodies at least this large are compressed off the event loop
+THREAD_MINIMUM_SIZE = 128 * 1024
+
+class GzipCompressor:
+    def __init__(self, level: int = Config.COMPRESSION_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class BrotliCompressor:
+    def __init__(self, quality: int = Config.COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+
+class ZstdCompressor:
+    def __init__(self, level: int = Config.COMPRESSION_ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+# Content-Encoding token -> compressor factory, for the libraries that are installed
+COMPRESSORS: Dict[str, Callable] = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+def negotiate_encoding(header: str, preferred: List[str]) -> Optional[str]:
+    """First of `preferred` the client accepts, or None to send the body as is"""
+    accepted = parse_accept_encoding(header)
+    for coding in preferred:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+class CompressingResponder(IdentityResponder):
+    """Starlette's responder with a pluggable compressor"""
+    
+    def __init__(self, app: ASGIApp, minimum_size: int, content_encoding: str, compressor_factory: Callable):
+        super().__init__(app, minimum_size)
+        self.content_encoding = content_encoding
+        self._compressor_factory = compressor_factory
+        self._compressor = None
+    
+    def _compress(self, body: bytes, final: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = self._compressor_factory()
+        return self._compressor.compress(body, final)
+    
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MINIMUM_SIZE:
+            return await asyncio.to_thread(self._compress, body, not more_body)
+        return self._compress(body, not more_body)
+
+class CompressionMiddleware:
+    """Compress HTTP responses with the best encoding the client accepts"""
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = Config.COMPRESSION_MINIMUM_SIZE,
+        encodings: List[str] = Config.COMPRESSION_ENCODINGS
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = [coding.strip() for coding in encodings if coding.strip() in COMPRESSORS]
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if coding is None:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        else:
+            responder = CompressingResponder(self.app, self.minimum_size, coding, COMPRESSORS[coding])
+        await responder(scope, receive, send)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import List, Optional
+from src.database import AsyncSessionLocal, SessionLocal
+from src.models.chat import ChatMessage
+from src.services.chat_service import ChatService
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class MessageWriteBatcher:
+    """Write-behind batcher for chat messages arriving over WebSockets
+    
+    `submit` queues a built message and hands back a future for it. A single
+    writer task collects whatever is queued, up to `batch_size` messages or
+    `window` seconds after the first one, and stores the lot with one
+    commit through `ChatService.store_messages`.
+    """
+    
+    def __init__(self, batch_size: int, window: float, max_pending: Optional[int] = None):
+        self.batch_size = batch_size
+        self.window = window
+        self.max_pending = max_pending or batch_size * 10
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.max_batch = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        if self._writer is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._writer = asyncio.create_task(self._run())
+    
+    async def close(self):
+        """Stop the writer after flushing anything already queued"""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+    
+    async def submit(self, message: ChatMessage) -> "asyncio.Future[ChatMessage]":
+        """Queue a message; the returned future resolves once its batch commits
+        
+        Messages are written in submission order, so a connection can keep
+        reading frames while earlier ones are still being stored.
+        """
+        if self._writer is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        # Waits here when the writer falls behind, pushing back on senders
+        await self._queue.put((message, future))
+        return future
+    
+    async def _collect(self) -> Optional[list]:
+        first = await self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.window
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                # Shutdown: write this batch, then stop
+                self._queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch is None:
+                return
+            messages = [message for message, _ in batch]
+            try:
+                await self._write(messages)
+            except Exception as exc:
+                logger.exception("Failed to store a batch of %d messages", len(messages))
+                self.failed += len(messages)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.written += len(messages)
+            self.max_batch = max(self.max_batch, len(messages))
+            for message, future in batch:
+                if not future.done():
+                    future.set_result(message)
+    
+    async def _write(self, messages: List[ChatMessage]):
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(ChatService.store_messages, messages)
+        else:
+            await asyncio.to_thread(self._write_sync, messages)
+    
+    @staticmethod
+    def _write_sync(messages: List[ChatMessage]):
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            ChatService.store_messages(db, messages)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "window_ms": self.window * 1000,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+            "max_batch": self.max_batch,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0,
+        }
+
+message_batcher = MessageWriteBatcher(
+    batch_size=Config.WS_WRITE_BATCH_SIZE,
+    window=Config.WS_WRITE_BATCH_WINDOW_MS / 1000
+)
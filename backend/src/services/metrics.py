@@ -0,0 +1,249 @@
+"""
+Process metrics in the Prometheus text exposition format.
+
+A small in-process registry, cheap enough to leave on: counters and
+histograms are plain dicts keyed by label values, updated from the
+event loop (or a worker thread, where the GIL keeps the increments
+whole), and gauges are callbacks read only when /metrics is scraped.
+
+MetricsMiddleware times every HTTP request per route template, and
+instrument_engine() hooks SQLAlchemy so each request also records how
+many queries it ran and how long they took. Metrics are per worker
+process; Prometheus sums them across workers.
+"""
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label set"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in list(self._values.items())
+        ]
+
+class Histogram:
+    """Bucketed observations per label set, with a sum and count"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (+Inf last)..., sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+    
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    """A value read from a callback at scrape time
+    
+    The callback returns a number, or a dict mapping label values (a
+    tuple, or a string for one label) to numbers.
+    """
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+    
+    def samples(self) -> List[str]:
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [f"{self.name} {_format_value(value)}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels if isinstance(labels, tuple) else (labels,))} "
+            f"{_format_value(number)}"
+            for labels, number in value.items()
+        ]
+
+Metric = Union[Counter, Histogram, Gauge]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering a name replaces it, so gauges can be re-bound to new objects
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def gauge(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, callback, labelnames))
+    
+    def render(self) -> str:
+        """Every metric in the text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "oreon_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "oreon_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+request_queries = registry.histogram(
+    "oreon_http_request_db_queries", "Database queries run per HTTP request", ("route",), QUERY_COUNT_BUCKETS
+)
+request_query_time = registry.histogram(
+    "oreon_http_request_db_seconds", "Time spent in database queries per HTTP request", ("route",), QUERY_LATENCY_BUCKETS
+)
+db_queries = registry.counter("oreon_db_queries_total", "Database queries, in and outside HTTP requests")
+db_query_time = registry.histogram("oreon_db_query_duration_seconds", "Latency of single database queries", (), QUERY_LATENCY_BUCKETS)
+ws_fanout = registry.histogram(
+    "oreon_ws_fanout_duration_seconds", "Time to publish a message to its recipients' queues", ("kind",), QUERY_LATENCY_BUCKETS
+)
+
+class _RequestQueries:
+    __slots__ = ("count", "seconds")
+    
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# Query tally of the HTTP request being handled; a mutable object, so
+# queries run in worker threads (which copy the context) still count
+_request_queries: ContextVar[Optional[_RequestQueries]] = ContextVar("request_queries", default=None)
+
+# The start time lives on the statement's execution context, so a statement that raises
+# (and never reaches after_cursor_execute) leaves nothing behind on the pooled connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    db_queries.inc()
+    db_query_time.observe(elapsed)
+    tally = _request_queries.get()
+    if tally is not None:
+        tally.count += 1
+        tally.seconds += elapsed
+
+def instrument_engine(engine: Engine):
+    """Count and time every query run on `engine` (pass async engines' .sync_engine)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def route_template(scope: Scope, root_path: str = "") -> str:
+    """The matched route's path pattern, so /avatars/{filename} is one series rather than one per file
+    
+    Requests handled by a mount (e.g. /api/uploads) are grouped under it,
+    and those matching no route under "unmatched".
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path_format", route.path)
+    if scope.get("root_path", "") != root_path:
+        return scope["root_path"] + "/{path}"
+    return "unmatched"
+
+class MetricsMiddleware:
+    """Record latency, status and database work of each HTTP request"""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = [500]
+        
+        async def send_with_status(message: Message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        
+        root_path = scope.get("root_path", "")
+        tally = _RequestQueries()
+        token = _request_queries.set(tally)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            route = route_template(scope, root_path)
+            method = scope["method"]
+            http_requests.inc(method, route, str(status[0]))
+            http_latency.observe(elapsed, method, route)
+            request_queries.observe(tally.count, route)
+            request_query_time.observe(tally.seconds, route)
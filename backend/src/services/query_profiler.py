@@ -0,0 +1,174 @@
+"""
+Per-request SQL profiling for development and canary builds.
+
+With QUERY_PROFILING on, every statement a request runs is recorded.
+When the request ends:
+  - statement shapes run QUERY_PROFILING_REPEAT_THRESHOLD times or more
+    are logged as likely N+1 loops
+  - statements slower than QUERY_PROFILING_SLOW_MS are logged with
+    their query plan
+and each response carries a Server-Timing header splitting the time
+into database, CPU and total. This costs far more than the always-on
+metrics; keep it off in production.
+
+capture_queries() records statements on whole engines instead, for
+tests where the app runs on another thread (see conftest.max_queries).
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Runs of placeholders (IN lists, multi-row VALUES) and literals collapse to one token
+_PLACEHOLDER_RUN = re.compile(r"(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))+")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """The statement with literals and placeholder lists normalised, to group repeats"""
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _PLACEHOLDER_RUN.sub("?, ...", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+class QueryRecord:
+    __slots__ = ("statement", "parameters", "seconds", "plan")
+    
+    def __init__(self, statement: str, parameters, seconds: float, plan: Optional[List[str]] = None):
+        self.statement = statement
+        self.parameters = parameters
+        self.seconds = seconds
+        self.plan = plan
+
+class QueryProfile:
+    """Statements run while a request (or a capture_queries block) was active"""
+    
+    def __init__(self):
+        self.queries: List[QueryRecord] = []
+        self.db_seconds = 0.0
+    
+    def add(self, record: QueryRecord):
+        self.queries.append(record)
+        self.db_seconds += record.seconds
+    
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes run at least `threshold` times, most frequent first"""
+        counts = Counter(statement_shape(query.statement) for query in self.queries)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+# Profiles of open capture_queries() blocks, fed from any thread
+_captures: List[QueryProfile] = []
+
+def explain(connection, statement: str, parameters) -> List[str]:
+    """Query plan of a statement, run on the raw DBAPI connection so no events fire"""
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        # The plan text is the last column (SQLite's "detail", PostgreSQL's only one)
+        return [str(row[-1]) for row in cursor.fetchall()] or ["(no plan)"]
+    except Exception as e:
+        return [f"(no plan: {e})"]
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context rather than the connection, as in metrics
+    if context is not None:
+        context._profile_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profile_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    profile = _current_profile.get()
+    if profile is None and not _captures:
+        return
+    plan = None
+    if profile is not None and elapsed * 1000 >= Config.QUERY_PROFILING_SLOW_MS and not executemany:
+        plan = explain(conn, statement, parameters)
+    record = QueryRecord(statement, parameters, elapsed, plan)
+    if profile is not None:
+        profile.add(record)
+    for capture in list(_captures):
+        capture.add(record)
+
+def instrument_engine(engine: Engine):
+    """Record statements run on `engine` (pass async engines' .sync_engine)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def capture_queries(engines: Iterable[Engine]):
+    """Record every statement run on `engines`, from any thread, while the block runs"""
+    for engine in engines:
+        instrument_engine(engine)
+    profile = QueryProfile()
+    _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        _captures.remove(profile)
+
+def server_timing(profile: QueryProfile, cpu_seconds: float, total_seconds: float) -> str:
+    return (
+        f'db;dur={profile.db_seconds * 1000:.2f};desc="{len(profile.queries)} queries", '
+        f"cpu;dur={cpu_seconds * 1000:.2f}, "
+        f"total;dur={total_seconds * 1000:.2f}"
+    )
+
+def report(profile: QueryProfile, label: str):
+    """Log likely N+1 loops and slow statements of a finished request"""
+    for shape, count in profile.repeated(Config.QUERY_PROFILING_REPEAT_THRESHOLD):
+        logger.warning("%s: possible N+1, %d x %s", label, count, shape)
+    for query in profile.queries:
+        if query.plan is not None:
+            logger.warning(
+                "%s: slow query (%.1f ms): %s %r\n  plan: %s",
+                label, query.seconds * 1000, query.statement, query.parameters, "\n  plan: ".join(query.plan)
+            )
+
+class QueryProfilerMiddleware:
+    """Profile each HTTP request's SQL and add a Server-Timing header"""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        profile = QueryProfile()
+        # Process-wide CPU time, so only meaningful when requests don't overlap
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(
+                    profile, time.process_time() - cpu_start, time.perf_counter() - start
+                ))
+            await send(message)
+        
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            report(profile, f'{scope["method"]} {scope["path"]}')
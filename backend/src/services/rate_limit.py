@@ -0,0 +1,210 @@
+"""
+Token-bucket rate limiting per client IP or per user.
+
+Each named limit ("login", "send_message", ...) is a bucket holding up
+to `burst` requests, refilled evenly at `rate` per second, so a client
+can burst to the limit and is then held to the refill rate. A request
+that finds the bucket empty gets a 429 with the seconds until the next
+token in Retry-After.
+
+Buckets live in this process (memory://) or in Redis (redis://), where
+every worker shares them. A bucket that has refilled is the same as no
+bucket, so idle ones are dropped: pruned from memory, expired in Redis.
+"""
+import logging
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+from config import Config
+from src.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+rate_limited_requests = registry.counter(
+    "oreon_rate_limited_requests_total", "Requests refused by a rate limit", ("limit",)
+)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+_LIMIT = re.compile(r"^\s*(\d+)\s*/\s*(second|minute|hour)\s*$")
+
+class Limit(NamedTuple):
+    burst: int
+    rate: float  # tokens per second
+
+def parse_limit(value: str) -> Optional[Limit]:
+    """'10/minute' -> bursts of 10 refilled at 10 a minute; empty or 0 disables the limit"""
+    if not value.strip():
+        return None
+    match = _LIMIT.match(value)
+    if match is None:
+        raise ValueError(f"Invalid rate limit {value!r}, expected <requests>/<second|minute|hour>")
+    count = int(match.group(1))
+    if count == 0:
+        return None
+    return Limit(count, count / PERIODS[match.group(2)])
+
+class RateLimitBackend(ABC):
+    """Where the buckets live"""
+    
+    @abstractmethod
+    async def take(self, key: str, limit: Limit) -> float:
+        """Take a token from key's bucket: 0 if there was one, else seconds until there is"""
+        ...
+    
+    def size(self) -> Optional[int]:
+        """Buckets held in this process, or None when they live elsewhere"""
+        return None
+    
+    async def close(self):
+        pass
+
+class InMemoryRateLimit(RateLimitBackend):
+    """Single-process buckets: key -> (tokens, updated, full again at), monotonic times
+    
+    Keys are kept least recently used first, so past max_keys the
+    stalest bucket goes; that client just starts again from a full one.
+    Each take also drops up to `prune_batch` refilled buckets from that
+    end, so idle buckets are cleared at O(1) cost per request.
+    """
+    
+    def __init__(self, max_keys: int, prune_batch: int = 2):
+        self.max_keys = max_keys
+        self.prune_batch = prune_batch
+        self._buckets: OrderedDict = OrderedDict()
+    
+    async def take(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        for _ in range(self.prune_batch):
+            oldest = next(iter(self._buckets), None)
+            if oldest is None or self._buckets[oldest][2] > now:
+                break
+            del self._buckets[oldest]
+        
+        bucket = self._buckets.get(key)
+        tokens = limit.burst if bucket is None else min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / limit.rate
+        self._buckets[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+    
+    def size(self) -> Optional[int]:
+        return len(self._buckets)
+
+# Refill, take and store in one step; Redis' clock keeps workers consistent
+TOKEN_BUCKET_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = burst
+if bucket[1] then
+    tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', string.format('%.6f', tokens), 'updated', string.format('%.6f', now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1)
+return tostring(wait)
+"""
+
+class RedisRateLimit(RateLimitBackend):
+    """One hash per bucket, updated by a Lua script and expiring once refilled"""
+    
+    def __init__(self, url: str, prefix: str = "oreon", client=None):
+        # Optional dependency, only needed when a redis:// backend is configured
+        import redis.asyncio as redis
+        
+        self.prefix = prefix
+        # client: an existing redis.asyncio client, e.g. fakeredis.FakeAsyncRedis in tests
+        self.redis = client if client is not None else redis.from_url(url)
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+    
+    async def take(self, key: str, limit: Limit) -> float:
+        wait = await self.script(keys=[f"{self.prefix}:ratelimit:{key}"], args=[limit.burst, repr(limit.rate)])
+        return float(wait)
+    
+    async def close(self):
+        await self.redis.aclose()
+
+def create_rate_limit_backend(url: Optional[str] = None) -> RateLimitBackend:
+    """Build the backend configured by Config.RATE_LIMIT_URL"""
+    url = url or Config.RATE_LIMIT_URL
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRateLimit(url, Config.BROKER_CHANNEL_PREFIX)
+    if url.startswith("memory://"):
+        return InMemoryRateLimit(Config.RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unsupported RATE_LIMIT_URL: {url}")
+
+class RateLimiter:
+    """The configured limits, checked against one backend
+    
+    If the backend fails (e.g. Redis is down) requests are let through
+    rather than refused.
+    """
+    
+    def __init__(self, backend: RateLimitBackend, limits: Dict[str, Optional[Limit]], enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited: Dict[str, int] = {}
+        self.errors = 0
+    
+    async def check(self, name: str, key: str) -> float:
+        """0 if the request may go ahead, else seconds the client should wait"""
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None:
+            return 0.0
+        try:
+            wait = await self.backend.take(f"{name}:{key}", limit)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limit backend failed, allowing request: %s", e)
+            return 0.0
+        if wait > 0:
+            self.limited[name] = self.limited.get(name, 0) + 1
+            rate_limited_requests.inc(name)
+        else:
+            self.allowed += 1
+        return wait
+    
+    async def close(self):
+        await self.backend.close()
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "buckets": self.backend.size(),
+            "limits": {
+                name: {"burst": limit.burst, "per_second": limit.rate}
+                for name, limit in self.limits.items() if limit is not None
+            },
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "backend_errors": self.errors,
+        }
+
+rate_limiter = RateLimiter(
+    create_rate_limit_backend(),
+    {
+        "login": parse_limit(Config.RATE_LIMIT_LOGIN),
+        "register": parse_limit(Config.RATE_LIMIT_REGISTER),
+        "user_search": parse_limit(Config.RATE_LIMIT_USER_SEARCH),
+        "send_message": parse_limit(Config.RATE_LIMIT_SEND_MESSAGE),
+    },
+    enabled=Config.RATE_LIMIT_ENABLED
+)
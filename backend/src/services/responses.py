@@ -0,0 +1,37 @@
+"""
+JSON responses for endpoints without a response model.
+
+Routes declaring a `response_model` are already serialized straight to
+bytes by pydantic-core. Routes returning plain dicts go through
+jsonable_encoder and json.dumps instead; returning a FastJSONResponse
+skips both and encodes with orjson, falling back to the standard
+library when orjson isn't installed.
+"""
+import json
+from typing import Any
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ModuleNotFoundError:  # optional dependency
+    orjson = None
+
+def _default(value: Any) -> Any:
+    """Types neither orjson nor json handle natively, encoded the way jsonable_encoder does"""
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson; pass the data as returned by the service"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
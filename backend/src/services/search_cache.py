@@ -0,0 +1,15 @@
+from config import Config
+from src.services.ttl_cache import TTLCache
+
+class SearchCache(TTLCache):
+    """Bounded LRU cache of recent search results, cleared on every write
+    
+    Results are plain dicts, so a hit never touches the database. The
+    cache is per process: other workers see a write only once their
+    entries expire, which bounds staleness to `ttl`.
+    """
+
+user_search_cache = SearchCache(
+    maxsize=Config.USER_SEARCH_CACHE_SIZE,
+    ttl=Config.USER_SEARCH_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,71 @@
+"""
+Serving uploaded files with long-lived HTTP caching.
+
+Upload names never change content: avatars are stored under their
+SHA-256 and older ones embed the user id and upload time. Those are
+sent with `Cache-Control: immutable` so clients don't even revalidate;
+any other name gets a short max-age. Conditional requests are answered
+with 304 and byte ranges by FileResponse.
+
+With UPLOADS_ACCEL_REDIRECT set (e.g. "/_uploads/") the app only sends
+headers plus X-Accel-Redirect, and nginx streams the file itself with
+sendfile(2). Otherwise FileResponse sends it, zero-copy when the ASGI
+server supports the pathsend extension.
+"""
+import os
+import re
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from config import Config
+
+UPLOADS_ROOT = "uploads"
+
+# <sha256>[_<px>].<ext> (content-addressed avatars and their variants),
+# or <user uuid>_<YYYYmmdd_HHMMSS>.<ext> from before content addressing
+CONTENT_ADDRESSED = re.compile(r"^(?P<digest>[0-9a-f]{64}(?:_\d+)?)\.\w+$")
+TIMESTAMPED = re.compile(r"^[0-9a-f-]{36}_\d{8}_\d{6}\.\w+$")
+
+IMMUTABLE = f"public, max-age={Config.UPLOADS_IMMUTABLE_MAX_AGE}, immutable"
+SHORT_LIVED = f"public, max-age={Config.UPLOADS_MAX_AGE}"
+
+def is_versioned(filename: str) -> bool:
+    """Whether a file name is bound to one content for good"""
+    return bool(CONTENT_ADDRESSED.match(filename) or TIMESTAMPED.match(filename))
+
+class UploadFiles(StaticFiles):
+    """StaticFiles for user uploads, adding caching headers and X-Accel-Redirect"""
+    
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+        cache_control: Optional[str] = None
+    ) -> Response:
+        filename = os.path.basename(full_path)
+        headers = {"Cache-Control": cache_control or (IMMUTABLE if is_versioned(filename) else SHORT_LIVED)}
+        content_addressed = CONTENT_ADDRESSED.match(filename)
+        if content_addressed:
+            # Same bytes give the same ETag on every host, unlike mtime-size
+            headers["ETag"] = f'"{content_addressed.group("digest")}"'
+        
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        if Config.UPLOADS_ACCEL_REDIRECT:
+            return self._accel_redirect(full_path, response)
+        return response
+    
+    @staticmethod
+    def _accel_redirect(full_path, response: FileResponse) -> Response:
+        """Headers only; nginx sends the body (and handles Range) from its internal location"""
+        relative = os.path.relpath(os.path.realpath(full_path), os.path.realpath(UPLOADS_ROOT))
+        headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+        headers["X-Accel-Redirect"] = Config.UPLOADS_ACCEL_REDIRECT.rstrip("/") + "/" + relative
+        return Response(status_code=response.status_code, headers=headers, media_type=response.media_type)
+
+upload_files = UploadFiles(directory=UPLOADS_ROOT, check_dir=False)
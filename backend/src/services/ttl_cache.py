@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire, safe to share between threads
+    
+    Past `maxsize` the least recently used entry goes; an entry read after
+    its expiry counts as a miss and is dropped. Entries live `ttl` seconds
+    unless `set` is given an explicit expiry, both measured on `clock`.
+    A maxsize of 0 disables the cache.
+    """
+    
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        if self.maxsize <= 0:
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: Hashable, value: Any, expires: Optional[float] = None):
+        """Store value until `expires` (on `clock`), by default `ttl` from now"""
+        if self.maxsize <= 0:
+            return
+        if expires is None:
+            expires = self.clock() + self.ttl
+        
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"size": len(self._entries), "maxsize": self.maxsize}
+            if self.ttl is not None:
+                stats["ttl_seconds"] = self.ttl
+            stats.update(hits=self.hits, misses=self.misses)
+            return stats
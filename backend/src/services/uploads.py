@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Callable, List, Optional
+from fastapi import Request
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # older python-multipart releases
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+try:
+    from PIL import Image
+except ModuleNotFoundError:
+    Image = None  # optional dependency
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Leading bytes of the image formats accepted for avatars
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+SNIFF_BYTES = 8
+# Pillow's name for each of those formats
+IMAGE_FORMATS = {".jpg": "JPEG", ".png": "PNG", ".gif": "GIF"}
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload passes its size cap"""
+
+class InvalidUpload(Exception):
+    """Raised for a malformed body, a missing file or an unrecognised type"""
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """File extension for an image's magic bytes, or None"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def verify_image(path: str, extension: str) -> bool:
+    """Whether Pillow parses the file as the format its magic bytes claimed
+    
+    Catches files that only start like an image. Without Pillow installed
+    every file passes and the magic bytes are all that is checked.
+    """
+    if Image is None:
+        return True
+    try:
+        with Image.open(path) as image:
+            if image.format != IMAGE_FORMATS.get(extension):
+                return False
+            image.verify()
+    except Exception:
+        return False
+    return True
+
+async def remove_file(path: str):
+    """Delete a file off the event loop, ignoring one that is already gone"""
+    try:
+        await asyncio.to_thread(os.remove, path)
+    except FileNotFoundError:
+        pass
+
+class StoredUpload:
+    """An uploaded file sitting in a temp file next to its destination"""
+    
+    def __init__(self, path: str, size: int, extension: str, sha256: str):
+        self.path = path
+        self.size = size
+        self.extension = extension
+        self.sha256 = sha256
+    
+    async def save_as(self, path: str):
+        """Atomically move the upload into place (same filesystem)"""
+        await asyncio.to_thread(os.replace, self.path, path)
+        self.path = path
+    
+    async def discard(self):
+        await remove_file(self.path)
+
+class _FilePart:
+    """Multipart callbacks collecting one named field's data"""
+    
+    def __init__(self, field: str):
+        self.field = field
+        self.found = False
+        self.pending: List[bytes] = []
+        self._capturing = False
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+    
+    def on_part_begin(self):
+        self._disposition = b""
+        self._capturing = False
+    
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+    
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+    
+    def on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+    
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        # Only the first matching part is kept
+        self._capturing = not self.found and options.get(b"name") == self.field.encode()
+        self.found = self.found or self._capturing
+    
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._capturing:
+            self.pending.append(data[start:end])
+    
+    def on_part_end(self):
+        self._capturing = False
+
+def _append(file, digest, data: bytes):
+    digest.update(data)
+    file.write(data)
+
+async def receive_upload(
+    request: Request,
+    field: str,
+    directory: str,
+    max_size: int,
+    sniff: Callable[[bytes], Optional[str]] = sniff_image_type,
+    verify: Optional[Callable[[str, str], bool]] = verify_image
+) -> StoredUpload:
+    """Stream one multipart file field into a temp file in `directory`
+    
+    The body is parsed as it arrives and written chunk by chunk off the
+    event loop, so memory use doesn't depend on the upload's size. A
+    declared Content-Length over the cap is refused before reading, and
+    anything else is aborted once `max_size` bytes of file data arrived.
+    `sniff` maps the first bytes to an extension, or None to reject the
+    file. Once complete, `verify(path, extension)` runs on a thread and
+    the file is rejected if it returns False. The result carries the
+    file's SHA-256; call save_as() or discard() on it.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected a multipart/form-data body")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_size + MULTIPART_OVERHEAD:
+        raise UploadTooLarge()
+    
+    part = _FilePart(field)
+    parser = MultipartParser(boundary, {
+        "on_part_begin": part.on_part_begin,
+        "on_part_data": part.on_part_data,
+        "on_part_end": part.on_part_end,
+        "on_header_field": part.on_header_field,
+        "on_header_value": part.on_header_value,
+        "on_header_end": part.on_header_end,
+        "on_headers_finished": part.on_headers_finished,
+    })
+    fd, path = await asyncio.to_thread(tempfile.mkstemp, prefix=".upload-", suffix=".part", dir=directory)
+    file = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    extension = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if not part.pending:
+                continue
+            data = b"".join(part.pending)
+            part.pending.clear()
+            size += len(data)
+            if size > max_size:
+                raise UploadTooLarge()
+            if extension is None:
+                # Hold data back until there are enough bytes to identify the type
+                head += data
+                if len(head) < SNIFF_BYTES:
+                    continue
+                extension, data = sniff(head), head
+                if extension is None:
+                    raise InvalidUpload("Invalid file type")
+            await asyncio.to_thread(_append, file, digest, data)
+        parser.finalize()
+        if not part.found:
+            raise InvalidUpload(f"Missing '{field}' file field")
+        if extension is None:
+            extension = sniff(head)
+            if extension is None:
+                raise InvalidUpload("Invalid file type")
+            await asyncio.to_thread(_append, file, digest, head)
+        await asyncio.to_thread(file.close)
+        if verify is not None and not await asyncio.to_thread(verify, path, extension):
+            raise InvalidUpload("Invalid image file")
+    except FormParserError:
+        await asyncio.to_thread(file.close)
+        await remove_file(path)
+        raise InvalidUpload("Malformed multipart body")
+    except BaseException:
+        await asyncio.to_thread(file.close)
+        await remove_file(path)
+        raise
+    return StoredUpload(path, size, extension, digest.hexdigest())
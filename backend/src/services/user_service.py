@@ -1,14 +1,47 @@
+from datetime import datetime
+from sqlalchemy import or_, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
-from src.models.user import User, UserCreate, UserUpdate
+from src.database import awaitable
+from src.models.user import User, UserCreate, UserUpdate, normalize_search_text
 from src.auth.hash_password import HashPassword
-from typing import List, Optional
+from src.auth.user_cache import user_cache
+from src.services.search_cache import user_search_cache
+from typing import Dict, List, Optional
 import uuid
 
+def _search_result(user: User) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "full_name": user.full_name,
+        "farm_name": user.farm_name,
+        "role": user.role,
+        "avatar": user.avatar,
+    }
+
+# Engine -> whether its database has the users_search trigram table. Looked up on the
+# first search, after init_db's migrations, instead of on every uncached search
+_trigram_index: Dict[Engine, bool] = {}
+
+def _has_trigram_index(db: Session) -> bool:
+    engine = db.get_bind().engine
+    found = _trigram_index.get(engine)
+    if found is None:
+        found = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'users_search'")).first() is not None
+        _trigram_index[engine] = found
+    return found
+
 class UserService:
     @staticmethod
-    def create_user(db: Session, user: UserCreate) -> User:
-        """Create a new user"""
-        hashed_password = HashPassword.get_password_hash(user.password)
+    def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> User:
+        """Create a new user
+        
+        Pass `hashed_password` when the password was already hashed, e.g.
+        on the hashing pool, to skip hashing here.
+        """
+        if hashed_password is None:
+            hashed_password = HashPassword.get_password_hash(user.password)
         db_user = User(
             id=str(uuid.uuid4()),
             email=user.email,
@@ -21,6 +54,7 @@ class UserService:
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
+        user_search_cache.clear()
         return db_user
     
     @staticmethod
@@ -38,6 +72,92 @@ class UserService:
         """Get all users"""
         return db.query(User).offset(skip).limit(limit).all()
     
+    @staticmethod
+    def search_users(db: Session, user_id: str, q: str = "", role: Optional[str] = None, limit: int = 10) -> List[dict]:
+        """Search other users by name or username
+        
+        Exact matches rank first, then username prefixes, then full name
+        prefixes, then substring matches; ties are ordered by full name.
+        Results are cached per (q, role, limit) until the next user write.
+        """
+        term = normalize_search_text(q)
+        key = (term, role, limit)
+        results = user_search_cache.get(key)
+        if results is None:
+            # One spare row so that dropping the caller still leaves `limit`
+            results = UserService._search_candidates(db, term, role, limit + 1)
+            user_search_cache.set(key, results)
+        return [result for result in results if result["id"] != user_id][:limit]
+    
+    @staticmethod
+    def _search_candidates(db: Session, term: str, role: Optional[str], limit: int) -> List[dict]:
+        query = db.query(User)
+        if role:
+            query = query.filter(User.role == role)
+        if not term:
+            return [_search_result(user) for user in query.order_by(User.full_name_lower).limit(limit)]
+        
+        # Prefixes: range scans on the normalized column indexes
+        found = {}
+        for column in (User.username_lower, User.full_name_lower):
+            prefix = query.filter(column >= term, column < term + "\U0010ffff")
+            for user in prefix.order_by(column).limit(limit):
+                found.setdefault(user.id, user)
+        
+        # Substrings, only needed while the prefix hits don't fill the page
+        if len(found) < limit:
+            for user in UserService._substring_matches(db, query, term, role, limit + len(found)):
+                found.setdefault(user.id, user)
+        
+        def rank(user: User) -> tuple:
+            if term in (user.username_lower, user.full_name_lower):
+                tier = 0
+            elif (user.username_lower or "").startswith(term):
+                tier = 1
+            elif (user.full_name_lower or "").startswith(term):
+                tier = 2
+            else:
+                tier = 3
+            return tier, user.full_name_lower or "", user.username_lower or ""
+        
+        return [_search_result(user) for user in sorted(found.values(), key=rank)[:limit]]
+    
+    @staticmethod
+    def _substring_matches(db: Session, query, term: str, role: Optional[str], limit: int) -> List[User]:
+        # The trigram index only matches terms of 3+ characters; shorter ones use LIKE
+        if len(term) >= 3 and db.get_bind().dialect.name == "sqlite" and _has_trigram_index(db):
+            sql = (
+                "SELECT users.* FROM users_search JOIN users ON users.rowid = users_search.rowid "
+                "WHERE users_search MATCH :match"
+            )
+            params = {"match": '"' + term.replace('"', '""') + '"', "limit": limit}
+            if role:
+                sql += " AND users.role = :role"
+                params["role"] = role
+            return db.query(User).from_statement(text(sql + " LIMIT :limit")).params(params).all()
+        # Postgres answers this from the pg_trgm indexes; elsewhere it scans
+        pattern = f"%{term}%"
+        return query.filter(
+            or_(User.username_lower.like(pattern), User.full_name_lower.like(pattern))
+        ).limit(limit).all()
+    
+    @staticmethod
+    def set_avatar(db: Session, user: User, filename: Optional[str]) -> User:
+        """Point a user's avatar at filename, or clear it with None"""
+        user.avatar = filename
+        user.updated_at = datetime.utcnow()
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        user_cache.invalidate(user.username)
+        user_search_cache.clear()
+        return user
+    
+    @staticmethod
+    def avatar_in_use(db: Session, filename: str) -> bool:
+        """Whether any user still points at an avatar file (they are shared by content)"""
+        return db.query(User.id).filter(User.avatar == filename).first() is not None
+    
     @staticmethod
     def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
         """Authenticate a user"""
@@ -49,19 +169,22 @@ class UserService:
         return user
     
     @staticmethod
-    def update_user(db: Session, username: str, user_update: UserUpdate) -> Optional[User]:
+    def update_user(db: Session, username: str, user_update: UserUpdate, hashed_password: Optional[str] = None) -> Optional[User]:
         """Update user information"""
         db_user = UserService.get_user_by_username(db, username)
         if db_user:
             update_data = user_update.dict(exclude_unset=True)
             if "password" in update_data:
-                update_data["hashed_password"] = HashPassword.get_password_hash(update_data.pop("password"))
+                password = update_data.pop("password")
+                update_data["hashed_password"] = hashed_password or HashPassword.get_password_hash(password)
             
             for key, value in update_data.items():
                 setattr(db_user, key, value)
             
             db.commit()
             db.refresh(db_user)
+            user_cache.invalidate(username)
+            user_search_cache.clear()
         return db_user
     
     @staticmethod
@@ -71,5 +194,20 @@ class UserService:
         if db_user:
             db.delete(db_user)
             db.commit()
+            user_cache.invalidate(username)
+            user_search_cache.clear()
             return True
-        return False
\ No newline at end of file
+        return False
+
+class AsyncUserService:
+    """Awaitable UserService for routes, working with Session or AsyncSession"""
+    create_user = awaitable(UserService.create_user)
+    get_user_by_username = awaitable(UserService.get_user_by_username)
+    get_user_by_email = awaitable(UserService.get_user_by_email)
+    get_all_users = awaitable(UserService.get_all_users)
+    search_users = awaitable(UserService.search_users)
+    set_avatar = awaitable(UserService.set_avatar)
+    avatar_in_use = awaitable(UserService.avatar_in_use)
+    authenticate_user = awaitable(UserService.authenticate_user)
+    update_user = awaitable(UserService.update_user)
+    delete_user = awaitable(UserService.delete_user)
@@ -0,0 +1,141 @@
+"""
+Direct messages over REST: conversation list, history paging and read
+markers, with the number of SQL statements each request may run.
+"""
+MESSAGES = "/api/v1/chat/messages"
+CONVERSATIONS = "/api/v1/chat/conversations"
+
+
+def send(client, headers, receiver_id, text):
+    response = client.post(MESSAGES, headers=headers, json={"receiver_id": receiver_id, "message": text})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_conversations_list_latest_message_and_unread(client, make_user, max_queries):
+    me, my_headers = make_user()
+    partners = [make_user() for _ in range(3)]
+    for n, (partner_id, partner_headers) in enumerate(partners):
+        send(client, my_headers, partner_id, f"hello {n}")
+        send(client, partner_headers, me, f"reply {n}")
+
+    with max_queries(2):
+        response = client.get(CONVERSATIONS, headers=my_headers)
+    assert response.status_code == 200
+    conversations = response.json()
+    assert [c["user_id"] for c in conversations] == [partner_id for partner_id, _ in reversed(partners)]
+    assert [c["last_message"] for c in conversations] == ["reply 2", "reply 1", "reply 0"]
+    assert all(c["unread_count"] == 1 for c in conversations)
+
+
+def test_conversations_cursor_pages_without_repeats(client, make_user, max_queries):
+    me, my_headers = make_user()
+    partners = [make_user()[0] for _ in range(5)]
+    for partner_id in partners:
+        send(client, my_headers, partner_id, "hi")
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        with max_queries(2):
+            response = client.get(CONVERSATIONS, headers=my_headers, params=params)
+        seen += [c["user_id"] for c in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == partners[::-1]
+
+
+def test_message_history_pages_with_before_and_after(client, make_user, max_queries):
+    me, my_headers = make_user()
+    other, _ = make_user()
+    sent = [send(client, my_headers, other, f"m{n}")["id"] for n in range(7)]
+
+    pages, before = [], None
+    while True:
+        params = {"other_user_id": other, "limit": 3} | ({"before": before} if before else {})
+        with max_queries(3):
+            page = client.get(MESSAGES, headers=my_headers, params=params).json()
+        if not page:
+            break
+        pages.append([m["id"] for m in page])
+        before = page[-1]["id"]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == sent[::-1]
+
+    newer = client.get(MESSAGES, headers=my_headers, params={"other_user_id": other, "after": sent[2], "limit": 2}).json()
+    assert [m["id"] for m in newer] == [sent[4], sent[3]]
+
+
+def test_bulk_mark_read_updates_every_conversation_in_one_go(client, make_user, max_queries):
+    me, my_headers = make_user()
+    senders = [make_user() for _ in range(4)]
+    last = {}
+    for sender_id, sender_headers in senders:
+        for n in range(3):
+            last[sender_id] = send(client, sender_headers, me, f"news {n}")["id"]
+
+    markers = [{"sender_id": sender_id} for sender_id, _ in senders[:3]]
+    # Partial read of the last sender: everything up to its second message
+    second = client.get(MESSAGES, headers=my_headers, params={"other_user_id": senders[3][0]}).json()[1]["id"]
+    markers.append({"sender_id": senders[3][0], "up_to_message_id": second})
+
+    # Loading the user, then one statement each for messages, summaries and
+    # receipts however many conversations are marked
+    with max_queries(4):
+        response = client.post(f"{MESSAGES}/read", headers=my_headers, json={"markers": markers})
+    assert response.status_code == 200
+    assert response.json()["updated"] == {
+        **{sender_id: 3 for sender_id, _ in senders[:3]}, senders[3][0]: 2
+    }
+    unread = {c["user_id"]: c["unread_count"] for c in client.get(CONVERSATIONS, headers=my_headers).json()}
+    assert unread == {**{sender_id: 0 for sender_id, _ in senders[:3]}, senders[3][0]: 1}
+
+
+def test_batched_message_committed_late_does_not_replace_newer_last_message(client, make_user):
+    from src.database import SessionLocal
+    from src.models.chat import MessageCreate
+    from src.services.chat_service import ChatService
+
+    me, my_headers = make_user()
+    other, other_headers = make_user()
+    # Built (and timestamped) when the WebSocket frame arrives, then held in the write batch...
+    queued = ChatService.build_message(me, "me", "Me", MessageCreate(receiver_id=other, message="early (ws, queued)"))
+    # ...while a REST send commits
+    send(client, my_headers, other, "late (rest)")
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        ChatService.store_messages(db, [queued])
+    finally:
+        db.close()
+
+    history = client.get(MESSAGES, headers=my_headers, params={"other_user_id": other}).json()
+    assert [m["message"] for m in history] == ["late (rest)", "early (ws, queued)"]
+    conversation, = client.get(CONVERSATIONS, headers=my_headers).json()
+    assert conversation["last_message"] == "late (rest)"
+    # The receiver still has both unread
+    conversation, = client.get(CONVERSATIONS, headers=other_headers).json()
+    assert (conversation["last_message"], conversation["unread_count"]) == ("late (rest)", 2)
+
+
+def test_search_finds_whole_words_in_own_messages(client, make_user):
+    me, my_headers = make_user()
+    other, _ = make_user()
+    send(client, my_headers, other, "lunch at noon tomorrow")
+
+    response = client.get(f"{MESSAGES}/search", headers=my_headers, params={"q": "noon"})
+    assert response.status_code == 200
+    assert [r["message"] for r in response.json()] == ["lunch at noon tomorrow"]
+
+
+def test_search_unavailable_is_501(client, make_user, monkeypatch):
+    from src.services.chat_service import AsyncChatService, SearchUnavailable
+    _, my_headers = make_user()
+
+    def unavailable(*args):
+        raise SearchUnavailable("Message search is not available on testdb")
+
+    monkeypatch.setattr(AsyncChatService, "search_messages", unavailable)
+    response = client.get(f"{MESSAGES}/search", headers=my_headers, params={"q": "noon"})
+    assert response.status_code == 501
+    assert response.json()["detail"] == "Message search is not available on testdb"
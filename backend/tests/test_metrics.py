@@ -0,0 +1,19 @@
+"""
+Query timing hooks shared by /metrics and the query profiler.
+"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from src.database import engine
+from src.services.query_profiler import capture_queries
+
+
+def test_failed_statement_does_not_skew_later_timings(client):
+    with capture_queries([engine]) as profile, engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        assert not conn.info.get("query_start") and not conn.info.get("profile_start")
+    assert [q.statement for q in profile.queries] == ["SELECT 1"]
+    assert profile.queries[0].seconds < 1
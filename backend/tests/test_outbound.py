@@ -0,0 +1,40 @@
+"""
+Per-socket outbound queues: coalescing keyed updates and the overflow
+policies.
+"""
+from src.realtime.outbound import OutboundQueue
+
+
+def queued(queue):
+    return [message for _, message in queue._entries]
+
+
+def test_keyed_updates_coalesce_under_the_default_policy():
+    queue = OutboundQueue(websocket=None, maxsize=10)
+    queue.put("receipt 1", coalesce_key="read:alice")
+    queue.put("chat")
+    queue.put("receipt 2", coalesce_key="read:alice")
+    queue.put("receipt from bob", coalesce_key="read:bob")
+    assert queued(queue) == ["receipt 2", "chat", "receipt from bob"]
+    assert queue.coalesced == 1
+
+
+def test_drop_oldest_discards_the_head_when_full():
+    queue = OutboundQueue(websocket=None, maxsize=2, policy="drop_oldest")
+    queue.put("chat 1")
+    queue.put("presence", coalesce_key="presence:x")
+    queue.put("chat 2")
+    assert queued(queue) == ["presence", "chat 2"]
+    assert queue.dropped == 1
+
+
+def test_coalesce_policy_drops_keyed_updates_before_messages():
+    queue = OutboundQueue(websocket=None, maxsize=2, policy="coalesce")
+    queue.put("chat 1")
+    queue.put("presence", coalesce_key="presence:x")
+    queue.put("chat 2")
+    queue.put("chat 3")
+    assert queued(queue) == ["chat 2", "chat 3"]
+    assert queue.dropped == 2
+    queue.put("presence again", coalesce_key="presence:x")
+    assert queued(queue) == ["chat 3", "presence again"]
@@ -0,0 +1,122 @@
+"""
+Token-bucket rate limits: the in-memory buckets and the limit on
+messages sent over the WebSocket.
+"""
+import asyncio
+import json
+import time
+import pytest
+from src.services.rate_limit import InMemoryRateLimit, Limit, RateLimiter, RedisRateLimit, rate_limiter
+
+
+def test_bucket_allows_burst_then_asks_to_wait():
+    backend = InMemoryRateLimit(max_keys=10)
+    limit = Limit(burst=2, rate=1)
+
+    async def take_three():
+        return [await backend.take("client", limit) for _ in range(3)]
+
+    first, second, third = asyncio.run(take_three())
+    assert first == second == 0
+    assert 0.9 < third <= 1
+
+
+def test_refilled_buckets_are_pruned_a_few_per_take():
+    backend = InMemoryRateLimit(max_keys=1000, prune_batch=2)
+    limit = Limit(burst=1, rate=1000)
+
+    async def fill_then_take():
+        for n in range(10):
+            await backend.take(f"idle-{n}", limit)
+        time.sleep(0.01)
+        await backend.take("active", limit)
+
+    asyncio.run(fill_then_take())
+    assert backend.size() == 10 - 2 + 1
+
+
+def test_bucket_count_stays_under_max_keys():
+    backend = InMemoryRateLimit(max_keys=5)
+    limit = Limit(burst=10, rate=1)
+
+    async def spread():
+        for n in range(20):
+            await backend.take(f"client-{n}", limit)
+
+    asyncio.run(spread())
+    assert backend.size() == 5
+
+
+def fake_redis():
+    """In-process Redis stand-in; the token bucket script needs `pip install fakeredis[lua]`"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeAsyncRedis()
+
+
+def test_redis_bucket_allows_burst_then_asks_to_wait():
+    async def run():
+        backend = RedisRateLimit("", "test", client=fake_redis())
+        limit = Limit(burst=2, rate=1)
+        try:
+            waits = [await backend.take("burst", limit) for _ in range(3)]
+            other = await backend.take("burst-other", limit)
+            ttl = await backend.redis.pttl("test:ratelimit:burst")
+        finally:
+            await backend.close()
+        return waits, other, ttl
+
+    (first, second, third), other, ttl = asyncio.run(run())
+    assert first == second == 0
+    assert 0.9 < third <= 1
+    assert other == 0
+    # Expires once it would be full again, about two seconds from now
+    assert 1000 < ttl <= 2001
+
+
+def test_redis_buckets_refill_over_time():
+    async def run():
+        backend = RedisRateLimit("", "test", client=fake_redis())
+        limit = Limit(burst=1, rate=20)
+        try:
+            refused = [await backend.take("refill", limit) for _ in range(2)][1]
+            await asyncio.sleep(0.06)
+            allowed = await backend.take("refill", limit)
+        finally:
+            await backend.close()
+        return refused, allowed
+
+    refused, allowed = asyncio.run(run())
+    assert refused > 0
+    assert allowed == 0
+
+
+def test_limiter_counts_refusals_against_redis():
+    async def run():
+        limiter = RateLimiter(RedisRateLimit("", "test", client=fake_redis()), {"login": Limit(burst=1, rate=0.1)})
+        try:
+            return [await limiter.check("login", "10.0.0.1") for _ in range(2)], limiter.stats()
+        finally:
+            await limiter.close()
+
+    (allowed, refused), stats = asyncio.run(run())
+    assert allowed == 0 and 9 < refused <= 10
+    assert stats["backend"] == "RedisRateLimit"
+    assert (stats["allowed"], stats["limited"], stats["backend_errors"]) == (1, {"login": 1}, 0)
+
+
+def test_websocket_sends_share_the_send_message_limit(client, make_user, monkeypatch):
+    me, my_headers = make_user()
+    other, _ = make_user()
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "backend", InMemoryRateLimit(max_keys=10))
+    monkeypatch.setitem(rate_limiter.limits, "send_message", Limit(burst=1, rate=0.01))
+
+    token = my_headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/api/v1/chat/ws/{me}?token={token}") as ws:
+        for client_id in ("first", "second"):
+            ws.send_text(json.dumps({"receiver_id": other, "message": "hi", "client_id": client_id}))
+        frames = {frame["client_id"]: frame for frame in (json.loads(ws.receive_text()) for _ in range(2))}
+    assert frames["first"]["type"] == "ack"
+    assert frames["second"]["type"] == "error"
+    assert frames["second"]["retry_after"] == 100
@@ -0,0 +1,87 @@
+"""
+Room membership checks and the per-worker membership cache: a cached set
+that misses a member must never lock them out.
+"""
+import asyncio
+import json
+import uuid
+from src.database import SessionLocal
+from src.models.chat import ChatRoomMember
+from src.realtime.connection_manager import manager
+from src.realtime.rooms import room_members
+from src.routes.chat import room_member_ids
+
+ROOMS = "/api/v1/chat/rooms"
+
+
+def create_room(client, headers):
+    response = client.post(ROOMS, headers=headers, json={"name": "room"})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def post(client, headers, room_id, text):
+    return client.post(f"{ROOMS}/{room_id}/messages", headers=headers, json={"message": text})
+
+
+def join_elsewhere(room_id, user_id):
+    """A join committed by another worker whose announcement hasn't arrived"""
+    db = SessionLocal()
+    try:
+        db.add(ChatRoomMember(id=str(uuid.uuid4()), room_id=room_id, user_id=user_id, username=user_id[:12]))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_member_missing_from_stale_cache_can_post(client, make_user):
+    owner, owner_headers = make_user()
+    late, late_headers = make_user()
+    room_id = create_room(client, owner_headers)
+    client.post(f"{ROOMS}/{room_id}/join", headers=owner_headers)
+    assert post(client, owner_headers, room_id, "warm the cache").status_code == 200
+    assert room_members.get(room_id) == {owner}
+
+    join_elsewhere(room_id, late)
+    assert post(client, late_headers, room_id, "hi").status_code == 200
+    assert room_members.get(room_id) == {owner, late}
+
+
+def test_non_member_is_refused(client, make_user):
+    owner, owner_headers = make_user()
+    _, outsider_headers = make_user()
+    room_id = create_room(client, owner_headers)
+    client.post(f"{ROOMS}/{room_id}/join", headers=owner_headers)
+
+    response = post(client, outsider_headers, room_id, "let me in")
+    assert response.status_code == 403
+
+
+def test_websocket_room_check_rereads_stale_cache(client, make_user):
+    owner, owner_headers = make_user()
+    late, _ = make_user()
+    room_id = create_room(client, owner_headers)
+    client.post(f"{ROOMS}/{room_id}/join", headers=owner_headers)
+    post(client, owner_headers, room_id, "warm the cache")
+
+    join_elsewhere(room_id, late)
+    assert asyncio.run(room_member_ids(room_id)) == {owner}
+    assert asyncio.run(room_member_ids(room_id, require=late)) == {owner, late}
+
+
+def test_join_drops_cached_members(client, make_user):
+    owner, owner_headers = make_user()
+    joiner, joiner_headers = make_user()
+    room_id = create_room(client, owner_headers)
+    client.post(f"{ROOMS}/{room_id}/join", headers=owner_headers)
+    post(client, owner_headers, room_id, "warm the cache")
+    assert room_members.get(room_id) == {owner}
+
+    assert client.post(f"{ROOMS}/{room_id}/join", headers=joiner_headers).status_code == 200
+    assert room_members.get(room_id) is None
+
+
+def test_control_message_from_another_worker_drops_cached_members():
+    room_members.set("room-x", {"a"})
+    asyncio.run(manager.handle_control(json.dumps({"type": "room_members", "room_id": "room-x"})))
+    assert room_members.get("room-x") is None
@@ -0,0 +1,107 @@
+"""
+Avatar uploads: only files that really are images get stored.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import pytest
+from src.services.avatars import AVATAR_DIR, avatar_processor, remove_avatar, settle_avatar, store_avatar
+from src.services.uploads import StoredUpload
+
+AVATAR = "/api/v1/auth/me/avatar"
+
+
+def png(color: str) -> bytes:
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def stored_upload(data: bytes) -> StoredUpload:
+    """An upload as receive_upload leaves it: a temp file next to the avatars"""
+    path = os.path.join(AVATAR_DIR, f".upload-test-{hashlib.sha256(data).hexdigest()[:8]}.part")
+    with open(path, "wb") as file:
+        file.write(data)
+    return StoredUpload(path, len(data), ".png", hashlib.sha256(data).hexdigest())
+
+
+def upload(client, headers, data: bytes, name: str = "avatar.png"):
+    return client.post(AVATAR, headers=headers, files={"file": (name, data, "application/octet-stream")})
+
+
+def test_real_image_is_stored(client, make_user):
+    Image = pytest.importorskip("PIL.Image")
+    _, headers = make_user()
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "green").save(buffer, "PNG")
+
+    response = upload(client, headers, buffer.getvalue())
+    assert response.status_code == 200
+    assert response.json()["avatar"].endswith(".png")
+
+
+def test_unknown_magic_bytes_are_refused(client, make_user):
+    _, headers = make_user()
+    response = upload(client, headers, b"just some text, not an image")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid file type"
+
+
+def test_image_header_without_an_image_is_refused(client, make_user):
+    pytest.importorskip("PIL")
+    _, headers = make_user()
+    response = upload(client, headers, b"GIF89a" + bytes(64), "avatar.gif")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid image file"
+    assert not [name for name in os.listdir(AVATAR_DIR) if name.startswith(".upload-")]
+
+
+def test_shared_avatar_survives_until_its_last_user_removes_it(client, make_user):
+    _, first = make_user()
+    _, second = make_user()
+    image = png("purple")
+    filename = upload(client, first, image).json()["avatar"]
+    assert upload(client, second, image).json()["avatar"] == filename
+
+    assert client.delete(AVATAR, headers=first).status_code == 200
+    assert os.path.exists(os.path.join(AVATAR_DIR, filename))
+    assert client.delete(AVATAR, headers=second).status_code == 200
+    assert not os.path.exists(os.path.join(AVATAR_DIR, filename))
+
+
+def test_deduplicated_upload_recreates_a_file_deleted_before_its_commit():
+    data = png("orange")
+
+    async def run():
+        os.makedirs(AVATAR_DIR, exist_ok=True)
+        filename = await store_avatar(stored_upload(data))
+        upload = stored_upload(data)
+        assert await store_avatar(upload) == filename
+        # The previous owner's delete wins the race before this user's row is committed
+        await remove_avatar(filename, in_use=lambda: asyncio.sleep(0, False))
+        await settle_avatar(upload, filename)
+        await avatar_processor.wait()
+        return filename, upload
+
+    filename, upload = asyncio.run(run())
+    with open(os.path.join(AVATAR_DIR, filename), "rb") as file:
+        assert file.read() == data
+    assert upload.path == os.path.join(AVATAR_DIR, filename)
+
+
+def test_remove_keeps_a_file_that_came_back_into_use():
+    data = png("teal")
+    answers = iter([False, True])
+
+    async def run():
+        os.makedirs(AVATAR_DIR, exist_ok=True)
+        filename = await store_avatar(stored_upload(data))
+        await remove_avatar(filename, in_use=lambda: asyncio.sleep(0, next(answers)))
+        await avatar_processor.wait()
+        return filename
+
+    filename = asyncio.run(run())
+    assert os.path.exists(os.path.join(AVATAR_DIR, filename))
+    assert not [name for name in os.listdir(AVATAR_DIR) if name.startswith(".deleting-")]
@@ -0,0 +1,89 @@
+"""
+User search: substring matches through the trigram index, and the
+shared TTL-LRU cache behind the search, user and token caches.
+"""
+from src.database import engine
+from src.services.query_profiler import capture_queries
+from src.services.ttl_cache import TTLCache
+
+SEARCH = "/api/v1/users/search"
+
+
+def test_substring_search_checks_for_the_index_once(client, make_user):
+    me, my_headers = make_user()
+    make_user(username="searchable_marigold", full_name="Marigold Field")
+    client.get(SEARCH, headers=my_headers, params={"q": "rigol"})
+
+    with capture_queries([engine]) as profile:
+        response = client.get(SEARCH, headers=my_headers, params={"q": "arigo"})
+    assert [r["username"] for r in response.json()] == ["searchable_marigold"]
+    assert not [q for q in profile.queries if "sqlite_master" in q.statement]
+
+
+def test_short_terms_still_match_inside_names(client, make_user):
+    _, my_headers = make_user()
+    make_user(username="searchable_qzv_in_middle")
+
+    response = client.get(SEARCH, headers=my_headers, params={"q": "zv"})
+    assert [r["username"] for r in response.json()] == ["searchable_qzv_in_middle"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats() == {"size": 2, "maxsize": 2, "ttl_seconds": 10, "hits": 3, "misses": 1}
+
+
+def test_ttl_cache_expires_entries():
+    clock = Clock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("ttl", 1)
+    cache.set("explicit", 2, expires=20)
+    clock.now = 5
+    assert cache.get("ttl") is None
+    assert cache.get("explicit") == 2
+    clock.now = 20
+    assert cache.get("explicit") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_with_no_room_is_off():
+    cache = TTLCache(maxsize=0, ttl=5)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_login_and_register_hash_without_holding_a_connection(client, monkeypatch):
+    from src.auth.hash_password import HashPassword, password_hasher
+    checked_out = []
+
+    async def get_password_hash(password):
+        checked_out.append(engine.pool.checkedout())
+        return HashPassword.get_password_hash(password)
+
+    async def verify_password(password, hashed):
+        checked_out.append(engine.pool.checkedout())
+        return HashPassword.verify_password(password, hashed)
+
+    monkeypatch.setattr(password_hasher, "get_password_hash", get_password_hash)
+    monkeypatch.setattr(password_hasher, "verify_password", verify_password)
+    response = client.post("/api/v1/auth/register", json={
+        "email": "hasher@example.com", "username": "hasher", "password": "long-enough-password"
+    })
+    assert response.status_code == 201
+    response = client.post("/api/v1/auth/login", data={"username": "hasher", "password": "long-enough-password"})
+    assert response.status_code == 200
+    assert checked_out == [0, 0]